@@ -0,0 +1,62 @@
+"""
+Benchmark: sequential vs. multi-process llama-cpp classification (needs the GGUF model).
+
+Reports sentences/sec per worker count and checks that every run matches the sequential
+labels at temperature 0:
+
+    python -m package.benchmarks.bench_classification_workers --sentences sentences.txt --workers 1 2 4
+"""
+import argparse
+import hashlib
+from ..llm_classification.llm_classifiers import (create_and_classify_input, classify_in_workers, load_llm,
+                                                  get_model_info)
+
+SAMPLE_SENTENCES = [
+    "Could you please pass me the salt?",
+    "That movie was freaking awesome, dude.",
+    "He is such an idiot, I can't stand him.",
+    "Thank you for your kind letter of the 5th.",
+]
+
+
+class CollectingStore:
+    """ Minimal stand-in for DataStore that keeps the inserted classifications in memory. """
+
+    def __init__(self):
+        self.rows = []
+
+    def insert_llm_classifications(self, rows):
+        self.rows.extend(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sentences", help="Text file with one sentence per line")
+    parser.add_argument("--count", type=int, default=64, help="Sentences used when no file is given")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+
+    if args.sentences:
+        with open(args.sentences, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] for i in range(args.count)]
+    sentences = list(enumerate(texts))
+    _, model_value = get_model_info()
+    fingerprint = hashlib.sha256(model_value.encode("utf-8")).hexdigest()
+
+    print("== sequential ==")
+    reference = CollectingStore()
+    create_and_classify_input(sentences, reference, load_llm(verbose=False), fingerprint, use_cache=False)
+    reference_labels = {row[0]: row[1] for row in reference.rows}
+
+    for workers in args.workers:
+        print(f"== {workers} workers ==")
+        store = CollectingStore()
+        classify_in_workers(sentences, store, fingerprint, workers, use_cache=False)
+        mismatches = sum(reference_labels.get(row[0]) != row[1] for row in store.rows)
+        print(f"Label mismatches vs. sequential: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: N writer threads sharing one DataStore, shared connection vs. connection pool.
+
+Each thread inserts small batches of paraphrased_sentences rows, as the fetch, ingest and
+classifier workers do. --round-trip-ms adds a server-side pg_sleep to every transaction to
+stand in for the network and commit latency of a remote database; on a local socket the
+threads mostly compete for the CPU instead. Runs against a scratch database (the table is
+recreated):
+
+    python -m package.benchmarks.bench_datastore_contention --dbname llm_sensitivity_bench
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ..config import DB_CONFIG
+from ..data_store import DataStore
+
+SCHEMA = """
+DROP TABLE IF EXISTS paraphrased_sentences;
+CREATE TABLE paraphrased_sentences (
+    paraphrased_sentence_id SERIAL PRIMARY KEY,
+    original_sentence_id INTEGER,
+    paraphrased_sentence TEXT,
+    model TEXT,
+    model_system_fingerprint TEXT
+);
+"""
+TEARDOWN = "DROP TABLE IF EXISTS paraphrased_sentences"
+
+
+def run(datastore, threads, batches, batch_rows, round_trip):
+    rows = [(i, f"synthetic paraphrase number {i} for the contention benchmark", "bench", "fp")
+            for i in range(batch_rows)]
+
+    def writer(_):
+        for _ in range(batches):
+            if round_trip:
+                with datastore.transaction() as cursor:
+                    cursor.execute("SELECT pg_sleep(%s)", (round_trip,))
+            datastore.insert_paraphrased_sentences(rows)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(writer, range(threads)))
+    datastore.flush()
+    return threads * batches * batch_rows / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dbname", default="llm_sensitivity_bench")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--batches", type=int, default=200, help="Transactions per thread")
+    parser.add_argument("--batch-rows", type=int, default=20)
+    parser.add_argument("--round-trip-ms", type=float, default=2.0, help="Simulated latency per transaction")
+    parser.add_argument("--commit-every", type=int, default=20, help="Commit batching of the batched mode")
+    args = parser.parse_args()
+
+    db_config = {**DB_CONFIG, "dbname": args.dbname}
+    datastore = DataStore(db_config)
+    with datastore.transaction() as cursor:
+        cursor.execute(SCHEMA)
+    datastore.close()
+
+    modes = {
+        "shared": lambda threads: DataStore(db_config),
+        "batched": lambda threads: DataStore(db_config, commit_every=args.commit_every),
+        "pooled": lambda threads: DataStore(db_config, pool_size=threads),
+    }
+    print(f"{'threads':>7} " + " ".join(f"{mode + ' [rows/s]':>18}" for mode in modes))
+    for threads in args.threads:
+        rates = []
+        for make in modes.values():
+            datastore = make(threads)
+            try:
+                rates.append(run(datastore, threads, args.batches, args.batch_rows, args.round_trip_ms / 1000))
+            finally:
+                datastore.close()
+        print(f"{threads:>7} " + " ".join(f"{rate:>18.0f}" for rate in rates))
+
+    datastore = DataStore(db_config)
+    with datastore.transaction() as cursor:
+        cursor.execute(TEARDOWN)
+    datastore.close()
+
+
+if __name__ == "__main__":
+    main()
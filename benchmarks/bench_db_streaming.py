@@ -0,0 +1,81 @@
+"""
+Benchmark: DataStore.fetch_for_llm (fetchall) vs. iter_for_llm (server-side cursor).
+
+Fills a scratch database with synthetic original/paraphrased sentences and expert keys,
+then reports time to first row, total time and peak RSS per mode (one subprocess each):
+
+    python -m package.benchmarks.bench_db_streaming --dbname llm_sensitivity_bench --rows 1000000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from ..config import DB_CONFIG
+from ..data_store import DataStore
+
+SCHEMA = """
+DROP TABLE IF EXISTS experts_classification, paraphrased_sentences, original_sentences;
+CREATE TABLE original_sentences (original_sentence_id INTEGER PRIMARY KEY, original_sentence TEXT);
+CREATE TABLE paraphrased_sentences (paraphrased_sentence_id INTEGER PRIMARY KEY, paraphrased_sentence TEXT);
+CREATE TABLE experts_classification ("key" INTEGER PRIMARY KEY);
+INSERT INTO original_sentences
+    SELECT i, 'original sentence number ' || i || ' with some padding text to look realistic'
+    FROM generate_series(1, %(half)s) AS i;
+INSERT INTO paraphrased_sentences
+    SELECT i, 'paraphrased sentence number ' || i || ' with some padding text to look realistic'
+    FROM generate_series(%(half)s + 1, %(rows)s) AS i;
+INSERT INTO experts_classification SELECT i FROM generate_series(1, %(rows)s) AS i;
+ANALYZE;
+"""
+TEARDOWN = "DROP TABLE IF EXISTS experts_classification, paraphrased_sentences, original_sentences"
+
+
+def run_mode(mode, dbname):
+    datastore = DataStore({**DB_CONFIG, "dbname": dbname})
+    start = time.perf_counter()
+    first_row = None
+    count = 0
+    rows = datastore.fetch_for_llm() if mode == "fetchall" else datastore.iter_for_llm()
+    for _ in rows:
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        count += 1
+    total = time.perf_counter() - start
+    datastore.close()
+    return {"rows": count, "first_row": first_row, "total": total,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dbname", default="llm_sensitivity_bench")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--mode", choices=["fetchall", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.dbname)))
+        return
+
+    datastore = DataStore({**DB_CONFIG, "dbname": args.dbname})
+    datastore.cursor.execute(SCHEMA, {"rows": args.rows, "half": args.rows // 2})
+    datastore.conn.commit()
+    datastore.close()
+
+    print(f"{'mode':>9} {'rows':>9} {'first row [s]':>14} {'total [s]':>10} {'peak RSS [MB]':>14}")
+    for mode in ("fetchall", "stream"):
+        cmd = [sys.executable, "-m", __spec__.name, "--mode", mode, "--dbname", args.dbname]
+        result = json.loads(subprocess.check_output(cmd).decode().strip().splitlines()[-1])
+        print(f"{mode:>9} {result['rows']:>9} {result['first_row']:>14.3f} {result['total']:>10.2f} "
+              f"{result['peak_rss_mb']:>14.1f}")
+
+    datastore = DataStore({**DB_CONFIG, "dbname": args.dbname})
+    datastore.cursor.execute(TEARDOWN)
+    datastore.conn.commit()
+    datastore.close()
+
+
+if __name__ == "__main__":
+    main()
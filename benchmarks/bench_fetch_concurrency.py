@@ -0,0 +1,46 @@
+"""
+Benchmark: concurrent multi-expression fetching against the local concordance stub.
+
+    python -m package.benchmarks.bench_fetch_concurrency --expressions 200 --latency 0.2
+"""
+import argparse
+import json
+import time
+from ..sentence_construction.sentence_fetcher import SketchEngineFetcher, RateLimiter, fetch_concurrently
+from .stub_sketchengine import ConcordanceStub, make_synthetic_page, load_recordings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--expressions", type=int, default=200)
+    parser.add_argument("--num-sentences", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated network latency per request [s]")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests-per-second", type=float, default=0)
+    parser.add_argument("--recordings", help="Directory with recorded page_N.json files")
+    args = parser.parse_args()
+
+    if args.recordings:
+        pages = load_recordings(args.recordings)
+    else:
+        pages = [json.dumps(make_synthetic_page(500)).encode("utf-8")]
+    expressions = [(i, f"expression {i}") for i in range(args.expressions)]
+
+    print(f"{'concurrency':>11} {'seconds':>8} {'expr/s':>8} {'sentences':>10}")
+    with ConcordanceStub(pages, latency=args.latency) as stub:
+        for concurrency in args.concurrency:
+            fetcher = SketchEngineFetcher("user", "key", "corpus", stub.base_url,
+                                          rate_limiter=RateLimiter(args.requests_per_second),
+                                          pool_size=concurrency)
+            collected = []
+            start = time.perf_counter()
+            fetch_concurrently(fetcher, expressions, args.num_sentences, 1, 100, concurrency,
+                               lambda expression_id, sentences: collected.extend(sentences))
+            elapsed = time.perf_counter() - start
+            toknums = [row[2] for row in collected]
+            assert len(toknums) == len(set(toknums)), "duplicate toknums across workers"
+            print(f"{concurrency:>11} {elapsed:>8.2f} {len(expressions) / elapsed:>8.1f} {len(collected):>10}")
+
+
+if __name__ == "__main__":
+    main()
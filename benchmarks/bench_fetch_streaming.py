@@ -0,0 +1,68 @@
+"""
+Benchmark: buffered vs. streaming parsing of one large concordance page.
+
+The stub server runs in this process and each mode runs in its own subprocess, so that
+peak RSS is measured per mode and does not include the served page:
+
+    python -m package.benchmarks.bench_fetch_streaming --lines 20000
+    python -m package.benchmarks.bench_fetch_streaming --recordings path/to/pages
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from ..sentence_construction.sentence_fetcher import SketchEngineFetcher
+from .stub_sketchengine import ConcordanceStub, make_synthetic_page, load_recordings
+
+
+def peak_rss_mb():
+    """ VmHWM on Linux, which unlike ru_maxrss is not carried over from the parent across exec. """
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(streaming, base_url, lines, num_sentences):
+    fetcher = SketchEngineFetcher("user", "key", "corpus", base_url, streaming=streaming)
+    start = time.perf_counter()
+    sentences = fetcher.fetch_sentences(1, "expression", num_sentences, 1, 1000, show_progress=False)
+    elapsed = time.perf_counter() - start
+    return {"mode": "streaming" if streaming else "buffered", "seconds": elapsed,
+            "lines_per_sec": lines / elapsed, "peak_rss_mb": peak_rss_mb(), "sampled": len(sentences)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=20000, help="Lines of the synthetic page")
+    parser.add_argument("--recordings", help="Directory with recorded page_N.json files")
+    parser.add_argument("--num-sentences", type=int, default=100)
+    parser.add_argument("--mode", choices=["buffered", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode == "streaming", args.base_url, args.lines, args.num_sentences)))
+        return
+
+    if args.recordings:
+        pages = load_recordings(args.recordings)[:1]
+    else:
+        pages = [json.dumps(make_synthetic_page(args.lines)).encode("utf-8")]
+    lines = len(json.loads(pages[0])["Lines"])
+
+    print(f"{'mode':>10} {'seconds':>8} {'lines/s':>10} {'peak RSS [MB]':>14}")
+    with ConcordanceStub(pages, distinct_toknums=False) as stub:
+        for mode in ("buffered", "streaming"):
+            cmd = [sys.executable, "-m", __spec__.name, "--mode", mode, "--base-url", stub.base_url,
+                   "--lines", str(lines), "--num-sentences", str(args.num_sentences)]
+            result = json.loads(subprocess.check_output(cmd).decode().strip().splitlines()[-1])
+            print(f"{mode:>10} {result['seconds']:>8.2f} {result['lines_per_sec']:>10.0f} "
+                  f"{result['peak_rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
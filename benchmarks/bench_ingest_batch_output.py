@@ -0,0 +1,102 @@
+"""
+Benchmark: streaming ingestion of a batch output file vs. the previous read-everything path.
+
+Writes a synthetic output file (1M lines by default, 1% failed requests) and ingests it in
+a subprocess per mode, reporting rows/sec and peak RSS. Rows go to an in-memory counter
+unless --dbname names a scratch database with a paraphrased_sentences table:
+
+    python -m package.benchmarks.bench_ingest_batch_output --lines 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from ..config import DB_CONFIG
+from ..data_store import DataStore
+from ..llm_paraphrasing.paraphrase import ingest_batch_output, parse_batch_output_line
+
+
+class CountingStore:
+    """ Stand-in for DataStore.insert_paraphrased_sentences that only counts rows. """
+
+    def __init__(self):
+        self.rows = 0
+
+    def insert_paraphrased_sentences(self, rows):
+        self.rows += len(rows)
+        return len(rows)
+
+
+def write_synthetic_output(path, lines, failure_share=0.01):
+    failed_every = int(1 / failure_share) if failure_share else 0
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            if failed_every and i % failed_every == 0:
+                item = {"custom_id": f"{i}-0", "response": {"status_code": 500, "body": {
+                    "error": {"message": "server error"}}}, "error": None}
+            else:
+                item = {"custom_id": f"{i // 3}-{i % 3}", "response": {"status_code": 200, "body": {
+                    "model": "gpt-4o-mini-2024-07-18", "system_fingerprint": "fp_bench",
+                    "choices": [{"message": {"content": f"A paraphrased version of sentence number {i}."}}]}},
+                    "error": None}
+            f.write(json.dumps(item) + "\n")
+
+
+def legacy_ingest(path, datastore):
+    """ The previous path: whole file in memory, a split copy, and one list of all rows. """
+    with open(path) as f:
+        content = f.read()
+    paraphrased_data = []
+    for line in content.strip().split("\n"):
+        try:
+            paraphrased_data.append(parse_batch_output_line(line))
+        except ValueError:
+            pass  # The previous path crashed here; skip so the runs stay comparable
+    datastore.insert_paraphrased_sentences(paraphrased_data)
+    return len(paraphrased_data)
+
+
+def run_mode(mode, path, dbname):
+    datastore = DataStore({**DB_CONFIG, "dbname": dbname}) if dbname else CountingStore()
+    start = time.perf_counter()
+    if mode == "streaming":
+        rows, _ = ingest_batch_output(path, datastore, error_path=os.devnull)
+    else:
+        rows = legacy_ingest(path, datastore)
+    elapsed = time.perf_counter() - start
+    return {"rows": rows, "seconds": elapsed,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--dbname", help="Scratch database to insert into (default: count only)")
+    parser.add_argument("--mode", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.path, args.dbname)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "output.jsonl")
+        write_synthetic_output(path, args.lines)
+        print(f"Synthetic output: {args.lines} lines, {os.path.getsize(path) / 2**20:.0f} MB")
+        print(f"{'mode':>10} {'rows':>9} {'rows/s':>9} {'peak RSS [MB]':>14}")
+        for mode in ("legacy", "streaming"):
+            cmd = [sys.executable, "-m", __spec__.name, "--mode", mode, "--path", path]
+            if args.dbname:
+                cmd += ["--dbname", args.dbname]
+            result = json.loads(subprocess.check_output(cmd).decode().strip().splitlines()[-1])
+            print(f"{mode:>10} {result['rows']:>9} {result['rows'] / result['seconds']:>9.0f} "
+                  f"{result['peak_rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: per-row DataStore.insert_original_sentences vs. insert_original_sentences_bulk.
+
+Runs against a scratch database (NOT the research database), because original_sentences
+is truncated between runs:
+
+    python -m package.benchmarks.bench_insert_original_sentences --dbname llm_sensitivity_bench
+"""
+import argparse
+import time
+from ..config import DB_CONFIG
+from ..data_store import DataStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS original_sentences (
+    original_sentence_id SERIAL PRIMARY KEY,
+    expression_id INTEGER,
+    original_sentence TEXT,
+    token_number BIGINT,
+    corpus_name TEXT,
+    sources TEXT,
+    website TEXT,
+    title TEXT,
+    crawl_date TEXT,
+    url TEXT,
+    topic TEXT,
+    genre TEXT
+);
+CREATE INDEX IF NOT EXISTS original_sentences_token_number_idx ON original_sentences (token_number);
+"""
+
+
+def make_rows(n, start=0):
+    return [
+        (1, f"synthetic sentence number {i} for the insert benchmark", i, "bench_corpus", "Sketch Engine",
+         "example.com", "Title", "2021-01-01", f"https://example.com/{i}", "topic", "blog")
+        for i in range(start, start + n)
+    ]
+
+
+def run(datastore, method, rows, preexisting):
+    datastore.cursor.execute("TRUNCATE original_sentences")
+    datastore.conn.commit()
+    # A share of the batch is already stored, as happens when expressions overlap.
+    datastore.insert_original_sentences_bulk(rows[:preexisting])
+    start = time.perf_counter()
+    method(rows)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dbname", default="llm_sensitivity_bench")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--duplicate-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    datastore = DataStore({**DB_CONFIG, "dbname": args.dbname})
+    try:
+        datastore.cursor.execute(SCHEMA)
+        datastore.conn.commit()
+        print(f"{'rows':>8} {'per-row [s]':>12} {'bulk [s]':>10} {'speedup':>8}")
+        for size in args.sizes:
+            rows = make_rows(size)
+            preexisting = int(size * args.duplicate_share)
+            per_row = run(datastore, datastore.insert_original_sentences, rows, preexisting)
+            bulk = run(datastore, datastore.insert_original_sentences_bulk, rows, preexisting)
+            print(f"{size:>8} {per_row:>12.3f} {bulk:>10.3f} {per_row / bulk:>7.1f}x")
+        datastore.cursor.execute("TRUNCATE original_sentences")
+        datastore.conn.commit()
+    finally:
+        datastore.close()
+
+
+if __name__ == "__main__":
+    main()
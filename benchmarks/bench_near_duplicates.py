@@ -0,0 +1,89 @@
+"""
+Benchmark: throughput and accuracy of the near-duplicate index on one core.
+
+Generates synthetic sentences (300k by default) of which a share are near-duplicates of an
+earlier sentence: a changed word, case or punctuation, or an exact copy. They are fed through
+NearDuplicateIndex.reserve in fetch-sized chunks, which adds the kept ones as after their
+insert. Reported: sentences/minute, the share of injected near-duplicates that were dropped
+(recall), the share of drops that were injected (precision), index save/load time and size,
+and peak RSS.
+
+    python -m package.benchmarks.bench_near_duplicates --sentences 300000
+"""
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+from ..near_duplicates import NearDuplicateIndex
+from ..config import NEAR_DUP_THRESHOLD
+
+
+def make_sentences(count, duplicate_share, seed=0):
+    """ (sentence, index of the sentence it near-duplicates or None) pairs. """
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(2, 9))) for _ in range(20000)]
+    sentences = []
+    for i in range(count):
+        if sentences and rng.random() < duplicate_share:
+            source = rng.randrange(len(sentences))
+            words = sentences[source][0].split()
+            change = rng.randrange(3)
+            if change == 0:
+                words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            elif change == 1:
+                words[0] = words[0].upper()
+                words[-1] += "!"
+            sentences.append((' '.join(words), source))
+        else:
+            words = rng.choices(vocabulary, k=rng.randint(12, 40))
+            sentences.append((' '.join(words) + '.', None))
+    return sentences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sentences", type=int, default=300_000)
+    parser.add_argument("--duplicate-share", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD)
+    parser.add_argument("--chunk", type=int, default=1000, help="Sentences per filter call (one fetched expression)")
+    args = parser.parse_args()
+
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+    sentences = make_sentences(args.sentences, args.duplicate_share)
+    rows = [(i, text) for i, (text, _) in enumerate(sentences)]
+    index = NearDuplicateIndex(args.threshold)
+    print(f"{args.sentences} sentences, {args.duplicate_share:.0%} near-duplicates, threshold {args.threshold}, "
+          f"LSH {index.bands} bands x {index.rows} rows")
+
+    kept_ids = set()
+    start = time.perf_counter()
+    for offset in range(0, len(rows), args.chunk):
+        with index.reserve(rows[offset:offset + args.chunk], text=lambda row: row[1]) as (kept, _):
+            kept_ids.update(row[0] for row in kept)
+    elapsed = time.perf_counter() - start
+
+    dropped = {i for i in range(len(rows)) if i not in kept_ids}
+    injected = {i for i, (_, source) in enumerate(sentences) if source is not None}
+    recall = len(dropped & injected) / len(injected) if injected else 1.0
+    precision = len(dropped & injected) / len(dropped) if dropped else 1.0
+    print(f"{args.sentences / elapsed * 60:,.0f} sentences/min ({elapsed:.1f}s), dropped {len(dropped)}, "
+          f"recall {recall:.3f}, precision {precision:.3f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.pkl")
+        start = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        NearDuplicateIndex.open(path, args.threshold)
+        loaded = time.perf_counter() - start
+        print(f"Index of {len(index)} sentences: {os.path.getsize(path) / 2**20:.1f} MB, "
+              f"save {saved:.2f}s, load {loaded:.2f}s")
+    print(f"Peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: plain create_chat_completion vs. the shared-prefix KV cache (needs the GGUF model).
+
+The baseline is what classify_sentence does without --prefix-cache, so it keeps llama-cpp's own
+reuse of the longest prefix shared with the previous prompt. Reports prompt tokens and tokens
+actually evaluated per classification and latency for both paths, and the number of labels that
+differ at temperature 0:
+
+    python -m package.benchmarks.bench_prefix_cache --sentences sentences.txt
+"""
+import argparse
+import time
+from ..llm_classification.llm_classifiers import PrefixCachedClassifier, load_llm, load_prompt
+from .bench_classification_workers import SAMPLE_SENTENCES
+
+
+def common_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sentences", help="Text file with one sentence per line")
+    parser.add_argument("--count", type=int, default=32, help="Sentences used when no file is given")
+    args = parser.parse_args()
+
+    if args.sentences:
+        with open(args.sentences, encoding="utf-8") as f:
+            sentences = [line.strip() for line in f if line.strip()]
+    else:
+        sentences = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] for i in range(args.count)]
+    llm = load_llm(verbose=False)
+    prompt_template = load_prompt()
+
+    # Before: plain sequential completions, with llama-cpp's built-in longest-prefix reuse.
+    baseline, prompt_tokens, baseline_evaluated = [], 0, 0
+    start = time.perf_counter()
+    for sentence in sentences:
+        previous = llm.input_ids[:llm.n_tokens].tolist()
+        prompt = prompt_template.format(sentence=sentence)
+        result = llm.create_chat_completion(messages=[{"role": "user", "content": prompt}], max_tokens=10,
+                                            temperature=0)
+        n_prompt = result["usage"]["prompt_tokens"]
+        # llama-cpp keeps the KV entries of the prefix shared with the previous call (minus the last prompt token).
+        prompt_ids = llm.input_ids[:n_prompt].tolist()
+        prompt_tokens += n_prompt
+        baseline_evaluated += n_prompt - common_prefix(previous, prompt_ids[:-1])
+        baseline.append(result["choices"][0]["message"]["content"].strip())
+    baseline_seconds = time.perf_counter() - start
+
+    # After: only the sentence-specific suffix is evaluated.
+    classifier = PrefixCachedClassifier(llm, prompt_template)
+    start = time.perf_counter()
+    cached = [classifier.classify(sentence) for sentence in sentences]
+    cached_seconds = time.perf_counter() - start
+
+    n = len(sentences)
+    print(f"{'path':>13} {'prompt tok/cls':>15} {'evaluated tok/cls':>18} {'ms/cls':>8}")
+    print(f"{'plain':>13} {prompt_tokens / n:>15.1f} {baseline_evaluated / n:>18.1f} "
+          f"{1000 * baseline_seconds / n:>8.1f}")
+    print(f"{'prefix cache':>13} {classifier.prompt_tokens / n:>15.1f} "
+          f"{classifier.prompt_tokens_evaluated / n:>18.1f} {1000 * cached_seconds / n:>8.1f}")
+    print(f"Speed-up of the prefix cache over plain completions: {baseline_seconds / cached_seconds:.2f}x")
+    print(f"Label mismatches: {sum(a != b for a, b in zip(baseline, cached))} of {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark: columnar snapshot (Arrow / Parquet) vs. a CSV export of the labelled pairs.
+
+Fills a scratch database with synthetic expressions, sentences, paraphrases, expert labels and
+LLM classifications (2M paraphrases by default), then reports per format the export time of the
+pairs (and of the whole snapshot), the size on disk, and the load time and peak RSS (one
+subprocess each). The CSV is what
+COPY ... TO STDOUT CSV HEADER writes for the same join, loaded with pandas.read_csv. Finally 1%
+more rows are added and an incremental refresh is timed against the full export.
+
+    python -m package.benchmarks.bench_snapshot --dbname llm_sensitivity_bench --rows 2000000
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from ..config import DB_CONFIG
+from ..data_store import DataStore
+from .. import metrics
+from ..snapshot import export_snapshot, load_snapshot, read_frame
+
+SCHEMA = """
+DROP TABLE IF EXISTS llm_classification, experts_classification, paraphrased_sentences, original_sentences,
+    expressions;
+CREATE TABLE expressions (expression_id SERIAL PRIMARY KEY, expression TEXT, expression_sensitivity_class TEXT);
+CREATE TABLE original_sentences (original_sentence_id INTEGER PRIMARY KEY, expression_id INTEGER,
+    original_sentence TEXT);
+CREATE TABLE paraphrased_sentences (paraphrased_sentence_id INTEGER PRIMARY KEY, original_sentence_id INTEGER,
+    paraphrased_sentence TEXT, model TEXT, model_system_fingerprint TEXT);
+CREATE TABLE experts_classification ("key" INTEGER PRIMARY KEY, classification TEXT);
+CREATE TABLE llm_classification ("key" INTEGER, classification TEXT, comments TEXT, model TEXT,
+    model_system_fingerprint TEXT, llm_classification_id BIGSERIAL);
+INSERT INTO expressions (expression, expression_sensitivity_class)
+    SELECT 'expression ' || i, (ARRAY['Formal/Polite', 'Informal', 'Derogatory', 'Taboo'])[1 + i % 4]
+    FROM generate_series(1, 1000) AS i;
+"""
+# Three paraphrases per original; paraphrase ids start at ID_OFFSET + 1, above every original id.
+FILL = """
+INSERT INTO original_sentences
+    SELECT i, 1 + i %% 1000, 'original sentence number ' || i || ' with some padding text to look realistic'
+    FROM generate_series(%(first_original)s, %(last_original)s) AS i;
+INSERT INTO paraphrased_sentences
+    SELECT %(offset)s + i, 1 + (i - 1) / 3,
+           'paraphrased sentence number ' || i || ' with some other padding text to look realistic',
+           'gpt-4o-mini-2024-07-18', 'fp_0001'
+    FROM generate_series(%(first_paraphrase)s, %(last_paraphrase)s) AS i;
+INSERT INTO experts_classification
+    SELECT k, (ARRAY['Formal/Polite', 'Informal', 'Derogatory', 'Taboo', 'Unclear'])[1 + k %% 5]
+    FROM (SELECT original_sentence_id AS k FROM original_sentences
+          WHERE original_sentence_id BETWEEN %(first_original)s AND %(last_original)s
+          UNION ALL
+          SELECT paraphrased_sentence_id FROM paraphrased_sentences
+          WHERE paraphrased_sentence_id > %(offset)s + %(first_paraphrase)s - 1) AS keys;
+INSERT INTO llm_classification
+    SELECT "key", (ARRAY['Formal/Polite', 'Informal', 'Derogatory', 'Taboo'])[1 + "key" %% 3 + "key" %% 2],
+           'comment', 'Ministral-8B-Instruct-2410-f16.gguf', 'fp_mistral'
+    FROM experts_classification
+    WHERE "key" BETWEEN %(first_original)s AND %(last_original)s OR "key" > %(offset)s + %(first_paraphrase)s - 1;
+ANALYZE;
+"""
+TEARDOWN = ("DROP TABLE IF EXISTS llm_classification, experts_classification, paraphrased_sentences, "
+            "original_sentences, expressions")
+CSV_QUERY = """
+COPY (
+    SELECT ps.paraphrased_sentence_id, os.original_sentence_id, os.expression_id, ex.expression_sensitivity_class,
+           os.original_sentence, ps.paraphrased_sentence, ps.model,
+           oc.classification AS original_sentence_classification_experts_classification,
+           pc.classification AS paraphrased_sentence_classification_experts_classification
+    FROM paraphrased_sentences AS ps
+    JOIN original_sentences AS os ON os.original_sentence_id = ps.original_sentence_id
+    LEFT JOIN expressions AS ex ON ex.expression_id = os.expression_id
+    LEFT JOIN experts_classification AS oc ON oc."key" = os.original_sentence_id
+    LEFT JOIN experts_classification AS pc ON pc."key" = ps.paraphrased_sentence_id
+    ORDER BY ps.paraphrased_sentence_id
+) TO STDOUT WITH CSV HEADER
+"""
+ID_OFFSET = 100_000_000  # Paraphrase ids start above every original id
+
+
+def fill(datastore, first_paraphrase, last_paraphrase):
+    params = {"first_paraphrase": first_paraphrase, "last_paraphrase": last_paraphrase, "offset": ID_OFFSET,
+              "first_original": (first_paraphrase - 1) // 3 + 1, "last_original": (last_paraphrase - 1) // 3 + 1}
+    datastore.cursor.execute(FILL, params)
+    datastore.conn.commit()
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def pairs_export_seconds():
+    return metrics.summary()["timers"].get("snapshot.export.pairs", {}).get("total_s", 0.0)
+
+
+def run_load(mode, path):
+    start = time.perf_counter()
+    if mode == "csv":
+        rows = len(pd.read_csv(path))
+    elif mode == "frame":
+        rows = len(read_frame(path))
+    else:
+        table = load_snapshot(path)
+        # Touch every label so the mapped pages are actually read.
+        rows = sum(len(chunk.indices) for chunk in table.column(
+            "paraphrased_sentence_classification_experts_classification").chunks)
+    return {"rows": rows, "seconds": time.perf_counter() - start,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def load(mode, path):
+    cmd = [sys.executable, "-m", __spec__.name, "--mode", mode, "--path", path]
+    return json.loads(subprocess.check_output(cmd).decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dbname", default="llm_sensitivity_bench")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Paraphrases (pairs) in the database")
+    parser.add_argument("--mode", choices=["csv", "table", "frame"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_load(args.mode, args.path)))
+        return
+
+    metrics.enable()
+    rows = args.rows - args.rows % 3  # Whole groups of three paraphrases, so a refresh adds new originals only
+    datastore = DataStore({**DB_CONFIG, "dbname": args.dbname})
+    datastore.cursor.execute(SCHEMA)
+    fill(datastore, 1, rows)
+    tmp = tempfile.mkdtemp(prefix="llm_sensitivity_snapshot_")
+    try:
+        csv_path = os.path.join(tmp, "pairs.csv")
+        start = time.perf_counter()
+        with open(csv_path, "w", encoding="utf-8") as f:
+            datastore.cursor.copy_expert(CSV_QUERY, f)
+        elapsed = time.perf_counter() - start
+        results = [("csv", elapsed, elapsed, os.path.getsize(csv_path), load("csv", csv_path))]
+        for fmt in ("arrow", "parquet"):
+            path = os.path.join(tmp, fmt)
+            before, start = pairs_export_seconds(), time.perf_counter()
+            export_snapshot(datastore, path, fmt)
+            elapsed, pairs_elapsed = time.perf_counter() - start, pairs_export_seconds() - before
+            size = directory_size(os.path.join(path, "pairs"))
+            results.append((f"{fmt} table", pairs_elapsed, elapsed, size, load("table", path)))
+            results.append((f"{fmt} pandas", pairs_elapsed, elapsed, size, load("frame", path)))
+
+        print(f"{rows} pairs; the snapshots also export the llm_classification dataset (total [s])")
+        print(f"{'format':>15} {'export [s]':>11} {'total [s]':>10} {'size [MB]':>10} {'load [s]':>9} "
+              f"{'peak RSS [MB]':>14}")
+        for name, export_seconds, total_seconds, size, loaded in results:
+            print(f"{name:>15} {export_seconds:>11.1f} {total_seconds:>10.1f} {size / 2**20:>10.1f} "
+                  f"{loaded['seconds']:>9.2f} {loaded['peak_rss_mb']:>14.1f}")
+
+        added = max(3, rows // 300 * 3)
+        fill(datastore, rows + 1, rows + added)
+        path = os.path.join(tmp, "arrow")
+        start = time.perf_counter()
+        exported = export_snapshot(datastore, path, "arrow")
+        refresh = time.perf_counter() - start
+        start = time.perf_counter()
+        export_snapshot(datastore, os.path.join(tmp, "arrow_full"), "arrow", full=True)
+        full = time.perf_counter() - start
+        print(f"Refresh after {added} new pairs: {refresh:.2f}s ({exported['pairs']} pairs, "
+              f"{exported['llm_classification']} classifications) vs. full export {full:.1f}s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        datastore.cursor.execute(TEARDOWN)
+        datastore.conn.commit()
+        datastore.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: the notebook's traditional classifier flow vs. ml_classification.train_sweep.
+
+Writes a synthetic expert-labelled CSV (sentence pairs over a Zipf-distributed vocabulary,
+with a few label-specific marker words) and runs both flows in separate subprocesses,
+reporting sweep time, peak RSS of the main process and of the largest worker, and the
+average test F1 of each classifier:
+
+    python -m package.benchmarks.bench_train_sweep --pairs 5000 --vocabulary 30000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from ..ml_classification import train_sweep
+
+QUICK_CLASSIFIERS = ["Nearest Neighbors", "Linear SVM", "Random Forest", "Naive Bayes"]
+
+
+def write_synthetic_csv(path, pairs, vocabulary, seed=0):
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(vocabulary)]
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    weights /= weights.sum()
+    markers = {label: [f"{label.split('/')[0].lower()}{i}" for i in range(20)] for label in train_sweep.ALLOWED_CLASSES}
+    label_share = [0.45, 0.33, 0.15, 0.07]
+
+    def sentence(label):
+        tokens = list(rng.choice(words, size=rng.integers(8, 30), p=weights))
+        tokens += list(rng.choice(markers[label], size=rng.integers(0, 3)))
+        rng.shuffle(tokens)
+        return " ".join(tokens)
+
+    rows = []
+    for _ in range(pairs):
+        original_label, paraphrased_label = rng.choice(train_sweep.ALLOWED_CLASSES, size=2, p=label_share)
+        rows.append({"original_sentence": sentence(original_label),
+                     train_sweep.ORIGINAL_LABEL: original_label,
+                     "paraphrased_sentence": sentence(paraphrased_label),
+                     train_sweep.PARAPHRASED_LABEL: paraphrased_label})
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def run_mode(mode, csv_path, cache_dir, classifiers, jobs):
+    specs = [spec for spec in train_sweep.classifier_specs() if spec[0] in classifiers]
+    start = time.perf_counter()
+    split = train_sweep.load_split(csv_path)
+    if mode == "legacy":
+        results, _ = train_sweep.run_legacy(*split, specs)
+    else:
+        path = train_sweep.build_feature_cache(cache_dir, *split)
+        results, _ = train_sweep.run_sweep(path, specs, jobs)
+    elapsed = time.perf_counter() - start
+    main_mb, workers_mb = train_sweep.peak_memory_mb()
+    return {"time": elapsed, "main_mb": main_mb, "workers_mb": workers_mb,
+            "avg_f1": {name: result["avg_f1"] for name, result in results.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=5000)
+    parser.add_argument("--vocabulary", type=int, default=30000)
+    parser.add_argument("--classifiers", nargs="+", default=QUICK_CLASSIFIERS)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--mode", choices=["legacy", "sweep", "cached"], help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.csv, args.cache_dir, args.classifiers, args.jobs)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "expert_labels.csv")
+        write_synthetic_csv(csv_path, args.pairs, args.vocabulary)
+        print(f"{args.pairs} pairs, vocabulary {args.vocabulary}, classifiers: {', '.join(args.classifiers)}")
+        print(f"{'mode':>7} {'time [s]':>9} {'main RSS [MB]':>14} {'worker RSS [MB]':>16}")
+        f1 = {}
+        # "sweep" builds the feature cache, "cached" reruns on the cache it left behind.
+        for mode in ("legacy", "sweep", "cached"):
+            cmd = [sys.executable, "-m", __spec__.name, "--mode", mode, "--csv", csv_path,
+                   "--cache-dir", os.path.join(tmp, "feature_cache"), "--jobs", str(args.jobs),
+                   "--classifiers", *args.classifiers]
+            result = json.loads(subprocess.check_output(cmd).decode().strip().splitlines()[-1])
+            f1[mode] = result["avg_f1"]
+            print(f"{mode:>7} {result['time']:>9.1f} {result['main_mb']:>14.0f} {result['workers_mb']:>16.0f}")
+        print("\nAverage test F1 (legacy / sweep):")
+        for name in args.classifiers:
+            print(f"  {name:<18} {f1['legacy'][name]:.4f} / {f1['sweep'][name]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Local fake of the OpenAI files, batches and chat completions endpoints used by llm_paraphrasing.
+
+Batches move from validating to in_progress to completed after `completion_delay` seconds,
+and the output file holds one canned chat completion per request line. `failure_rate`
+turns a share of the responses into failed requests. Direct chat completions (the streaming
+pipeline) answer with the same canned paraphrase after `chat_latency` seconds:
+
+    python -m package.benchmarks.fake_openai --port 8766 --completion-delay 5
+
+Point the client at it with OPENAI_BASE_URL = "http://127.0.0.1:8766/v1".
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAI:
+    """ Threaded HTTP server with in-memory files and batches. """
+
+    def __init__(self, completion_delay=0.0, failure_rate=0.0, host="127.0.0.1", port=0, seed=0, chat_latency=0.0):
+        fake = self
+        self.completion_delay = completion_delay
+        self.chat_latency = chat_latency
+        self.failure_rate = failure_rate
+        self.files = {}    # file id -> bytes
+        self.batches = {}  # batch id -> batch dict
+        self.batch_creates = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, body, content_type="application/json"):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                if path == "/v1/files":
+                    self._send(200, fake.create_file(self.headers["Content-Type"], self._body()))
+                elif path == "/v1/batches":
+                    self._send(200, fake.create_batch(json.loads(self._body())))
+                elif path == "/v1/chat/completions":
+                    self._send(200, fake.chat_completion(json.loads(self._body())))
+                else:
+                    self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if match := re.fullmatch(r"/v1/files/([^/]+)/content", path):
+                    self._send(200, fake.files[match.group(1)], "application/octet-stream")
+                elif match := re.fullmatch(r"/v1/batches/([^/]+)", path):
+                    self._send(200, fake.retrieve_batch(match.group(1)))
+                elif path == "/v1/batches":
+                    with fake._lock:
+                        data = [fake.retrieve_batch(batch_id) for batch_id in fake.batches]
+                    self._send(200, {"object": "list", "data": data, "has_more": False})
+                else:
+                    self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _new_id(self, prefix):
+        return f"{prefix}-{next(self._ids):06d}"
+
+    def create_file(self, content_type, body):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+        content = next(part.get_payload(decode=True) for part in message.iter_parts()
+                       if part.get_param("name", header="content-disposition") == "file")
+        file_id = self._new_id("file")
+        with self._lock:
+            self.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": "input.jsonl", "purpose": "batch", "status": "processed"}
+
+    def create_batch(self, request):
+        batch_id = self._new_id("batch")
+        with self._lock:
+            self.batch_creates += 1
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                "status": "validating", "output_file_id": None, "error_file_id": None,
+                "created_at": int(time.time()), "metadata": request.get("metadata"),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "_started": time.monotonic(),
+            }
+        return self.retrieve_batch(batch_id)
+
+    def _complete(self, batch):
+        lines = [json.loads(line) for line in self.files[batch["input_file_id"]].splitlines() if line.strip()]
+        output, errors = [], []
+        for request in lines:
+            if self._rng.random() < self.failure_rate:
+                errors.append({"id": self._new_id("batch_req"), "custom_id": request["custom_id"],
+                               "response": {"status_code": 500, "request_id": "", "body": {
+                                   "error": {"message": "fake server error", "type": "server_error"}}},
+                               "error": None})
+                continue
+            output.append({"id": self._new_id("batch_req"), "custom_id": request["custom_id"],
+                           "response": {"status_code": 200, "request_id": "", "body": {
+                               "model": request["body"]["model"], "system_fingerprint": "fp_fake",
+                               "choices": [self._choice(request["body"], 0)]}},
+                           "error": None})
+        batch["output_file_id"] = self._store("".join(json.dumps(item) + "\n" for item in output))
+        if errors:
+            batch["error_file_id"] = self._store("".join(json.dumps(item) + "\n" for item in errors))
+        batch["request_counts"] = {"total": len(lines), "completed": len(output), "failed": len(errors)}
+        batch["status"] = "completed"
+
+    @staticmethod
+    def _choice(body, index):
+        prompt = body["messages"][0]["content"]
+        return {"index": index, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": f"Paraphrased: {prompt.split(': ', 1)[-1]}"}}
+
+    def chat_completion(self, body):
+        if self.chat_latency:
+            time.sleep(self.chat_latency)
+        n = body.get("n", 1)
+        prompt_tokens = len(body["messages"][0]["content"].split())
+        return {"id": self._new_id("chatcmpl"), "object": "chat.completion", "created": int(time.time()),
+                "model": body["model"], "system_fingerprint": "fp_fake",
+                "choices": [self._choice(body, i) for i in range(n)],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n * prompt_tokens,
+                          "total_tokens": (n + 1) * prompt_tokens}}
+
+    def _store(self, text):
+        file_id = self._new_id("file")
+        self.files[file_id] = text.encode("utf-8")
+        return file_id
+
+    def retrieve_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        elapsed = time.monotonic() - batch["_started"]
+        if batch["status"] == "validating":
+            batch["status"] = "in_progress"
+        if batch["status"] == "in_progress" and elapsed >= self.completion_delay:
+            self._complete(batch)
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local fake of the OpenAI files/batches endpoints.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--completion-delay", type=float, default=5.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    with FakeOpenAI(args.completion_delay, args.failure_rate, port=args.port) as fake:
+        print(f"Fake OpenAI API at {fake.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
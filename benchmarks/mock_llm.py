@@ -0,0 +1,21 @@
+"""
+Stand-in for llama_cpp.Llama in the benchmarks and the pipeline dry run: create_chat_completion
+answers with a label derived from a hash of the prompt, after an optional latency.
+"""
+import hashlib
+import time
+
+LABELS = ["Formal/Polite", "Informal", "Derogatory", "Taboo"]
+
+
+class MockLlama:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def create_chat_completion(self, messages, max_tokens, temperature):
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        label = LABELS[hashlib.sha256(prompt.encode("utf-8")).digest()[0] % len(LABELS)]
+        return {"choices": [{"message": {"role": "assistant", "content": label}}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": 2}}
@@ -0,0 +1,277 @@
+"""
+Offline benchmark suite: every pipeline component at several data sizes, against local stand-ins
+only (concordance stub, fake OpenAI batch API, a scratch PostgreSQL, a mock or tiny GGUF LLM).
+
+Each component and size runs in its own subprocess, which reports items/s and its peak RSS.
+The results are written to --output-dir as <commit>.json (with a -dirty suffix for uncommitted
+changes), so runs on two commits can be compared with --compare:
+
+    python -m package.benchmarks.run_all --pg-bin /usr/lib/postgresql/16/bin
+    python -m package.benchmarks.run_all --dbname llm_sensitivity_bench --compare results/<commit>.json
+
+The database components use a throwaway cluster (initdb from --pg-bin or PATH) unless --dbname
+names a scratch database on the DB_CONFIG server; their tables are dropped and recreated. Without
+either they are skipped. The classification loop uses a mock LLM unless --gguf gives a model file.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from ..config import DB_CONFIG
+from .mock_llm import MockLlama
+
+COMPONENTS = ["fetch_parse", "fetch_parse_streaming", "insert_original", "jsonl_build", "jsonl_ingest",
+              "batch_roundtrip", "classify_loop", "db_stream"]
+DB_COMPONENTS = {"insert_original", "db_stream"}  # jsonl_ingest falls back to an in-memory store
+USES_DB = DB_COMPONENTS | {"jsonl_ingest"}
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _sentences(size):
+    return [(i, f"synthetic sentence number {i} with a few more words to look realistic") for i in range(size)]
+
+
+def _execute(db_config, statements):
+    from ..data_store import DataStore
+    datastore = DataStore(db_config)
+    try:
+        datastore.cursor.execute(statements)
+        datastore.conn.commit()
+    finally:
+        datastore.close()
+
+
+def bench_fetch_parse(size, workdir, db_config, options, streaming=False):
+    from ..sentence_construction.sentence_fetcher import SketchEngineFetcher
+    from .stub_sketchengine import ConcordanceStub, make_synthetic_page
+    pages = [json.dumps(make_synthetic_page(size)).encode("utf-8")]
+    with ConcordanceStub(pages, distinct_toknums=False) as stub:
+        fetcher = SketchEngineFetcher("user", "key", "corpus", stub.base_url, streaming=streaming)
+        start = time.perf_counter()
+        fetcher.fetch_sentences(1, "expression", size, 1, 1000, show_progress=False)
+        return {"items": size, "seconds": time.perf_counter() - start}
+
+
+def bench_insert_original(size, workdir, db_config, options):
+    from ..data_store import DataStore
+    from .bench_insert_original_sentences import SCHEMA, make_rows
+    _execute(db_config, "DROP TABLE IF EXISTS original_sentences;" + SCHEMA)
+    rows = make_rows(size)
+    datastore = DataStore(db_config)
+    try:
+        # A tenth of the rows is already stored, as happens when expressions overlap.
+        datastore.insert_original_sentences_bulk(rows[:size // 10])
+        start = time.perf_counter()
+        datastore.insert_original_sentences_bulk(rows)
+        return {"items": size, "seconds": time.perf_counter() - start}
+    finally:
+        datastore.close()
+        _execute(db_config, "DROP TABLE IF EXISTS original_sentences")
+
+
+def bench_jsonl_build(size, workdir, db_config, options):
+    from ..llm_paraphrasing.batch_orchestrator import write_shards
+    sentences = _sentences(size)
+    start = time.perf_counter()
+    write_shards(sentences, options.num_paraphrases, os.path.join(workdir, "shards"))
+    return {"items": size * options.num_paraphrases, "seconds": time.perf_counter() - start}
+
+
+def bench_jsonl_ingest(size, workdir, db_config, options):
+    from ..data_store import DataStore
+    from ..llm_paraphrasing.paraphrase import ingest_batch_output
+    from .bench_datastore_contention import SCHEMA, TEARDOWN
+    from .bench_ingest_batch_output import CountingStore, write_synthetic_output
+    path = os.path.join(workdir, "output.jsonl")
+    write_synthetic_output(path, size)
+    if db_config:
+        _execute(db_config, SCHEMA)
+        datastore = DataStore(db_config)
+    else:
+        datastore = CountingStore()
+    try:
+        start = time.perf_counter()
+        rows, _ = ingest_batch_output(path, datastore, error_path=os.devnull)
+        return {"items": rows, "seconds": time.perf_counter() - start,
+                "store": "postgres" if db_config else "memory"}
+    finally:
+        if db_config:
+            datastore.close()
+            _execute(db_config, TEARDOWN)
+
+
+def bench_batch_roundtrip(size, workdir, db_config, options):
+    from openai import OpenAI
+    from ..llm_paraphrasing.batch_orchestrator import BatchManifest, BatchOrchestrator
+    from .bench_ingest_batch_output import CountingStore
+    from .fake_openai import FakeOpenAI
+    store = CountingStore()
+    with FakeOpenAI(completion_delay=0.0) as fake:
+        client = OpenAI(api_key="bench", base_url=fake.base_url)
+        manifest = BatchManifest(os.path.join(workdir, "manifest.json"))
+        orchestrator = BatchOrchestrator(client, store, manifest, output_dir=workdir, poll_interval=0.05)
+        start = time.perf_counter()
+        orchestrator.prepare(_sentences(size), options.num_paraphrases, os.path.join(workdir, "shards"))
+        orchestrator.run()
+        return {"items": store.rows, "seconds": time.perf_counter() - start}
+
+
+def bench_classify_loop(size, workdir, db_config, options):
+    from ..llm_classification.llm_classifiers import create_and_classify_input
+    from .bench_classification_workers import CollectingStore
+    if options.gguf:
+        from llama_cpp import Llama
+        llm = Llama(model_path=options.gguf, verbose=False)
+    else:
+        llm = MockLlama(options.llm_latency)
+    store = CollectingStore()
+    start = time.perf_counter()
+    create_and_classify_input(_sentences(size), store, llm, "bench", use_cache=False)
+    return {"items": len(store.rows), "seconds": time.perf_counter() - start,
+            "llm": os.path.basename(options.gguf) if options.gguf else "mock"}
+
+
+def bench_db_stream(size, workdir, db_config, options):
+    from ..data_store import DataStore
+    from .bench_db_streaming import SCHEMA, TEARDOWN
+    datastore = DataStore(db_config)
+    try:
+        datastore.cursor.execute(SCHEMA, {"rows": size, "half": size // 2})
+        datastore.conn.commit()
+        start = time.perf_counter()
+        rows = sum(1 for _ in datastore.iter_for_llm())
+        return {"items": rows, "seconds": time.perf_counter() - start}
+    finally:
+        datastore.close()
+        _execute(db_config, TEARDOWN)
+
+
+def run_component(component, size, db_config, options):
+    benchmarks = {
+        "fetch_parse": bench_fetch_parse,
+        "fetch_parse_streaming": lambda *args: bench_fetch_parse(*args, streaming=True),
+        "insert_original": bench_insert_original,
+        "jsonl_build": bench_jsonl_build,
+        "jsonl_ingest": bench_jsonl_ingest,
+        "batch_roundtrip": bench_batch_roundtrip,
+        "classify_loop": bench_classify_loop,
+        "db_stream": bench_db_stream,
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        result = benchmarks[component](size, workdir, db_config, options)
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def git_revision():
+    """ (commit, dirty) of the working tree, or ("unknown", False) outside a git checkout. """
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short=12", "HEAD"], cwd=REPO_DIR,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+        status = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(status)
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return {(row["component"], row["size"]): row for row in json.load(f)["results"]}
+
+
+def print_results(results, baseline=None):
+    header = f"{'component':<22} {'size':>8} {'items/s':>12} {'seconds':>9} {'peak RSS [MB]':>14}"
+    print(header + (f" {'vs. baseline':>13}" if baseline else ""))
+    for row in results:
+        if "error" in row:
+            print(f"{row['component']:<22} {row['size']:>8}   {row['error']}")
+            continue
+        line = (f"{row['component']:<22} {row['size']:>8} {row['items_per_s']:>12.0f} {row['seconds']:>9.2f} "
+                f"{row['peak_rss_mb']:>14.1f}")
+        previous = (baseline or {}).get((row["component"], row["size"]))
+        if previous and previous.get("items_per_s"):
+            line += f" {row['items_per_s'] / previous['items_per_s']:>12.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--components", nargs="+", choices=COMPONENTS, default=COMPONENTS)
+    parser.add_argument("--dbname", help="Scratch database on the DB_CONFIG server (tables are dropped)")
+    parser.add_argument("--pg-bin", help="Directory with initdb and pg_ctl for a throwaway cluster")
+    parser.add_argument("--gguf", help="GGUF model file for the classification loop (default: mock LLM)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per mock LLM call")
+    parser.add_argument("--num-paraphrases", type=int, default=3)
+    parser.add_argument("--output-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    parser.add_argument("--compare", help="Earlier results file to compare items/s against")
+    parser.add_argument("--component", choices=COMPONENTS, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--db-config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.component:
+        db_config = json.loads(args.db_config) if args.db_config else None
+        print(json.dumps(run_component(args.component, args.size, db_config, args)))
+        return
+
+    from .scratch_postgres import ScratchPostgres
+    commit, dirty = git_revision()
+    results = []
+    with ExitStack() as stack:
+        postgres = None
+        db_config = None
+        if args.dbname:
+            db_config = {**DB_CONFIG, "dbname": args.dbname}
+        elif USES_DB & set(args.components):
+            try:
+                postgres = stack.enter_context(ScratchPostgres(args.pg_bin))
+                db_config = postgres.db_config
+            except (FileNotFoundError, RuntimeError) as err:
+                print(f"No scratch PostgreSQL ({err}); skipping {', '.join(sorted(DB_COMPONENTS))}.")
+
+        for component in args.components:
+            for size in args.sizes:
+                if component in DB_COMPONENTS and db_config is None:
+                    continue
+                cmd = [sys.executable, "-m", __spec__.name, "--component", component, "--size", str(size),
+                       "--num-paraphrases", str(args.num_paraphrases), "--llm-latency", str(args.llm_latency)]
+                if db_config:
+                    cmd += ["--db-config", json.dumps(db_config)]
+                if args.gguf:
+                    cmd += ["--gguf", args.gguf]
+                row = {"component": component, "size": size}
+                completed = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                if completed.returncode == 0:
+                    row.update(json.loads(completed.stdout.decode().strip().splitlines()[-1]))
+                    row["items_per_s"] = row["items"] / row["seconds"] if row["seconds"] > 0 else 0.0
+                else:
+                    row["error"] = (completed.stderr.decode().strip().splitlines() or ["failed"])[-1]
+                results.append(row)
+                print(f"{component} {size}: " + (f"{row['items_per_s']:.0f} items/s" if "items_per_s" in row
+                                                  else row["error"]))
+
+    name = commit + ("-dirty" if dirty else "")
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"commit": commit, "dirty": dirty, "date": datetime.now(timezone.utc).isoformat(),
+                   "python": platform.python_version(), "platform": platform.platform(),
+                   "cpus": os.cpu_count(), "database": "scratch cluster" if postgres else args.dbname,
+                   "llm": args.gguf or "mock", "results": results}, f, indent=2)
+
+    print()
+    print_results(results, load_results(args.compare) if args.compare else None)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
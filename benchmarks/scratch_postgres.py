@@ -0,0 +1,59 @@
+"""
+Throwaway local PostgreSQL cluster for the benchmarks: initdb into a temporary directory,
+a server that listens only on a Unix socket in that directory, and everything removed on exit.
+
+    with ScratchPostgres() as postgres:
+        datastore = DataStore(postgres.db_config)
+
+initdb and pg_ctl are taken from bin_dir or PATH. PostgreSQL refuses to run as root; run the
+benchmarks as an ordinary user, or point them at an existing server's scratch database instead.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+def find_binary(name, bin_dir=None):
+    path = os.path.join(bin_dir, name) if bin_dir else shutil.which(name)
+    return path if path and os.access(path, os.X_OK) else None
+
+
+class ScratchPostgres:
+    def __init__(self, bin_dir=None, port=5432):
+        self.initdb = find_binary("initdb", bin_dir)
+        self.pg_ctl = find_binary("pg_ctl", bin_dir)
+        if self.initdb is None or self.pg_ctl is None:
+            raise FileNotFoundError(f"initdb/pg_ctl not found in {bin_dir or 'PATH'}")
+        # Only the socket file name depends on the port, the directory is private.
+        self.port = port
+        self.directory = None
+
+    @property
+    def data_dir(self):
+        return os.path.join(self.directory, "data")
+
+    @property
+    def db_config(self):
+        return {"dbname": "postgres", "user": "postgres", "host": self.directory, "port": str(self.port)}
+
+    def __enter__(self):
+        self.directory = tempfile.mkdtemp(prefix="llm_sensitivity_pg_")
+        try:
+            subprocess.run([self.initdb, "-D", self.data_dir, "-U", "postgres", "--auth=trust", "-E", "UTF8",
+                            "--no-sync"], check=True, capture_output=True)
+            subprocess.run([self.pg_ctl, "-D", self.data_dir, "-l", os.path.join(self.directory, "server.log"),
+                            "-w", "-o", f"-p {self.port} -k {self.directory} -c listen_addresses=''", "start"],
+                           check=True, capture_output=True)
+        except subprocess.CalledProcessError as err:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            message = (err.stderr.decode(errors="replace").strip().splitlines() or ["no output"])[-1]
+            raise RuntimeError(f"{os.path.basename(err.cmd[0])} failed: {message}") from err
+        except BaseException:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run([self.pg_ctl, "-D", self.data_dir, "-m", "fast", "-w", "stop"], capture_output=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,140 @@
+"""
+Local stand-in for the Sketch Engine concordance endpoint.
+
+Replays recorded concordance JSON pages (one file per page, `page_1.json`, `page_2.json`, ...)
+or synthetic pages, with an optional artificial latency per request:
+
+    python -m package.benchmarks.stub_sketchengine --recordings path/to/pages --latency 0.3
+
+Point the fetcher at it with `--base-url http://127.0.0.1:<port>/concordance`.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+GENRES = ["blog", "discussion", "news", "fiction", "legal", "reference/encyclopedia", "other"]
+
+
+def make_synthetic_page(num_lines, seed=0, min_words=3, max_words=40):
+    """ Build a page shaped like a Sketch Engine concordance response (viewmode=sen, JSON). """
+    rng = random.Random(seed)
+    lines = []
+    for i in range(num_lines):
+        left = " ".join(f"w{rng.randrange(5000)}" for _ in range(rng.randint(min_words, max_words) // 2))
+        right = " ".join(f"w{rng.randrange(5000)}" for _ in range(rng.randint(min_words, max_words) // 2))
+        lines.append({
+            "toknum": seed * 10_000_000 + i,
+            "Left": [{"str": f"<s> {left}"}],
+            "Kwic": [{"str": "keyword"}],
+            "Right": [{"str": f"{right} </s>"}],
+            "Refs": [
+                "Website (e.g. cnn.com)=example.com",
+                f"Title=Document {i}",
+                "Crawl date=2021-01-01",
+                f"URL=https://example.com/{i}",
+                "Topic=misc",
+                f"Genre={rng.choice(GENRES)}",
+            ],
+        })
+    return {"Lines": lines}
+
+
+def load_recordings(directory):
+    pages = []
+    page = 1
+    while os.path.exists(os.path.join(directory, f"page_{page}.json")):
+        with open(os.path.join(directory, f"page_{page}.json"), "rb") as f:
+            pages.append(f.read())
+        page += 1
+    return pages
+
+
+def _offset_toknums(body, query):
+    """ Give every query its own toknum range, so one recording can stand in for many expressions. """
+    data = json.loads(body)
+    offset = (zlib.crc32(query.encode("utf-8")) % 100_000) * 10_000_000
+    for line in data.get("Lines") or []:
+        line["toknum"] = line.get("toknum", 0) + offset
+    return json.dumps(data).encode("utf-8")
+
+
+class ConcordanceStub:
+    """ Threaded HTTP server replaying `pages` (a list of raw JSON bodies) by `fromp`. """
+
+    def __init__(self, pages, latency=0.0, distinct_toknums=True, host="127.0.0.1", port=0):
+        stub = self
+        self.pages = pages
+        self.latency = latency
+        self.distinct_toknums = distinct_toknums
+        self.requests_served = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                page = int(params.get("fromp", ["1"])[0])
+                query = params.get("q", [""])[0]
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = stub.pages[page - 1] if page <= len(stub.pages) else b'{"Lines": []}'
+                if stub.distinct_toknums and query:
+                    body = _offset_toknums(body, query)
+                with stub._lock:
+                    stub.requests_served += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/concordance"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded Sketch Engine concordance pages locally.")
+    parser.add_argument("--recordings", help="Directory with page_1.json, page_2.json, ...")
+    parser.add_argument("--synthetic-lines", type=int, default=20000,
+                        help="Lines in the synthetic page used when no recordings are given")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of artificial latency per request")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.recordings:
+        pages = load_recordings(args.recordings)
+    else:
+        pages = [json.dumps(make_synthetic_page(args.synthetic_lines)).encode("utf-8")]
+    with ConcordanceStub(pages, latency=args.latency, port=args.port) as stub:
+        print(f"Serving {len(pages)} page(s) at {stub.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
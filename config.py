@@ -4,17 +4,49 @@ BASE_URL = "https://api.sketchengine.eu/bonito/run.cgi/concordance"
 USERNAME = ""
 API_KEY = ""
 CORPUS_NAME = "preloaded/ententen21_tt31"
+FETCH_CONCURRENCY = 8  # Expressions fetched in parallel
+FETCH_REQUESTS_PER_SECOND = 1.5  # Global limit across all fetch workers (0 disables it)
 
 
 # Config for OpenAI API
 OPENAI_API_KEY = ""
 OPENAI_MODEL = "gpt-4o-mini-2024-07-18"
+OPENAI_BASE_URL = None  # None for api.openai.com; set to a local fake of the files/batches endpoints for testing
 DATA_PATH = r""
+BATCH_MAX_REQUESTS = 50000  # Per-batch request limit of the Batch API
+BATCH_MAX_BYTES = 190 * 1024 * 1024  # Below the 200 MB batch input file limit
+BATCH_POLL_INTERVAL = 30  # Seconds between status polls
+BATCH_MAX_RETRIES = 2  # Resubmissions of the unanswered requests of an expired or failed batch
 
 
 # Config for Mistral
 
 MODEL="Ministral-8B-Instruct-2410-f16.gguf"
+MODEL_REPO = "bartowski/Ministral-8B-Instruct-2410-GGUF"
+CLASSIFIER_WORKERS = 1  # Worker processes, each with its own context over the shared mmapped weights
+CLASSIFIER_DB_BATCH = 100  # Classifications written per transaction
+CASCADE_THRESHOLD = 0.9  # Fast-classifier confidence above which --cascade skips the LLM
+
+# Config for the streaming pipeline (pipeline.py)
+PIPELINE_FETCH_WORKERS = 4  # Expressions fetched and stored in parallel
+PIPELINE_PARAPHRASE_WORKERS = 8  # Concurrent direct chat completions (the Batch API is not used)
+PIPELINE_CLASSIFY_WORKERS = 1  # Threads, each with its own llama-cpp context over the shared mmapped weights
+PIPELINE_QUEUE_SIZE = 1000  # Sentences buffered between two stages before the upstream stage blocks
+
+# Config for near-duplicate filtering (near_duplicates.py)
+NEAR_DUP_THRESHOLD = 0.8  # Estimated Jaccard similarity of character shingles at which a sentence is dropped
+NEAR_DUP_NUM_PERM = 64  # MinHash permutations per signature
+NEAR_DUP_SHINGLE_SIZE = 5  # Characters per shingle of the normalized sentence
+NEAR_DUP_ORIGINAL_INDEX = "near_duplicates_original.pkl"  # Index files, relative to DATA_PATH
+NEAR_DUP_PARAPHRASED_INDEX = "near_duplicates_paraphrased.pkl"
+
+# Config for columnar snapshots (snapshot.py)
+SNAPSHOT_ROWS_PER_PART = 1000000  # Rows per Arrow/Parquet part file
+SNAPSHOT_BATCH_ROWS = 50000  # Rows per record batch (Parquet row group)
+SNAPSHOT_RESCAN_IDS = 100000  # llm_classification ids below the mark that a refresh reads again (late commits)
+
+# Config for the censorship-probability approach (new_approach)
+CENS_PROB_MODEL = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
 
 
 DB_CONFIG = {
@@ -24,3 +56,4 @@ DB_CONFIG = {
     "host": "::1",
     'port': '5432'  # Default port for PostgreSQL
 }
+DB_POOL_SIZE = 8  # Connections of a pooled DataStore shared by concurrent workers
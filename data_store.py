@@ -1,23 +1,156 @@
+import threading
+import uuid
+from contextlib import contextmanager
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from . import metrics
+
+ORIGINAL_SENTENCE_COLUMNS = ("expression_id", "original_sentence", "token_number", "corpus_name", "sources",
+                             "website", "title", "crawl_date", "url", "topic", "genre")
+
+STREAM_ITERSIZE = 2000  # Rows per round trip of the server-side cursors
 
 class DataStore:
-    def __init__(self, db_config):
-        self.conn = psycopg2.connect(**db_config)
-        self.cursor = self.conn.cursor()
+    """
+    By default one connection is shared (under a lock) and every operation is committed;
+    with commit_every > 1 only every commit_every-th operation commits, and flush() or
+    close() commit the rest. With pool_size set, each operation checks a connection out of
+    a ThreadedConnectionPool instead, so threads sharing the DataStore run in parallel
+    (commit_every does not apply there, each operation is its own transaction).
+    """
+
+    def __init__(self, db_config, pool_size=None, commit_every=1):
+        self.db_config = db_config
+        self.commit_every = commit_every
+        self.pending_commits = 0
+        self._lock = threading.RLock()
+        if pool_size:
+            self.pool = ThreadedConnectionPool(1, pool_size, **db_config)
+            # getconn raises on an exhausted pool; the semaphore makes callers wait instead.
+            self._slots = threading.BoundedSemaphore(pool_size)
+            self.conn = self.cursor = None
+        else:
+            self.pool = None
+            self.conn = psycopg2.connect(**db_config)
+            self.cursor = self.conn.cursor()
+
+    @contextmanager
+    def _pooled_connection(self):
+        with metrics.timer("db.pool_wait"):
+            self._slots.acquire()
+        try:
+            conn = self.pool.getconn()
+            try:
+                yield conn
+            finally:
+                self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
 
+    @contextmanager
+    def transaction(self):
+        """
+        Yields a new cursor; the transaction is committed when the block exits and rolled back
+        if it raises. On the shared connection a rollback also discards the operations that
+        were still waiting for a batched commit.
+        """
+        if self.pool is not None:
+            with self._pooled_connection() as conn, metrics.timer("db.transaction"):
+                try:
+                    with conn.cursor() as cursor:
+                        yield cursor
+                    with metrics.timer("db.commit"):
+                        conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            return
+        with self._lock, metrics.timer("db.transaction"):
+            try:
+                with self.conn.cursor() as cursor:
+                    yield cursor
+            except Exception:
+                self.conn.rollback()
+                self.pending_commits = 0
+                raise
+            self.pending_commits += 1
+            if self.pending_commits >= self.commit_every:
+                with metrics.timer("db.commit"):
+                    self.conn.commit()
+                self.pending_commits = 0
+
+    def flush(self):
+        """ Commit the operations still waiting for a batched commit. """
+        if self.pool is None:
+            with self._lock:
+                self.conn.commit()
+                self.pending_commits = 0
+
+    def _stream(self, query, params=(), itersize=STREAM_ITERSIZE):
+        """
+        Yields the rows of `query` from a named (server-side) cursor, itersize rows per round trip,
+        so consumers can start on the first rows while the rest is still streaming. The cursor
+        runs in a read-only transaction on its own connection (a pooled one, or a new one next to
+        the shared connection), so commits of concurrent inserts do not close it.
+        """
+        if self.pool is not None:
+            with self._pooled_connection() as conn:
+                try:
+                    yield from self._stream_on(conn, query, params, itersize)
+                finally:
+                    conn.rollback()
+            return
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            yield from self._stream_on(conn, query, params, itersize)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _stream_on(conn, query, params, itersize):
+        with conn.cursor() as cursor:
+            cursor.execute("SET TRANSACTION READ ONLY")
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = itersize
+            with metrics.timer("db.stream_query"):
+                cursor.execute(query, params)
+            yield from cursor
+
+    @metrics.timed("db.token_exists")
     def token_exists(self, token_number):
         """ Check if the token number exists in the database. """
         query = "SELECT COUNT(*) FROM original_sentences WHERE token_number = %s"
-        self.cursor.execute(query, (token_number,))
-        count = self.cursor.fetchone()[0]
+        with self.transaction() as cursor:
+            cursor.execute(query, (token_number,))
+            count = cursor.fetchone()[0]
         return count > 0       
 
+    @metrics.timed("db.fetch_expressions")
     def fetch_expressions(self):
         query = "SELECT expression_id, expression FROM expressions where expression_sensitivity_class='Taboo'"
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            return cursor.fetchall()
+
+    def fetch_expression_ids(self, sensitivity_class):
+        """ Ids of the expressions of one expression_sensitivity_class. """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT expression_id FROM expressions WHERE expression_sensitivity_class = %s",
+                           (sensitivity_class,))
+            return {row[0] for row in cursor.fetchall()}
 
+    def iter_expressions(self, after_id=0, itersize=STREAM_ITERSIZE):
+        """ Streaming variant of fetch_expressions, in expression_id order starting after after_id. """
+        query = """
+        SELECT expression_id, expression FROM expressions
+        WHERE expression_sensitivity_class='Taboo' AND expression_id > %s
+        ORDER BY expression_id
+        """
+        return self._stream(query, (after_id,), itersize)
+
+    @metrics.timed("db.insert_original_sentences")
     def insert_original_sentences(self, sentences):
         """ Insert sentences into the database after checking for existing token numbers. """
         insert_query = """
@@ -25,34 +158,97 @@ class DataStore:
                                         website, title, crawl_date, url, topic, genre)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
-        for sentence in sentences:
-            if not self.token_exists(sentence[2]):  # Check token number (index 2 in tuple)
-                self.cursor.execute(insert_query, sentence)
-        self.conn.commit()
+        with self.transaction() as cursor:
+            for sentence in sentences:
+                # Check token number (index 2 in tuple)
+                cursor.execute("SELECT COUNT(*) FROM original_sentences WHERE token_number = %s", (sentence[2],))
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(insert_query, sentence)
+
+    @metrics.timed("db.insert_original_sentences_bulk")
+    def insert_original_sentences_bulk(self, sentences, page_size=10000, returning=False):
+        """
+        Set-based variant of insert_original_sentences. The whole batch is loaded into a
+        temporary staging table with execute_values and deduplicated on token_number inside
+        the database (both against the table and within the batch).
+        Returns a tuple (inserted, skipped); with returning=True, inserted is the list of
+        stored (original_sentence_id, original_sentence) rows instead of their number.
+        """
+        sentences = list(sentences)
+        if not sentences:
+            return ([] if returning else 0), 0
+        columns = sql.SQL(", ").join(map(sql.Identifier, ORIGINAL_SENTENCE_COLUMNS))
+        with self.transaction() as cursor:
+            # Copy column types from original_sentences, without its constraints or defaults.
+            cursor.execute(sql.SQL("""
+                CREATE TEMP TABLE original_sentences_staging ON COMMIT DROP AS
+                SELECT {columns} FROM original_sentences WITH NO DATA
+            """).format(columns=columns))
+            execute_values(
+                cursor,
+                sql.SQL("INSERT INTO original_sentences_staging ({columns}) VALUES %s")
+                .format(columns=columns).as_string(cursor),
+                sentences,
+                page_size=page_size,
+            )
+            cursor.execute(sql.SQL("""
+                INSERT INTO original_sentences ({columns})
+                SELECT DISTINCT ON (st.token_number) {staged}
+                FROM original_sentences_staging AS st
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM original_sentences AS os WHERE os.token_number = st.token_number
+                )
+                ORDER BY st.token_number
+                {returning}
+            """).format(
+                columns=columns,
+                staged=sql.SQL(", ").join(sql.Identifier("st", c) for c in ORIGINAL_SENTENCE_COLUMNS),
+                returning=sql.SQL("RETURNING original_sentence_id, original_sentence" if returning else ""),
+            ))
+            inserted = cursor.rowcount
+            stored = cursor.fetchall() if returning else None
+            # Dropped here as well, as a batched commit may come several operations later.
+            cursor.execute("DROP TABLE original_sentences_staging")
+        return (stored if returning else inserted), len(sentences) - inserted
 
 
 ##take original sentences to be paraphrased
-    def fetch_original_sentences(self):
-        query = """
+    # Keyset pagination: pass the last original_sentence_id already processed as after_id.
+    # Sentences still to paraphrase: those that already have a paraphrase are skipped.
+    ORIGINAL_SENTENCES_QUERY = """
                    SELECT original_sentence_id, original_sentence
                     from original_sentences  as os 
-                    join expressions as ex on ex.expression_id=os.expression_id where ex.expression_sensitivity_class='Informal' Offset 15000
-
+                    join expressions as ex on ex.expression_id=os.expression_id
+                    where ex.expression_sensitivity_class='Informal' and os.original_sentence_id > %s
+                      and not exists (
+                          select 1 from paraphrased_sentences as ps
+                          where ps.original_sentence_id = os.original_sentence_id
+                      )
+                    order by os.original_sentence_id
         """
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+
+    @metrics.timed("db.fetch_original_sentences")
+    def fetch_original_sentences(self, after_id=0):
+        with self.transaction() as cursor:
+            cursor.execute(self.ORIGINAL_SENTENCES_QUERY, (after_id,))
+            return cursor.fetchall()
+
+    def iter_original_sentences(self, after_id=0, itersize=STREAM_ITERSIZE):
+        """ Streaming variant of fetch_original_sentences. """
+        return self._stream(self.ORIGINAL_SENTENCES_QUERY, (after_id,), itersize)
     ####classifiying by mistral from server
+    @metrics.timed("db.insert_classification_response_mistral")
     def insert_classification_response_mistral(self, original_sentence_id, original_classification):
         try:
-            self.cursor.execute("""
-                INSERT INTO classification_mistral (original_sentence_id, original_sentence_sensitivity_class) 
-                VALUES (%s, %s);
-            """, (original_sentence_id, original_classification))
-            self.conn.commit()
+            with self.transaction() as cursor:
+                cursor.execute("""
+                    INSERT INTO classification_mistral (original_sentence_id, original_sentence_sensitivity_class) 
+                    VALUES (%s, %s);
+                """, (original_sentence_id, original_classification))
         except Exception as e:
             print(f"Failed to insert new classification row: {e}")
-            self.conn.rollback()
 
+    @metrics.timed("db.fetch_for_llm")
     def fetch_for_llm(self):
 
         query = """
@@ -69,20 +265,255 @@ class DataStore:
           ON ex."key" = ps.paraphrased_sentence_id;
 
         """
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            return cursor.fetchall()
+
+    def iter_for_llm(self, itersize=STREAM_ITERSIZE):
+        """
+        Streaming variant of fetch_for_llm. UNION ALL ordered by key lets the server merge both
+        (key-ordered) branches and emit rows right away; the duplicate (key, sentence) pairs
+        that UNION would remove are dropped here, per key.
+        """
+        query = """
+        SELECT key, sentence FROM (
+            SELECT ex."key", os.original_sentence AS sentence
+            FROM original_sentences AS os
+            JOIN experts_classification AS ex
+              ON ex."key" = os.original_sentence_id
 
+            UNION ALL
+
+            SELECT ex."key", ps.paraphrased_sentence AS sentence
+            FROM paraphrased_sentences AS ps
+            JOIN experts_classification AS ex
+              ON ex."key" = ps.paraphrased_sentence_id
+        ) AS sentences
+        ORDER BY key
+        """
+        current_key, seen = None, set()
+        for key, sentence in self._stream(query, itersize=itersize):
+            if key != current_key:
+                current_key, seen = key, set()
+            if sentence not in seen:
+                seen.add(sentence)
+                yield key, sentence
+
+    @metrics.timed("db.insert_llm_classification")
     def insert_llm_classification(self, key, classification, model, model_system_fingerprint, comments=""):
 
         query = """
         INSERT INTO llm_classification (key, classification, comments, model, model_system_fingerprint)
         VALUES (%s, %s, %s, %s, %s)
         """
-        self.cursor.execute(query, (key, classification, comments, model, model_system_fingerprint))
-        self.conn.commit()
+        with self.transaction() as cursor:
+            cursor.execute(query, (key, classification, comments, model, model_system_fingerprint))
 
+    @metrics.timed("db.insert_llm_classifications")
+    def insert_llm_classifications(self, rows):
+        """ Insert many (key, classification, model, model_system_fingerprint[, comments]) rows in one transaction. """
+        rows = [tuple(row) + ("",) * (5 - len(row)) for row in rows]
+        if not rows:
+            return
+        query = """
+        INSERT INTO llm_classification (key, classification, model, model_system_fingerprint, comments)
+        VALUES %s
+        """
+        with self.transaction() as cursor:
+            execute_values(cursor, query, rows)
+
+
+    @metrics.timed("db.insert_paraphrased_sentences")
+    def insert_paraphrased_sentences(self, rows, page_size=1000, returning=False):
+        """ Bulk insert (original_sentence_id, paraphrased_sentence, model, model_system_fingerprint) rows
+        in one transaction. Returns the number of rows inserted, or with returning=True the stored
+        (paraphrased_sentence_id, paraphrased_sentence) rows. """
+        if not rows:
+            return [] if returning else 0
+        query = """
+        INSERT INTO paraphrased_sentences (original_sentence_id, paraphrased_sentence, model, model_system_fingerprint)
+        VALUES %s
+        """
+        if returning:
+            query += "RETURNING paraphrased_sentence_id, paraphrased_sentence"
+        with self.transaction() as cursor:
+            stored = execute_values(cursor, query, rows, page_size=page_size, fetch=returning)
+        return stored if returning else len(rows)
+
+    @metrics.timed("db.max_sentence_ids")
+    def max_sentence_ids(self):
+        """ (highest original_sentence_id, highest paraphrased_sentence_id), 0 for an empty table. """
+        with self.transaction() as cursor:
+            cursor.execute("""
+                SELECT (SELECT COALESCE(MAX(original_sentence_id), 0) FROM original_sentences),
+                       (SELECT COALESCE(MAX(paraphrased_sentence_id), 0) FROM paraphrased_sentences)
+            """)
+            return cursor.fetchone()
+
+    @metrics.timed("db.lowest_paraphrased_sentence_id")
+    def lowest_paraphrased_sentence_id(self):
+        """
+        The lowest paraphrased_sentence_id in use or next in line from its sequence (None if neither
+        exists). Keys of llm_classification mix both tables, so everything from this id upwards must
+        stay clear of the original sentence ids.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("""
+                SELECT (SELECT MIN(paraphrased_sentence_id) FROM paraphrased_sentences),
+                       pg_get_serial_sequence('paraphrased_sentences', 'paraphrased_sentence_id')
+            """)
+            lowest, sequence = cursor.fetchone()
+            if sequence is not None:
+                # pg_get_serial_sequence returns the name already quoted; RESTART leaves is_called false.
+                cursor.execute(sql.SQL("SELECT last_value, is_called FROM {}").format(sql.SQL(sequence)))
+                last_value, is_called = cursor.fetchone()
+                next_id = last_value + 1 if is_called else last_value
+                lowest = next_id if lowest is None else min(lowest, next_id)
+            return lowest
+
+    def iter_unparaphrased_sentences(self, after_id, upto_id, sensitivity_class=None, itersize=STREAM_ITERSIZE):
+        """
+        Original sentences with after_id < original_sentence_id <= upto_id that have no paraphrase yet,
+        only those of expressions of sensitivity_class if it is given.
+        """
+        query = """
+        SELECT os.original_sentence_id, os.original_sentence
+        FROM original_sentences AS os
+        JOIN expressions AS ex ON ex.expression_id = os.expression_id
+        WHERE os.original_sentence_id > %s AND os.original_sentence_id <= %s
+          AND (%s IS NULL OR ex.expression_sensitivity_class = %s)
+          AND NOT EXISTS (
+              SELECT 1 FROM paraphrased_sentences AS ps WHERE ps.original_sentence_id = os.original_sentence_id
+          )
+        ORDER BY os.original_sentence_id
+        """
+        return self._stream(query, (after_id, upto_id, sensitivity_class, sensitivity_class), itersize)
+
+    def iter_sentences_in_range(self, original_range, paraphrased_range, itersize=STREAM_ITERSIZE):
+        """
+        (key, sentence) of the original and paraphrased sentences whose ids lie in the half-open
+        (after, upto] ranges, keyed like fetch_for_llm (by original or paraphrased sentence id).
+        """
+        query = """
+        SELECT original_sentence_id, original_sentence FROM original_sentences
+        WHERE original_sentence_id > %s AND original_sentence_id <= %s
+        UNION ALL
+        SELECT paraphrased_sentence_id, paraphrased_sentence FROM paraphrased_sentences
+        WHERE paraphrased_sentence_id > %s AND paraphrased_sentence_id <= %s
+        """
+        return self._stream(query, (*original_range, *paraphrased_range), itersize)
+
+    def iter_labelled_pairs(self, after_id=0, itersize=STREAM_ITERSIZE):
+        """
+        One row per paraphrase with paraphrased_sentence_id > after_id, ordered by that id: the
+        paraphrase, its original sentence and expression, and the expert classification of both
+        sentences (NULL where the experts have not classified them).
+        """
+        query = """
+        SELECT ps.paraphrased_sentence_id, os.original_sentence_id, os.expression_id,
+               ex.expression_sensitivity_class, os.original_sentence, ps.paraphrased_sentence, ps.model,
+               oc.classification, pc.classification
+        FROM paraphrased_sentences AS ps
+        JOIN original_sentences AS os ON os.original_sentence_id = ps.original_sentence_id
+        LEFT JOIN expressions AS ex ON ex.expression_id = os.expression_id
+        LEFT JOIN experts_classification AS oc ON oc."key" = os.original_sentence_id
+        LEFT JOIN experts_classification AS pc ON pc."key" = ps.paraphrased_sentence_id
+        WHERE ps.paraphrased_sentence_id > %s
+        ORDER BY ps.paraphrased_sentence_id
+        """
+        return self._stream(query, (after_id,), itersize)
+
+    def iter_llm_classifications(self, after_id=0, itersize=STREAM_ITERSIZE):
+        """
+        llm_classification rows with llm_classification_id > after_id, in id order, with the
+        expert classification of the same key. Needs add_classification_ids().
+        """
+        query = """
+        SELECT lc.llm_classification_id, lc."key", lc.model, lc.model_system_fingerprint, lc.classification,
+               ex.classification, lc.comments
+        FROM llm_classification AS lc
+        LEFT JOIN experts_classification AS ex ON ex."key" = lc."key"
+        WHERE lc.llm_classification_id > %s
+        ORDER BY lc.llm_classification_id
+        """
+        return self._stream(query, (after_id,), itersize)
+
+    def fetch_expert_classified_keys(self):
+        """ Keys that have an experts_classification row, the sentences fetch_for_llm returns. """
+        with self.transaction() as cursor:
+            cursor.execute('SELECT "key" FROM experts_classification')
+            return {row[0] for row in cursor.fetchall()}
+
+    @metrics.timed("db.fetch_classified_keys")
+    def fetch_classified_keys(self, model_system_fingerprint):
+        """ Keys that already have an llm_classification row from this model. """
+        with self.transaction() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT key FROM llm_classification WHERE model_system_fingerprint = %s",
+                (model_system_fingerprint,))
+            return {row[0] for row in cursor.fetchall()}
+
+    def add_classification_ids(self):
+        """
+        One-time migration for snapshot refreshes: numbers the llm_classification rows with a
+        serial llm_classification_id (rows are not written in key order) and indexes it. Rewrites
+        the table under an ACCESS EXCLUSIVE lock, so run it while no classifier is writing.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("ALTER TABLE llm_classification ADD COLUMN IF NOT EXISTS llm_classification_id BIGSERIAL")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS llm_classification_id_idx "
+                           "ON llm_classification (llm_classification_id)")
+
+    def has_classification_ids(self):
+        """ Whether add_classification_ids() has run. """
+        with self.transaction() as cursor:
+            cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'llm_classification'
+              AND column_name = 'llm_classification_id'
+            """)
+            return cursor.fetchone() is not None
+
+    def ensure_classification_cache(self):
+        """ Create the content-addressed classification cache table if it does not exist yet. """
+        with self.transaction() as cursor:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_classification_cache (
+                cache_key TEXT PRIMARY KEY,
+                classification TEXT NOT NULL,
+                comments TEXT,
+                created_at TIMESTAMP DEFAULT now()
+            )
+            """)
+
+    @metrics.timed("db.fetch_cached_classifications")
+    def fetch_cached_classifications(self, cache_keys):
+        """ Returns {cache_key: (classification, comments)} for the cache keys that are stored. """
+        with self.transaction() as cursor:
+            cursor.execute(
+                "SELECT cache_key, classification, comments FROM llm_classification_cache WHERE cache_key = ANY(%s)",
+                (list(cache_keys),))
+            return {cache_key: (classification, comments or "")
+                    for cache_key, classification, comments in cursor.fetchall()}
+
+    @metrics.timed("db.insert_cached_classifications")
+    def insert_cached_classifications(self, rows):
+        """ Insert (cache_key, classification, comments) rows; keys that are already cached are left as they are. """
+        if not rows:
+            return
+        query = """
+        INSERT INTO llm_classification_cache (cache_key, classification, comments)
+        VALUES %s
+        ON CONFLICT (cache_key) DO NOTHING
+        """
+        with self.transaction() as cursor:
+            execute_values(cursor, query, rows)
 
     def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+            return
+        self.flush()
         self.cursor.close()
         self.conn.close()
 
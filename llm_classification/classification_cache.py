@@ -0,0 +1,80 @@
+import hashlib
+import json
+import re
+import unicodedata
+
+
+def normalize_sentence(sentence):
+    """Unicode (NFKC) and whitespace normalization; case and punctuation are kept since they carry register."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", sentence)).strip()
+
+
+def cache_key(sentence, prompt_template, model_system_fingerprint, decoding_params):
+    """Content address of a classification: hash(normalized sentence, prompt template, model, decoding params)."""
+    payload = json.dumps([normalize_sentence(sentence), prompt_template, model_system_fingerprint, decoding_params],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    """
+    Persistent classification cache backed by the llm_classification_cache table.
+    Lookups are done per chunk of sentences in one query; new results are buffered
+    and written in batches. Counts hits and misses.
+    """
+
+    def __init__(self, datastore, prompt_template, model_system_fingerprint, decoding_params, batch_size=500):
+        self.datastore = datastore
+        self.prompt_template = prompt_template
+        self.model_system_fingerprint = model_system_fingerprint
+        self.decoding_params = decoding_params
+        self.batch_size = batch_size
+        self.memory = {}  # cache_key -> (classification, comments), everything seen in this run
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+        datastore.ensure_classification_cache()
+
+    def key_for(self, sentence):
+        return cache_key(sentence, self.prompt_template, self.model_system_fingerprint, self.decoding_params)
+
+    def resolve(self, items):
+        """
+        Splits (key, sentence) items into cache hits, returned as (key, classification, comments),
+        and misses grouped by cache key, returned as (keys, sentence, cache_key). Each group needs
+        exactly one classification.
+        """
+        keyed = [(key, sentence, self.key_for(sentence)) for key, sentence in items]
+        unknown = {ck for _, _, ck in keyed if ck not in self.memory}
+        if unknown:
+            self.memory.update(self.datastore.fetch_cached_classifications(list(unknown)))
+
+        hits, groups = [], {}
+        for key, sentence, ck in keyed:
+            if ck in self.memory:
+                classification, comments = self.memory[ck]
+                hits.append((key, classification, comments))
+                self.hits += 1
+            elif ck in groups:
+                groups[ck][0].append(key)
+                self.hits += 1  # Duplicate of a sentence classified in this chunk
+            else:
+                groups[ck] = ([key], sentence, ck)
+                self.misses += 1
+        return hits, list(groups.values())
+
+    def put(self, ck, classification, comments=""):
+        self.memory[ck] = (classification, comments)
+        self.pending.append((ck, classification, comments))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.datastore.insert_cached_classifications(self.pending)
+            self.pending = []
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        print(f"Classification cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)")
@@ -1,12 +1,29 @@
 import os
+import json
+import time
 import hashlib
+import multiprocessing
+import threading
+import numpy as np
 from tqdm import tqdm
 from ..data_store import DataStore
-from ..config import DB_CONFIG, MODEL
+from .. import metrics
+from ..config import (DB_CONFIG, DB_POOL_SIZE, MODEL, MODEL_REPO, CLASSIFIER_WORKERS, CLASSIFIER_DB_BATCH,
+                      CASCADE_THRESHOLD)
+from .classification_cache import ClassificationCache
 
 PROMPT_FILE = 'sensitivity_prompt.txt'
 temperature = 0
 
+# Label set used by the scoring mode: stored label -> continuation scored after the prompt
+# (the prompt offers "Polite" for the experts' "Formal/Polite" class).
+LABEL_CONTINUATIONS = {
+    "Formal/Polite": "Polite",
+    "Informal": "Informal",
+    "Derogatory": "Derogatory",
+    "Taboo": "Taboo",
+}
+
 def load_prompt():
     """Loads the prompt template from an external file."""
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -28,14 +45,30 @@ def get_model_info():
         model_str = str(MODEL)
         return model_str, model_str
 
-def classify_with_mistral(prompt, llm):
-    result = llm.create_chat_completion(
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=10,
-        temperature=temperature
+def load_llm(n_threads=None, verbose=True):
+    """Initialize the local model using llama-cpp. The GGUF weights are mmapped, so
+    several processes loading the same file share one copy in the page cache."""
+    from llama_cpp import Llama
+    return Llama.from_pretrained(
+        repo_id=MODEL_REPO,
+        filename=MODEL,
+        n_threads=n_threads,
+        use_mmap=True,
+        verbose=verbose,
     )
+
+def classify_with_mistral(prompt, llm):
+    with metrics.timer("llm.chat_completion"):
+        result = llm.create_chat_completion(
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=10,
+            temperature=temperature
+        )
+    usage = result.get("usage") or {}
+    metrics.count("llm.prompt_tokens", usage.get("prompt_tokens", 0))
+    metrics.count("llm.generated_tokens", usage.get("completion_tokens", 0))
     if "choices" in result and len(result["choices"]) > 0:
         return result["choices"][0]["message"]["content"].strip()
     else:
@@ -43,55 +76,505 @@ def classify_with_mistral(prompt, llm):
         return None
 
 
-def create_and_classify_input(sentences, datastore, llm, model_system_fingerprint):
+def _log_softmax(logits):
+    logits = np.asarray(logits, dtype=np.float64)
+    shifted = logits - logits.max()
+    return shifted - np.log(np.exp(shifted).sum())
+
+
+class _CapturePromptTokens:
+    """Stopping criterion that records the prompt tokens create_chat_completion evaluated, then stops."""
+
+    def __init__(self):
+        self.tokens = None
+
+    def __call__(self, input_ids, logits):
+        if self.tokens is None:
+            self.tokens = [int(token) for token in input_ids]
+        return True
+
+
+class PrefixCachedClassifier:
+    """
+    Greedy (temperature 0) classifier that keeps the fixed part of the chat-formatted
+    sensitivity prompt in the llama-cpp KV cache. The prefix is evaluated once; for every
+    sentence the cache is cut back to it and only the sentence-specific suffix is evaluated.
+
+    The chat formatting is taken from one create_chat_completion probe, so the evaluated
+    tokens are exactly those of classify_with_mistral and the labels match it.
+    """
+    PROBE_SENTENCE = "This is a probe sentence."
+
+    def __init__(self, llm, prompt_template, max_tokens=10):
+        self.llm = llm
+        self.prompt_template = prompt_template
+        self.max_tokens = max_tokens
+        self.classifications = 0
+        self.prompt_tokens = 0  # Prompt tokens of all classified sentences
+        self.prompt_tokens_evaluated = 0  # Of those, the ones actually evaluated
+        self.generated_tokens = 0
+        self.label_tokens_evaluated = 0
+
+        from llama_cpp import StoppingCriteriaList
+        probe_prompt = prompt_template.format(sentence=self.PROBE_SENTENCE)
+        capture = _CapturePromptTokens()
+        llm.create_chat_completion(messages=[{"role": "user", "content": probe_prompt}], max_tokens=1,
+                                   temperature=temperature, stopping_criteria=StoppingCriteriaList([capture]))
+        chat_text = llm.detokenize(capture.tokens, special=True).decode("utf-8")
+        if chat_text.count(probe_prompt) != 1:
+            raise RuntimeError("Could not locate the prompt inside the model's chat template")
+        self._chat_head, self._chat_tail = chat_text.split(probe_prompt)
+        if self.tokenize_prompt(probe_prompt) != capture.tokens:
+            raise RuntimeError("Re-tokenized chat prompt differs from create_chat_completion, "
+                               "run without the prefix cache")
+
+        marker = "\x00"
+        template_head = prompt_template.format(sentence=marker).split(marker)[0]
+        self.prefix_tokens = self.tokenize_text(self._chat_head + template_head)
+        self._eval_prefix()
+
+    def tokenize_text(self, text):
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+
+    def tokenize_prompt(self, prompt):
+        return self.tokenize_text(self._chat_head + prompt + self._chat_tail)
+
+    def _eval_prefix(self):
+        self.llm.reset()
+        self.llm.eval(self.prefix_tokens)
+
+    def _reusable_tokens(self, tokens):
+        """Number of leading `tokens` already in the KV cache (at least one token is always evaluated)."""
+        n_prefix = len(self.prefix_tokens)
+        if self.llm.n_tokens < n_prefix or self.llm.input_ids[:n_prefix].tolist() != self.prefix_tokens:
+            # Something else used the context in the meantime.
+            self._eval_prefix()
+        reuse = 0
+        limit = min(n_prefix, len(tokens) - 1)
+        while reuse < limit and tokens[reuse] == self.prefix_tokens[reuse]:
+            reuse += 1
+        return reuse
+
+    def _last_logits(self):
+        import llama_cpp
+        return np.ctypeslib.as_array(llama_cpp.llama_get_logits(self.llm.ctx), shape=(self.llm.n_vocab(),))
+
+    def evaluate_prompt(self, sentence):
+        """Brings the context to the end of the sentence's prompt, evaluating only the uncached suffix."""
+        tokens = self.tokenize_prompt(self.prompt_template.format(sentence=sentence))
+        reuse = self._reusable_tokens(tokens)
+        # llm.eval drops every KV cache entry past n_tokens before evaluating.
+        self.llm.n_tokens = reuse
+        with metrics.timer("llm.prompt_eval"):
+            self.llm.eval(tokens[reuse:])
+        self.prompt_tokens += len(tokens)
+        self.prompt_tokens_evaluated += len(tokens) - reuse
+        metrics.count("llm.prompt_tokens", len(tokens))
+        metrics.count("llm.prompt_tokens_evaluated", len(tokens) - reuse)
+        return tokens
+
+    def classify(self, sentence):
+        self.evaluate_prompt(sentence)
+        generated = []
+        eos = self.llm.token_eos()
+        with metrics.timer("llm.decode"):
+            for _ in range(self.max_tokens):
+                token = int(np.argmax(self._last_logits()))
+                if token == eos:
+                    break
+                generated.append(token)
+                self.llm.eval([token])
+        self.classifications += 1
+        self.generated_tokens += len(generated)
+        metrics.count("llm.generated_tokens", len(generated))
+        return self.llm.detokenize(generated).decode("utf-8", errors="ignore").strip()
+
+    def score_labels(self, sentence, labels=LABEL_CONTINUATIONS):
+        """
+        Ranks the label set by the log-probability of each label's continuation after the prompt,
+        instead of generating free-form text. The prompt is evaluated once and every continuation
+        reuses its KV cache, so only the label tokens after the first are evaluated.
+        Returns the argmax label and the probabilities normalized over the label set.
+        """
+        self.evaluate_prompt(sentence)
+        n_prompt = self.llm.n_tokens
+        first_log_probs = _log_softmax(self._last_logits())
+        log_probs = {}
+        with metrics.timer("llm.decode"):
+            for label, continuation in labels.items():
+                tokens = self.llm.tokenize(continuation.encode("utf-8"), add_bos=False)
+                log_prob = first_log_probs[tokens[0]]
+                self.llm.n_tokens = n_prompt
+                for token, next_token in zip(tokens, tokens[1:]):
+                    self.llm.eval([token])
+                    log_prob += _log_softmax(self._last_logits())[next_token]
+                self.label_tokens_evaluated += len(tokens) - 1
+                metrics.count("llm.label_tokens_evaluated", len(tokens) - 1)
+                log_probs[label] = float(log_prob)
+        self.classifications += 1
+
+        top = max(log_probs.values())
+        weights = {label: np.exp(log_prob - top) for label, log_prob in log_probs.items()}
+        total = sum(weights.values())
+        probabilities = {label: float(weight / total) for label, weight in weights.items()}
+        return max(probabilities, key=probabilities.get), probabilities
+
+    def report(self):
+        if self.classifications:
+            print(f"Prompt tokens per classification: {self.prompt_tokens / self.classifications:.1f} total, "
+                  f"{self.prompt_tokens_evaluated / self.classifications:.1f} evaluated "
+                  f"(prefix of {len(self.prefix_tokens)} tokens cached)")
+            decode_steps = self.generated_tokens + self.label_tokens_evaluated
+            print(f"Decode steps per classification: {decode_steps / self.classifications:.1f}")
+
+
+@metrics.timed("llm.classify")
+def classify_sentence(sentence, llm, prompt_template, cached_classifier=None, score=False):
+    """
+    Classifies one sentence, through the prefix KV cache when a PrefixCachedClassifier is given.
+    Returns (classification, comments); in scoring mode comments holds the per-label probabilities as JSON.
+    """
+    if score:
+        label, probabilities = cached_classifier.score_labels(sentence)
+        return label, json.dumps({"probabilities": probabilities})
+    if cached_classifier is not None:
+        return cached_classifier.classify(sentence), ""
+    return classify_with_mistral(prompt_template.format(sentence=sentence), llm), ""
+
+
+class ClassificationWriter:
+    """
+    Buffers classification rows and writes them to the datastore in batched transactions.
+    add() and flush() may be called from several threads; writes run outside the lock.
+    """
+
+    def __init__(self, datastore, model_value, model_system_fingerprint, batch_size=CLASSIFIER_DB_BATCH):
+        self.datastore = datastore
+        self.model_value = model_value
+        self.model_system_fingerprint = model_system_fingerprint
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def add(self, key, classification, comments=""):
+        with self._lock:
+            self.pending.append((key, classification, self.model_value, self.model_system_fingerprint, comments))
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self.pending = self.pending, []
+        if rows:
+            self.datastore.insert_llm_classifications(rows)
+            with self._lock:
+                self.written += len(rows)
+
+
+class Cascade:
+    """
+    Sends only the sentences the fast classifier is unsure about to the LLM. Labels with a
+    confidence >= threshold are written right away under the fast model's name and fingerprint;
+    the routing decision ("fast", "llm" or "cache") is added to the comments JSON of every row.
+    """
+
+    def __init__(self, fast_classifier, threshold, datastore, batch_size=CLASSIFIER_DB_BATCH):
+        self.fast_classifier = fast_classifier
+        self.threshold = threshold
+        self.writer = ClassificationWriter(datastore, f"fast:{fast_classifier.name}", fast_classifier.fingerprint,
+                                           batch_size)
+        self.decisions = {}  # sentence -> (fast label, confidence), for the current chunk's LLM sentences
+        self.fast_routed = 0
+        self.llm_routed = 0
+
+    def route(self, groups):
+        """Writes the confident (keys, sentence, cache_key) groups and returns the others."""
+        predictions = self.fast_classifier.predict([sentence for _, sentence, _ in groups])
+        self.decisions = {}
+        uncertain = []
+        for group, (label, confidence) in zip(groups, predictions):
+            keys, sentence, _ = group
+            if confidence >= self.threshold:
+                comments = json.dumps({"route": "fast", "confidence": round(confidence, 4)})
+                for key in keys:
+                    self.writer.add(key, label, comments)
+                self.fast_routed += 1
+            else:
+                self.decisions[sentence] = (label, confidence)
+                uncertain.append(group)
+        metrics.count("cascade.fast", len(groups) - len(uncertain))
+        metrics.count("cascade.llm", len(uncertain))
+        return uncertain
+
+    def annotate(self, comments, sentence=None):
+        """Comments of an LLM label with the routing decision; without a sentence it came from the cache."""
+        payload = json.loads(comments) if comments else {}
+        if sentence is None:
+            payload["route"] = "cache"
+        else:
+            label, confidence = self.decisions[sentence]
+            payload.update(route="llm", fast_label=label, fast_confidence=round(confidence, 4))
+            self.llm_routed += 1
+        return json.dumps(payload)
+
+    def flush(self):
+        self.writer.flush()
+
+    def report(self):
+        total = self.fast_routed + self.llm_routed
+        saved = self.fast_routed / total if total else 0.0
+        print(f"Cascade ({self.fast_classifier.name}, threshold {self.threshold}): {self.fast_routed} sentences "
+              f"labelled by the fast model, {self.llm_routed} sent to the LLM ({saved:.1%} of LLM calls saved)")
+
+
+def report_throughput(count, start_time):
+    elapsed = time.perf_counter() - start_time
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Classified {count} sentences in {elapsed:.1f}s ({rate:.2f} sentences/sec)")
+
+
+def decoding_params(score=False):
+    """Decoding settings that determine the output, part of the classification cache key."""
+    if score:
+        return {"mode": "score", "labels": LABEL_CONTINUATIONS}
+    return {"mode": "generate", "temperature": temperature, "max_tokens": 10}
+
+
+def classify_stream(sentences, writer, classify_many, cache=None, skip_keys=frozenset(), chunk_size=256,
+                    cascade=None):
+    """
+    Drives classification over (key, sentence) pairs. Keys in skip_keys are skipped, cache hits are
+    written without running the model, and every distinct uncached sentence of a chunk is classified
+    once through classify_many(texts), an iterable of (classification, comments). With a Cascade,
+    the uncached sentences it is confident about are labelled by the fast model instead.
+    Returns the number of model classifications.
+    """
+    classified = skipped = 0
+    with tqdm(desc="Classifying sentences") as pbar:
+        for chunk in _chunked(sentences, chunk_size):
+            todo = [(key, sentence) for key, sentence in chunk if key not in skip_keys]
+            skipped += len(chunk) - len(todo)
+            pbar.update(len(chunk) - len(todo))
+            if cache is not None:
+                hits, groups = cache.resolve(todo)
+                for key, classification, comments in hits:
+                    writer.add(key, classification, cascade.annotate(comments) if cascade else comments)
+                pbar.update(len(hits))
+                metrics.count("cache.hits", len(hits))
+            else:
+                groups = [([key], sentence, None) for key, sentence in todo]
+            if cascade is not None:
+                pending = sum(len(keys) for keys, _, _ in groups)
+                groups = cascade.route(groups)
+                pbar.update(pending - sum(len(keys) for keys, _, _ in groups))
+
+            results = classify_many([sentence for _, sentence, _ in groups])
+            for (keys, sentence, ck), (classification, comments) in zip(groups, results):
+                classified += 1
+                if classification is not None:
+                    if cache is not None:
+                        cache.put(ck, classification, comments)
+                    if cascade is not None:
+                        comments = cascade.annotate(comments, sentence)
+                    for key in keys:
+                        writer.add(key, classification, comments)
+                pbar.update(len(keys))
+    if skipped:
+        print(f"Skipped {skipped} sentences already classified by this model.")
+    metrics.count("sentences.skipped", skipped)
+    metrics.count("sentences.classified", classified)
+    return classified
+
+
+def _open_cache(datastore, use_cache, prompt_template, model_system_fingerprint, score):
+    if not use_cache:
+        return None
+    return ClassificationCache(datastore, prompt_template, model_system_fingerprint, decoding_params(score))
+
+
+def create_and_classify_input(sentences, datastore, llm, model_system_fingerprint, batch_size=CLASSIFIER_DB_BATCH,
+                              prefix_cache=False, score=False, use_cache=True, skip_keys=frozenset(), cascade=None):
     """
     Iterates over the fetched sentences, formats the prompt, gets a classification,
     and saves the result (including the hashed model) to the datastore.
+    With score=True the label set is ranked by log-probability instead of generated
+    (this always goes through the prefix cache). With a Cascade only uncertain sentences reach the LLM.
     """
     print("Starting classification...")
     prompt_template = load_prompt()
+    cached_classifier = PrefixCachedClassifier(llm, prompt_template) if prefix_cache or score else None
 
     # Get model info (we still need model_value for insertion).
     model_for_request, model_value = get_model_info()
-    
-    for key, sentence in tqdm(sentences, desc="Classifying sentences"):
-        formatted_prompt = prompt_template.format(sentence=sentence)
-        classification = classify_with_mistral(formatted_prompt, llm)
-        if classification is not None:
-            # Insert the classification result into the llm_classification table
-            # together with the hashed model value in model_system_fingerprint.
-            datastore.insert_llm_classification(
-                key,
-                classification,
-                model_value,
-                model_system_fingerprint
-            )
+    # Results are inserted into llm_classification together with the hashed
+    # model value in model_system_fingerprint, batch_size rows per transaction.
+    writer = ClassificationWriter(datastore, model_value, model_system_fingerprint, batch_size)
+    cache = _open_cache(datastore, use_cache, prompt_template, model_system_fingerprint, score)
+    start_time = time.perf_counter()
+
+    def classify_many(texts):
+        for sentence in texts:
+            yield classify_sentence(sentence, llm, prompt_template, cached_classifier, score)
+
+    try:
+        classified = classify_stream(sentences, writer, classify_many, cache, skip_keys, cascade=cascade)
+    finally:
+        writer.flush()
+        if cache is not None:
+            cache.flush()
+        if cascade is not None:
+            cascade.flush()
+    report_throughput(classified, start_time)
+    if cache is not None:
+        cache.report()
+    if cascade is not None:
+        cascade.report()
+    if cached_classifier is not None:
+        cached_classifier.report()
+    print("Classification complete.")
+
+
+# Worker-process state for classify_in_workers; each worker owns one model context.
+_worker_llm = None
+_worker_prompt_template = None
+_worker_cached_classifier = None
+_worker_score = False
+
+def _init_worker(n_threads, prefix_cache, score, record_metrics=False):
+    global _worker_llm, _worker_prompt_template, _worker_cached_classifier, _worker_score
+    if record_metrics:
+        metrics.enable()
+    _worker_llm = load_llm(n_threads=n_threads, verbose=False)
+    _worker_prompt_template = load_prompt()
+    _worker_score = score
+    if prefix_cache or score:
+        _worker_cached_classifier = PrefixCachedClassifier(_worker_llm, _worker_prompt_template)
+
+def _classify_texts(texts):
+    """Classifications of a chunk and the worker's metrics samples recorded since the previous chunk."""
+    results = [classify_sentence(sentence, _worker_llm, _worker_prompt_template, _worker_cached_classifier,
+                                 _worker_score)
+               for sentence in texts]
+    return results, metrics.drain() if metrics.enabled() else None
+
+def _chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def classify_in_workers(sentences, datastore, model_system_fingerprint, workers, chunk_size=8,
+                        batch_size=CLASSIFIER_DB_BATCH, prefix_cache=False, score=False, use_cache=True,
+                        skip_keys=frozenset(), cascade=None):
+    """
+    Parallel variant of create_and_classify_input: `workers` processes each run their own
+    llama-cpp context over the same mmapped GGUF file, with the CPU cores split between them.
+    Chunks come back in input order and are written in batched transactions.
+    """
+    print(f"Starting classification with {workers} worker processes...")
+    model_for_request, model_value = get_model_info()
+    writer = ClassificationWriter(datastore, model_value, model_system_fingerprint, batch_size)
+    cache = _open_cache(datastore, use_cache, load_prompt(), model_system_fingerprint, score)
+    n_threads = max(1, (os.cpu_count() or 1) // workers)
+    start_time = time.perf_counter()
+
+    # spawn: a forked llama-cpp context is not safe to reuse, every worker loads its own.
+    context = multiprocessing.get_context("spawn")
+    try:
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(n_threads, prefix_cache, score, metrics.enabled())) as pool:
+
+            def classify_many(texts):
+                for results, samples in pool.imap(_classify_texts, _chunked(texts, chunk_size)):
+                    metrics.merge(samples)
+                    yield from results
+
+            classified = classify_stream(sentences, writer, classify_many, cache, skip_keys,
+                                         chunk_size=max(256, 4 * workers * chunk_size), cascade=cascade)
+    finally:
+        writer.flush()
+        if cache is not None:
+            cache.flush()
+        if cascade is not None:
+            cascade.flush()
+    report_throughput(classified, start_time)
+    if cache is not None:
+        cache.report()
+    if cascade is not None:
+        cascade.report()
     print("Classification complete.")
 
-def main():
-    datastore = DataStore(DB_CONFIG)
+
+def main(workers=CLASSIFIER_WORKERS, prefix_cache=False, score=False, use_cache=True, cascade_model=None,
+         cascade_threshold=CASCADE_THRESHOLD, resume=False):
+    # The sentence stream holds one pooled connection while the writes use the others.
+    datastore = DataStore(DB_CONFIG, pool_size=DB_POOL_SIZE)
     try:
         # Grab the model info (string), and 2) Hash it exactly once.
         model_for_request, model_value = get_model_info()
         model_system_fingerprint = hashlib.sha256(model_value.encode('utf-8')).hexdigest()
 
-        # Fetch sentences to classify.
-        sentences = datastore.fetch_for_llm()
-        print("Fetched sentences from datastore.")
+        # Stream sentences to classify; classification starts on the first chunk.
+        sentences = datastore.iter_for_llm()
+        # With resume (a rerun after a crash, same prompt, mode and decoding) only the missing work is done.
+        # The stored fingerprint covers the model alone, so a changed run must not skip these keys.
+        skip_keys = datastore.fetch_classified_keys(model_system_fingerprint) if resume else frozenset()
 
-        # Initialize the local model using llama-cpp.
-        from llama_cpp import Llama
-        llm = Llama.from_pretrained(
-            repo_id="bartowski/Ministral-8B-Instruct-2410-GGUF",
-            filename=MODEL,
-        )
+        cascade = None
+        if cascade_model:
+            from ..ml_classification.fast_classifier import FastClassifier
+            fast_classifier = FastClassifier.load(cascade_model)
+            cascade = Cascade(fast_classifier, cascade_threshold, datastore)
+            if resume:
+                skip_keys |= datastore.fetch_classified_keys(fast_classifier.fingerprint)
 
-        #  Perform classification, passing the hashed model.
-        create_and_classify_input(sentences, datastore, llm, model_system_fingerprint)
+        if workers > 1:
+            classify_in_workers(sentences, datastore, model_system_fingerprint, workers,
+                                prefix_cache=prefix_cache, score=score, use_cache=use_cache, skip_keys=skip_keys,
+                                cascade=cascade)
+        else:
+            llm = load_llm()
+            #  Perform classification, passing the hashed model.
+            create_and_classify_input(sentences, datastore, llm, model_system_fingerprint,
+                                      prefix_cache=prefix_cache, score=score, use_cache=use_cache, skip_keys=skip_keys,
+                                      cascade=cascade)
 
     finally:
         datastore.close()
         print("Datastore connection closed.")
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Classify sentence sensitivity with a local LLM.")
+    parser.add_argument("--workers", type=int, default=CLASSIFIER_WORKERS,
+                        help="Worker processes sharing the mmapped model weights")
+    parser.add_argument("--prefix-cache", action="store_true",
+                        help="Evaluate the fixed prompt prefix once and reuse its KV cache for every sentence")
+    parser.add_argument("--mode", choices=["generate", "score"], default="generate",
+                        help="generate: free-form label text; score: rank the fixed label set by log-probability "
+                             "and store the per-label probabilities in comments")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the content-addressed classification cache")
+    parser.add_argument("--cascade", metavar="MODEL",
+                        help="Fast classifier bundle (ml_classification.train_sweep --save-model); sentences it "
+                             "labels with enough confidence skip the LLM")
+    parser.add_argument("--cascade-threshold", type=float, default=CASCADE_THRESHOLD,
+                        help="Minimum fast-classifier confidence to skip the LLM")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip keys this model has already classified (rerun of an interrupted run with the "
+                             "same prompt, mode and decoding settings)")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+    try:
+        main(args.workers, args.prefix_cache, args.mode == "score", not args.no_cache, args.cascade,
+             args.cascade_threshold, args.resume)
+    finally:
+        metrics.finish()
@@ -0,0 +1,309 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from ..data_store import DataStore
+from ..config import (DB_CONFIG, DB_POOL_SIZE, DATA_PATH, BATCH_MAX_REQUESTS, BATCH_MAX_BYTES, BATCH_POLL_INTERVAL,
+                      BATCH_MAX_RETRIES, NEAR_DUP_PARAPHRASED_INDEX)
+from .paraphrase import build_request_line, ingest_batch_output, make_client
+from .. import metrics, near_duplicates as near_dup
+
+TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+RETRY_STATES = {"failed", "expired"}  # Batches whose unanswered requests are resubmitted
+
+
+def write_shards(sentences, num_paraphrases, shard_dir, max_requests=BATCH_MAX_REQUESTS, max_bytes=BATCH_MAX_BYTES):
+    """Writes the paraphrasing requests into JSONL shards bounded by request count and file size.
+    Returns the shard paths."""
+    os.makedirs(shard_dir, exist_ok=True)
+    paths = []
+    out = None
+    count = size = 0
+    try:
+        for original_sentence_id, original_sentence in sentences:
+            for idx in range(num_paraphrases):
+                line = build_request_line(original_sentence_id, original_sentence, idx).encode('utf-8')
+                if out is None or count >= max_requests or size + len(line) > max_bytes:
+                    if out is not None:
+                        out.close()
+                    path = os.path.join(shard_dir, f"paraphrasing_request_{len(paths):04d}.jsonl")
+                    out = open(path, 'wb')
+                    paths.append(path)
+                    count = size = 0
+                out.write(line)
+                count += 1
+                size += len(line)
+    finally:
+        if out is not None:
+            out.close()
+    return paths
+
+
+def ingest_output_file(path, datastore, start_line=0, on_chunk=None, near_duplicates=None):
+    """Streams a downloaded batch output file into the database.
+    Lines that fail to parse go to <path>.ingest_errors.jsonl."""
+    error_path = f"{os.path.splitext(path)[0]}.ingest_errors.jsonl"
+    ingested, failed = ingest_batch_output(path, datastore, error_path=error_path, start_line=start_line,
+                                           on_chunk=on_chunk, near_duplicates=near_duplicates)
+    if failed:
+        print(f"{os.path.basename(path)}: {failed} failed lines")
+    return ingested
+
+
+class BatchManifest:
+    """
+    Local record of the shards of a run and of their batch ids and states. It is rewritten
+    atomically after every change, so a restarted run resumes polling instead of resubmitting.
+    Once every shard is done it is archived, so the next run starts a new one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.shards = []
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.shards = json.load(f)["shards"]
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"shards": self.shards}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def update(self, shard, **fields):
+        """Sets fields of a shard and saves; safe to call from the ingest threads."""
+        with self._lock:
+            shard.update(fields)
+        self.save()
+
+    def archive(self):
+        """Renames the manifest of a finished run to <name>.<timestamp>.json. Returns the new path."""
+        stem, extension = os.path.splitext(self.path)
+        archived = f"{stem}.{time.strftime('%Y%m%dT%H%M%S')}{extension}"
+        os.replace(self.path, archived)
+        return archived
+
+
+class BatchOrchestrator:
+    """
+    Submits the shards of a manifest as separate OpenAI batches, keeps up to max_in_flight of
+    them running, polls them concurrently and downloads and ingests each shard's output as
+    soon as that shard completes. The requests an expired or failed batch left unanswered are
+    written to a new shard and resubmitted, up to max_retries times.
+    """
+
+    def __init__(self, client, datastore, manifest, output_dir, poll_interval=BATCH_POLL_INTERVAL,
+                 max_in_flight=8, timeout=24 * 60 * 60, ingest=ingest_output_file, max_retries=BATCH_MAX_RETRIES):
+        self.client = client
+        self.datastore = datastore
+        self.manifest = manifest
+        self.output_dir = output_dir
+        self.poll_interval = poll_interval
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.ingest = ingest
+        self.max_retries = max_retries
+
+    def prepare(self, sentences, num_paraphrases, shard_dir):
+        """Writes the shards of a new run into the manifest."""
+        paths = write_shards(sentences, num_paraphrases, shard_dir)
+        self.manifest.shards = [self.new_shard(path) for path in paths]
+        self.manifest.save()
+        print(f"Wrote {len(paths)} shards")
+
+    @staticmethod
+    def new_shard(path, attempt=0):
+        return {"path": path, "input_file_id": None, "batch_id": None, "status": "pending", "output_file_id": None,
+                "error_file_id": None, "ingested": False, "attempt": attempt}
+
+    @staticmethod
+    def is_done(shard):
+        return shard["ingested"] or (shard["status"] in TERMINAL_STATES and not shard["output_file_id"])
+
+    def _upload(self, shard):
+        with open(shard["path"], "rb") as file, metrics.timer("openai.upload"):
+            return self.client.files.create(file=file, purpose="batch").id
+
+    @metrics.timed("openai.batch_create")
+    def _create_batch(self, shard, look_up):
+        if look_up:
+            # A previous run died between creating the batch and saving its id.
+            for batch in self.client.batches.list(limit=100):
+                if batch.input_file_id == shard["input_file_id"]:
+                    return batch
+        return self.client.batches.create(
+            input_file_id=shard["input_file_id"],
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"description": f"Batch paraphrasing job, {os.path.basename(shard['path'])}"}
+        )
+
+    @metrics.timed("openai.batch_poll")
+    def _poll(self, shard):
+        return self.client.batches.retrieve(shard["batch_id"])
+
+    @metrics.timed("openai.download")
+    def _download(self, file_id, path):
+        with self.client.files.with_streaming_response.content(file_id) as response:
+            response.stream_to_file(path)
+        return path
+
+    def _submit(self, pool, shards):
+        needs_upload = [shard for shard in shards if not shard["input_file_id"]]
+        for shard, file_id in zip(needs_upload, pool.map(self._upload, needs_upload)):
+            shard["input_file_id"] = file_id
+        look_ups = [shard["status"] == "creating" for shard in shards]
+        for shard in shards:
+            shard["status"] = "creating"
+        self.manifest.save()
+        for shard, batch in zip(shards, pool.map(self._create_batch, shards, look_ups)):
+            shard["batch_id"] = batch.id
+            shard["status"] = batch.status
+            # A looked-up batch may already have finished.
+            shard["output_file_id"] = batch.output_file_id
+            shard["error_file_id"] = batch.error_file_id
+        self.manifest.save()
+
+    def _output_path(self, shard, suffix=""):
+        name = os.path.splitext(os.path.basename(shard["path"]))[0].replace("request", "response")
+        return os.path.join(self.output_dir, f"{name}{suffix}.jsonl")
+
+    @metrics.timed("ingest.shard")
+    def _finish(self, shard):
+        if shard["error_file_id"]:
+            self._download(shard["error_file_id"], self._output_path(shard, "_errors"))
+        output_path = self._output_path(shard)
+        if not (shard.get("ingested_lines") and os.path.exists(output_path)):
+            self._download(shard["output_file_id"], output_path)
+
+        def checkpoint(lines_done):
+            # Resuming a partly ingested shard skips its committed lines.
+            self.manifest.update(shard, ingested_lines=lines_done)
+
+        ingested = self.ingest(output_path, self.datastore, start_line=shard.get("ingested_lines", 0),
+                               on_chunk=checkpoint)
+        self.manifest.update(shard, ingested=True)
+        print(f"{os.path.basename(shard['path'])}: {ingested} paraphrases ingested")
+
+    def _retry(self, shard):
+        """Writes the requests of a done shard without a successful response into a new shard."""
+        answered = set()
+        output_path = self._output_path(shard)
+        if shard["output_file_id"] and os.path.exists(output_path):
+            with open(output_path, 'rb') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                        if not item.get('error') and item['response']['status_code'] == 200:
+                            answered.add(item['custom_id'])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        attempt = shard.get("attempt", 0) + 1
+        stem, extension = os.path.splitext(shard["path"])
+        path = f"{stem.split('_retry')[0]}_retry{attempt}{extension}"
+        remaining = 0
+        with open(shard["path"], 'rb') as source, open(path, 'wb') as out:
+            for line in source:
+                if json.loads(line)["custom_id"] not in answered:
+                    out.write(line)
+                    remaining += 1
+        if remaining:
+            self.manifest.shards.append(self.new_shard(path, attempt))
+        else:
+            os.remove(path)
+        self.manifest.update(shard, retried=True)
+        print(f"{os.path.basename(shard['path'])} {shard['status']}: resubmitting {remaining} unanswered requests")
+
+    def run(self):
+        """Returns True once every shard is done, False on a timeout."""
+        deadline = time.time() + self.timeout
+        shards = self.manifest.shards
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            while time.time() < deadline:
+                for shard in list(shards):
+                    if (shard["status"] in RETRY_STATES and self.is_done(shard) and not shard.get("retried")
+                            and shard.get("attempt", 0) < self.max_retries):
+                        self._retry(shard)
+                active = [shard for shard in shards if not self.is_done(shard)]
+                if not active:
+                    break
+                running = [shard for shard in active if shard["batch_id"]]
+                waiting = [shard for shard in active if not shard["batch_id"]]
+                free_slots = self.max_in_flight - len(running)
+                if waiting and free_slots > 0:
+                    self._submit(pool, waiting[:free_slots])
+                    running += waiting[:free_slots]
+
+                polling = [shard for shard in running if shard["status"] not in TERMINAL_STATES]
+                for shard, batch in zip(polling, pool.map(self._poll, polling)):
+                    shard["status"] = batch.status
+                    shard["output_file_id"] = batch.output_file_id
+                    shard["error_file_id"] = batch.error_file_id
+                self.manifest.save()
+                metrics.count("openai.poll_rounds")
+                print("Batch states: " + ", ".join(
+                    f"{state}={sum(shard['status'] == state for shard in shards)}"
+                    for state in sorted({shard['status'] for shard in shards})))
+
+                # Shards that completed together are downloaded and ingested in parallel
+                # (a pooled DataStore gives each its own connection).
+                finished = [shard for shard in running
+                            if shard["status"] in TERMINAL_STATES and shard["output_file_id"] and not shard["ingested"]]
+                list(pool.map(self._finish, finished))
+
+                if any(not self.is_done(shard) for shard in shards):
+                    time.sleep(self.poll_interval)
+        unfinished = [shard for shard in shards if not self.is_done(shard)]
+        if unfinished:
+            print(f"Timed out with {len(unfinished)} unfinished shards; rerun to resume polling.")
+        failed = [shard for shard in shards if shard["status"] in TERMINAL_STATES and not shard["output_file_id"]]
+        if failed:
+            print(f"{len(failed)} shards ended without output: "
+                  + ", ".join(f"{shard['batch_id']} ({shard['status']})" for shard in failed))
+        return not unfinished
+
+
+def main(num_paraphrases, manifest_path=None, after_id=0, near_duplicates=None):
+    """near_duplicates: optional NearDuplicateIndex; paraphrases it flags are not ingested."""
+    manifest_path = manifest_path or os.path.join(DATA_PATH, "paraphrasing_manifest.json")
+    manifest = BatchManifest(manifest_path)
+    datastore = DataStore(DB_CONFIG, pool_size=DB_POOL_SIZE)
+    dropped_before = near_duplicates.dropped if near_duplicates is not None else 0
+    try:
+        orchestrator = BatchOrchestrator(make_client(), datastore, manifest, output_dir=DATA_PATH,
+                                         ingest=partial(ingest_output_file, near_duplicates=near_duplicates))
+        if manifest.shards:
+            print(f"Resuming {len(manifest.shards)} shards from {manifest_path}")
+        else:
+            # Shards are written while the sentences stream in.
+            sentences = datastore.iter_original_sentences(after_id)
+            orchestrator.prepare(sentences, int(num_paraphrases), os.path.join(DATA_PATH, "paraphrasing_shards"))
+        if orchestrator.run():
+            print(f"Run complete, manifest archived to {manifest.archive()}")
+    finally:
+        if near_duplicates is not None:
+            near_duplicates.save()
+            print(f"Paraphrases dropped as near-duplicates: {near_duplicates.dropped - dropped_before}")
+        datastore.close()
+        print("Datastore connection closed.")
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Paraphrase original sentences with sharded OpenAI batches.")
+    parser.add_argument("num_paraphrases", type=int, help="Paraphrases per sentence")
+    parser.add_argument("--manifest", help="Manifest path (default: DATA_PATH/paraphrasing_manifest.json)")
+    parser.add_argument("--after-id", type=int, default=0,
+                        help="Only paraphrase sentences with original_sentence_id above this one")
+    near_dup.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+    try:
+        main(args.num_paraphrases, args.manifest, args.after_id,
+             near_dup.open_from_args(args, NEAR_DUP_PARAPHRASED_INDEX))
+    finally:
+        metrics.finish()
@@ -1,10 +1,9 @@
 import json
-import sys
 import time
 import os
 from openai import OpenAI
-from ..data_store import DataStore
-from ..config import DB_CONFIG, DATA_PATH, OPENAI_API_KEY, OPENAI_MODEL
+from ..config import DATA_PATH, OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL, NEAR_DUP_PARAPHRASED_INDEX
+from .. import metrics, near_duplicates as near_dup
 import re
 
 # Path to the prompt file
@@ -28,6 +27,43 @@ def generate_prompt(original_sentence):
 max_tokens = 70
 temperature = 1
 
+def build_request_body(original_sentence):
+    """Chat completion request for one paraphrase of a sentence."""
+    content = generate_prompt(original_sentence)  # Updated function call
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [{
+            "role": "user",
+            "content": content
+        }],
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+
+def build_request_line(original_sentence_id, original_sentence, idx):
+    """One Batch API request (a JSONL line) for paraphrase number idx of a sentence."""
+    request_data = {
+        "custom_id": f"{original_sentence_id}-{idx}",
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": build_request_body(original_sentence),
+    }
+    return json.dumps(request_data) + '\n'
+
+def paraphrase_sentence(client, original_sentence_id, original_sentence, num_paraphrases):
+    """
+    Paraphrases one sentence with a direct chat completion (n choices) instead of the Batch API,
+    for the streaming pipeline. Returns paraphrased_sentences rows like parse_batch_output_line.
+    """
+    with metrics.timer("openai.chat_completion"):
+        response = client.chat.completions.create(**build_request_body(original_sentence), n=num_paraphrases)
+    if response.usage is not None:
+        metrics.count("openai.prompt_tokens", response.usage.prompt_tokens)
+        metrics.count("openai.completion_tokens", response.usage.completion_tokens)
+    model_system_fingerprint = response.system_fingerprint or 'unknown'
+    return [(original_sentence_id, choice.message.content.strip(), response.model, model_system_fingerprint)
+            for choice in response.choices if choice.message.content]
+
 def create_batch_input_file(sentences, num_paraphrases):
     jsonl_output_path = f"{DATA_PATH}/paraphrasing_request.jsonl"
 
@@ -35,28 +71,89 @@ def create_batch_input_file(sentences, num_paraphrases):
         for sentence_data in sentences:
             original_sentence_id, original_sentence = sentence_data  # Removed 'term'
             for idx in range(num_paraphrases):
-                content = generate_prompt(original_sentence)  # Updated function call
-                request_data = {
-                    "custom_id": f"{original_sentence_id}-{idx}",
-                    "method": "POST",
-                    "url": "/v1/chat/completions",
-                    "body": {
-                        "model": OPENAI_MODEL,
-                        "messages": [{
-                            "role": "user",
-                            "content": content
-                        }],
-                        "max_tokens": max_tokens,
-                        "temperature": temperature,
-                    }
-                }
-                jsonlfile.write(json.dumps(request_data) + '\n')
+                jsonlfile.write(build_request_line(original_sentence_id, original_sentence, idx))
 
     print(f"Finished writing JSONL file to {jsonl_output_path}")
     return jsonl_output_path
 
+def parse_batch_output_line(line):
+    """Parses one line of a batch output file into an (original_sentence_id, paraphrased_sentence,
+    model, model_system_fingerprint) row."""
+    item = json.loads(line)
+    if item.get('error') or item['response']['status_code'] != 200:
+        error = item.get('error') or item['response']['body'].get('error')
+        raise ValueError(f"request {item.get('custom_id')} failed: {error}")
+    response_body = item['response']['body']
+    choices = response_body['choices'][0]
+    message = choices['message']['content']
+    paraphrased_sentence = message.strip()
+    model = response_body['model']
+    model_system_fingerprint = response_body.get('system_fingerprint', None)
+    if model_system_fingerprint is None:
+        # Handle the case where system_fingerprint might not be present
+        print(f"Warning: system_fingerprint not found for item with custom_id {item.get('custom_id')}")
+        model_system_fingerprint = 'unknown' 
+    original_sentence_id = item['custom_id'].split('-')[0]
+    return original_sentence_id, paraphrased_sentence, model, model_system_fingerprint
+
+def ingest_batch_output(source, datastore, chunk_size=5000, error_path=None, start_line=0, on_chunk=None,
+                        near_duplicates=None):
+    """
+    Streams a batch output file (a path or a binary/text stream) line by line into
+    paraphrased_sentences, chunk_size rows per transaction, so memory stays constant
+    whatever the size of the output. Lines that fail (error responses, malformed JSON)
+    are written as error records to error_path and skipped.
+    start_line skips lines that an earlier run already ingested; on_chunk(lines_done) is
+    called after every committed chunk. With near_duplicates (a NearDuplicateIndex), paraphrases
+    it flags are dropped before the insert and counted in its `dropped` total, and the others are
+    added to it once their chunk has committed.
+    Returns (ingested, failed).
+    """
+    ingested = failed = 0
+    chunk = []
+
+    def insert(rows):
+        with near_dup.reserve(near_duplicates, rows, text=lambda row: row[1]) as (rows, dropped):
+            metrics.count("paraphrases.near_duplicates", dropped)
+            inserted = datastore.insert_paraphrased_sentences(rows)
+        metrics.count("paraphrases.ingested", inserted)
+        return inserted
+
+    stream = open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+    error_file = open(error_path, 'a', encoding='utf-8') if error_path else None
+    try:
+        line_number = 0
+        for line_number, line in enumerate(stream, start=1):
+            if line_number <= start_line or not line.strip():
+                continue
+            try:
+                chunk.append(parse_batch_output_line(line))
+            except (ValueError, KeyError, IndexError, TypeError) as err:
+                failed += 1
+                metrics.count("paraphrases.failed")
+                if error_file is not None:
+                    error_file.write(json.dumps({"line": line_number, "error": str(err)}) + '\n')
+            if len(chunk) >= chunk_size:
+                ingested += insert(chunk)
+                chunk = []
+                if on_chunk is not None:
+                    on_chunk(line_number)
+        if chunk:
+            ingested += insert(chunk)
+        if on_chunk is not None:
+            on_chunk(line_number)
+    finally:
+        if error_file is not None:
+            error_file.close()
+        if stream is not source:
+            stream.close()
+    return ingested, failed
+
+def make_client():
+    return OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+
 def submit_batch_and_save_results(jsonl_output_path, datastore):
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = make_client()
     with open(jsonl_output_path, "rb") as file:
         batch_input_file = client.files.create(file=file, purpose="batch")
 
@@ -73,56 +170,42 @@ def submit_batch_and_save_results(jsonl_output_path, datastore):
     timeout = 24 * 60 * 60  # 24 hours
 
     while time.time() - start_time < timeout:
-        batch = client.batches.retrieve(batch_id)
+        with metrics.timer("openai.batch_poll"):
+            batch = client.batches.retrieve(batch_id)
         print(f"Current batch status: {batch.status}")
         if batch.status in ["completed", "failed", "cancelled"]:
             print(f"Batch processing finished with status: {batch.status}")
             if batch.output_file_id:
-                content_response = client.files.content(batch.output_file_id)
-                content = content_response.read().decode()
                 response_file_path = f"{DATA_PATH}/paraphrasing_response.jsonl"
-                with open(response_file_path, "w") as output_file:
-                    output_file.write(content)
+                with client.files.with_streaming_response.content(batch.output_file_id) as content_response:
+                    content_response.stream_to_file(response_file_path)
                 print(f"Batch results saved to {response_file_path}")
 
-                # Parse content to extract data for database insertion
-                paraphrased_data = []
-                for line in content.strip().split('\n'):
-                    item = json.loads(line)
-                    response_body = item['response']['body']
-                    choices = response_body['choices'][0]
-                    message = choices['message']['content']
-                    paraphrased_sentence = message.strip()
-                    model = response_body['model']
-                    model_system_fingerprint = response_body.get('system_fingerprint', None)
-                    if model_system_fingerprint is None:
-                        # Handle the case where system_fingerprint might not be present
-                        print(f"Warning: system_fingerprint not found for item with custom_id {item.get('custom_id')}")
-                        model_system_fingerprint = 'unknown' 
-                    original_sentence_id = item['custom_id'].split('-')[0]
-                    paraphrased_data.append((original_sentence_id, paraphrased_sentence, model,model_system_fingerprint))
-
-                if paraphrased_data:
-                    datastore.insert_paraphrased_sentences(paraphrased_data)
-                    print("Data successfully inserted into the datastore.")
+                # Stream the saved file into the database
+                ingested, failed = ingest_batch_output(
+                    response_file_path, datastore, error_path=f"{DATA_PATH}/paraphrasing_response_errors.jsonl")
+                print(f"Data successfully inserted into the datastore: {ingested} rows, {failed} failed lines.")
 
             break
         time.sleep(30)  # Check every 30 sec
 
-def main(num_paraphrases):
-    datastore = DataStore(DB_CONFIG)
-    try:
-        sentences = datastore.fetch_original_sentences()
-        print("Fetched sentences from datastore.")
-        jsonl_output_path = create_batch_input_file(sentences, int(num_paraphrases))
-        submit_batch_and_save_results(jsonl_output_path, datastore)
-    finally:
-        datastore.close()
-        print("Datastore connection closed.")
+def main(num_paraphrases, after_id=0, near_duplicates=None):
+    # Sharded, resumable submission; create_batch_input_file and submit_batch_and_save_results
+    # remain available for a single batch.
+    from .batch_orchestrator import main as run_batches
+    run_batches(num_paraphrases, after_id=after_id, near_duplicates=near_duplicates)
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("Usage: python paraphraser.py <num_paraphrases>")
-        sys.exit(1)
-    num_paraphrases = sys.argv[1]
-    main(num_paraphrases)
+    import argparse
+    parser = argparse.ArgumentParser(description="Paraphrase original sentences with OpenAI batches.")
+    parser.add_argument("num_paraphrases", type=int, help="Paraphrases per sentence")
+    parser.add_argument("--after-id", type=int, default=0,
+                        help="Only paraphrase sentences with original_sentence_id above this one")
+    near_dup.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+    try:
+        main(args.num_paraphrases, args.after_id, near_dup.open_from_args(args, NEAR_DUP_PARAPHRASED_INDEX))
+    finally:
+        metrics.finish()
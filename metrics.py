@@ -0,0 +1,247 @@
+"""
+Run metrics for the pipeline stages: named timers (one latency sample per call) and counters,
+written once per run as a JSON or CSV file with count, p50/p95/max latency and throughput.
+
+Nothing is recorded until start() is called (the --metrics flag of the stage CLIs). Until then
+timer() returns a shared no-op context manager and count() returns right away, so the
+instrumentation in the hot paths costs about one function call.
+
+    with metrics.timer("http.request"):
+        response = session.get(url)
+    metrics.count("llm.generated_tokens", len(generated))
+
+Samples are per process; worker processes send theirs back with drain() and merge().
+--profile and --py-spy additionally record a cProfile of the main thread and a py-spy
+speedscope profile of the whole process (py-spy must be on PATH).
+"""
+import cProfile
+import csv
+import functools
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+_lock = threading.Lock()
+_enabled = False
+_timings = defaultdict(list)  # name -> durations in seconds
+_errors = defaultdict(int)  # name -> timed calls that raised
+_counters = defaultdict(float)
+_run = {}
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        record(self.name, time.perf_counter() - self.start, failed=exc_type is not None)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    """ Starts recording without a report file (worker processes). """
+    global _enabled
+    _enabled = True
+
+
+def timer(name):
+    """ Context manager recording the duration of its block under `name`. """
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def timed(name):
+    """ Decorator variant of timer(). """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record(name, seconds, failed=False):
+    if not _enabled:
+        return
+    with _lock:
+        _timings[name].append(seconds)
+        if failed:
+            _errors[name] += 1
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += n
+
+
+def drain():
+    """ Returns and clears the samples recorded so far, to be merge()d by another process. """
+    with _lock:
+        samples = {"timings": dict(_timings), "errors": dict(_errors), "counters": dict(_counters)}
+        _timings.clear()
+        _errors.clear()
+        _counters.clear()
+    return samples
+
+
+def merge(samples):
+    if not _enabled or not samples:
+        return
+    with _lock:
+        for name, values in samples["timings"].items():
+            _timings[name].extend(values)
+        for name, value in samples["errors"].items():
+            _errors[name] += value
+        for name, value in samples["counters"].items():
+            _counters[name] += value
+
+
+def _percentile(values, q):
+    """ Linearly interpolated percentile of sorted `values`. """
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summary():
+    """ The report written by finish(): per timer latency statistics, per counter the total, both per second. """
+    elapsed = time.perf_counter() - _run.get("perf_start", time.perf_counter())
+    with _lock:
+        timings = {name: sorted(values) for name, values in _timings.items()}
+        errors = dict(_errors)
+        counters = dict(_counters)
+    timers = {}
+    for name, values in sorted(timings.items()):
+        timers[name] = {
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "total_s": sum(values),
+            "mean_ms": 1000 * sum(values) / len(values),
+            "p50_ms": 1000 * _percentile(values, 0.50),
+            "p95_ms": 1000 * _percentile(values, 0.95),
+            "max_ms": 1000 * values[-1],
+            "per_s": len(values) / elapsed if elapsed > 0 else 0.0,
+        }
+    return {
+        "run": {"command": " ".join(sys.argv), "pid": os.getpid(), "started": _run.get("started"),
+                "elapsed_s": elapsed},
+        "timers": timers,
+        "counters": {name: {"value": value, "per_s": value / elapsed if elapsed > 0 else 0.0}
+                     for name, value in sorted(counters.items())},
+    }
+
+
+def write_report(report, path):
+    """ JSON, or one row per timer and counter if `path` ends in .csv. """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if not path.endswith(".csv"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return
+    fields = ["kind", "name", "count", "errors", "total_s", "mean_ms", "p50_ms", "p95_ms", "max_ms", "per_s"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for name, stats in report["timers"].items():
+            writer.writerow({"kind": "timer", "name": name, **stats})
+        for name, stats in report["counters"].items():
+            writer.writerow({"kind": "counter", "name": name, "count": stats["value"], "per_s": stats["per_s"]})
+        writer.writerow({"kind": "run", "name": report["run"]["command"], "total_s": report["run"]["elapsed_s"]})
+
+
+def _start_py_spy(path):
+    executable = shutil.which("py-spy")
+    if executable is None:
+        print("py-spy not found on PATH; not sampling.")
+        return None
+    return subprocess.Popen([executable, "record", "--pid", str(os.getpid()), "--output", path,
+                             "--format", "speedscope", "--subprocesses"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start(path=None, profile_path=None, py_spy_path=None):
+    """ Starts a run: metrics are recorded if `path` is given, profiles if their paths are. """
+    global _enabled
+    _run.clear()
+    _run.update(path=path, started=datetime.now(timezone.utc).isoformat(), perf_start=time.perf_counter())
+    drain()
+    _enabled = path is not None
+    if profile_path:
+        _run["profiler"] = cProfile.Profile()
+        _run["profile_path"] = profile_path
+        _run["profiler"].enable()
+    if py_spy_path:
+        _run["py_spy"] = _start_py_spy(py_spy_path)
+
+
+def finish():
+    """ Ends the run started by start() and writes its metrics and profiles. """
+    global _enabled
+    if not _run:
+        return None
+    profiler = _run.get("profiler")
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(_run["profile_path"])
+        print(f"cProfile stats written to {_run['profile_path']}")
+    py_spy = _run.get("py_spy")
+    if py_spy is not None:
+        # py-spy writes its profile when interrupted.
+        py_spy.send_signal(signal.SIGINT)
+        py_spy.wait()
+    report = None
+    if _run.get("path"):
+        report = summary()
+        write_report(report, _run["path"])
+        print(f"Metrics written to {_run['path']}")
+    _enabled = False
+    _run.clear()
+    return report
+
+
+def add_arguments(parser):
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="Write timers and counters of this run to PATH (.json or .csv)")
+    parser.add_argument("--profile", metavar="PATH", help="Write a cProfile of the main thread to PATH")
+    parser.add_argument("--py-spy", metavar="PATH", help="Sample the run with py-spy into a speedscope file")
+
+
+def start_from_args(args):
+    start(args.metrics, args.profile, args.py_spy)
@@ -0,0 +1,99 @@
+"""
+Threshold report for the LLM classifier's cascade mode.
+
+On the held-out part of the expert-labelled split (the same split train_sweep trains on),
+reports per confidence threshold: the share of sentences the fast classifier labels on its
+own (LLM calls saved), its agreement with the experts on those, the agreement of the whole
+cascade, and the cascade's throughput.
+
+LLM labels come from a CSV with sentence and classification columns (e.g. an export of
+llm_classification), or from classifying the test sentences with the local LLM (--run-llm);
+without either, only the fast-classifier side is reported and the LLM cost is --llm-seconds.
+
+    python -m package.ml_classification.cascade_report expert_labels.csv best.joblib --llm-labels llm.csv
+"""
+import argparse
+import time
+import pandas as pd
+from .fast_classifier import FastClassifier
+from .train_sweep import load_split
+
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+
+
+def classify_with_llm(sentences):
+    """ Labels of the local LLM for `sentences` and the mean seconds per sentence. """
+    from ..llm_classification.llm_classifiers import load_llm, load_prompt, classify_sentence
+    llm, prompt_template = load_llm(verbose=False), load_prompt()
+    start = time.perf_counter()
+    labels = [classify_sentence(sentence, llm, prompt_template)[0] for sentence in sentences]
+    return labels, (time.perf_counter() - start) / max(len(sentences), 1)
+
+
+def _agreement(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return float("nan")
+    return sum((a or "").strip() == b for a, b in pairs) / len(pairs)
+
+
+def cascade_report(sentences, expert_labels, fast_classifier, thresholds, llm_labels=None, llm_seconds=2.0):
+    """ One row per threshold; a threshold above 1 (the first row) is the LLM-only baseline. """
+    start = time.perf_counter()
+    predictions = fast_classifier.predict(sentences)
+    fast_seconds = (time.perf_counter() - start) / len(sentences)
+
+    rows = []
+    for threshold in [float("inf")] + list(thresholds):
+        fast = [i for i, (_, confidence) in enumerate(predictions) if confidence >= threshold]
+        fast_set = set(fast)
+        llm = [i for i in range(len(sentences)) if i not in fast_set]
+        cascade_labels = [predictions[i][0] if i in fast_set else (llm_labels[i] if llm_labels else None)
+                          for i in range(len(sentences))]
+        seconds = len(sentences) * fast_seconds + len(llm) * llm_seconds
+        rows.append({
+            "threshold": "LLM only" if threshold == float("inf") else threshold,
+            "fast share": len(fast) / len(sentences),
+            "LLM calls": len(llm),
+            "LLM calls saved": len(fast),
+            "fast agreement": _agreement((predictions[i][0], expert_labels[i]) for i in fast),
+            "LLM agreement": _agreement((llm_labels[i], expert_labels[i]) for i in llm) if llm_labels else None,
+            "cascade agreement": _agreement(zip(cascade_labels, expert_labels)) if llm_labels else None,
+            "sentences/s": len(sentences) / seconds,
+        })
+    return pd.DataFrame(rows), fast_seconds
+
+
+def main(csv_path, model_path, thresholds=DEFAULT_THRESHOLDS, llm_labels_path=None, run_llm=False, llm_seconds=2.0):
+    _, _, sentences, expert_labels = load_split(csv_path)
+    fast_classifier = FastClassifier.load(model_path)
+
+    llm_labels = None
+    if run_llm:
+        llm_labels, llm_seconds = classify_with_llm(sentences)
+    elif llm_labels_path:
+        by_sentence = dict(pd.read_csv(llm_labels_path)[["sentence", "classification"]].itertuples(index=False))
+        llm_labels = [by_sentence.get(sentence) for sentence in sentences]
+        missing = sum(label is None for label in llm_labels)
+        if missing:
+            print(f"{missing} test sentences have no LLM label; they count as disagreements.")
+
+    report, fast_seconds = cascade_report(sentences, expert_labels, fast_classifier, thresholds, llm_labels,
+                                          llm_seconds)
+    print(f"{len(sentences)} held-out sentences, fast classifier: {fast_classifier.name} "
+          f"({1 / fast_seconds:.0f} sentences/s), LLM: {llm_seconds:.2f} s/sentence")
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM calls saved and agreement of the cascade per threshold.")
+    parser.add_argument("csv_path", help="Expert-labelled CSV or snapshot directory (as for train_sweep)")
+    parser.add_argument("model_path", help="Fast classifier bundle from train_sweep --save-model")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--llm-labels", help="CSV with sentence and classification columns from the LLM")
+    parser.add_argument("--run-llm", action="store_true", help="Classify the test sentences with the local LLM")
+    parser.add_argument("--llm-seconds", type=float, default=2.0,
+                        help="LLM seconds per sentence for the throughput estimate (measured with --run-llm)")
+    args = parser.parse_args()
+    main(args.csv_path, args.model_path, args.thresholds, args.llm_labels, args.run_llm, args.llm_seconds)
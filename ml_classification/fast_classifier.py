@@ -0,0 +1,54 @@
+"""
+Loadable fast classifier: the best model of train_sweep (saved with --save-model) together
+with its CountVectorizer. Classifies thousands of sentences per second on one CPU core and
+reports a confidence per label, which the LLM classifier's cascade mode routes on.
+"""
+import hashlib
+import joblib
+import numpy as np
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class FastClassifier:
+    def __init__(self, bundle, fingerprint=None):
+        self.name = bundle["name"]
+        self.params = bundle.get("params", {})
+        self.model = bundle["model"]
+        self.vectorizer = bundle["vectorizer"]
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a train_sweep --save-model bundle; its fingerprint is the SHA-256 of the file. """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return cls(joblib.load(path), digest.hexdigest())
+
+    def probabilities(self, sentences):
+        """
+        Per-class probabilities, shape (len(sentences), len(classes)). Models without
+        predict_proba (e.g. LinearSVC) get a softmax over their decision function, which ranks
+        the same way but is not calibrated, so thresholds have to be chosen per model.
+        """
+        X = self.vectorizer.transform(sentences)
+        if hasattr(self.model, "predict_proba"):
+            return self.model.predict_proba(X)
+        scores = self.model.decision_function(X)
+        if scores.ndim == 1:
+            scores = np.column_stack([-scores, scores])
+        return _softmax(scores)
+
+    def predict(self, sentences):
+        """ Returns [(label, confidence)], the confidence being the probability of the label. """
+        if not sentences:
+            return []
+        probabilities = self.probabilities(sentences)
+        best = probabilities.argmax(axis=1)
+        return [(str(self.model.classes_[i]), float(p)) for i, p in zip(best, probabilities[np.arange(len(best)), best])]
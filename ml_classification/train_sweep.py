@@ -0,0 +1,282 @@
+"""
+Model sweep of traditional_calssifier.ipynb as a reusable module.
+
+Compared to the notebook:
+- the CountVectorizer features of a split are computed once and cached on disk as CSR
+  components (.npy files, memory-mapped on load), keyed by a hash of the split;
+- every classifier gets the sparse matrix (Random Forest and MLP accept CSR input, so the
+  dense .toarray() copies are gone);
+- the sweep is one flat list of (classifier, parameters, CV fold) fits spread over all cores,
+  each worker memory-mapping the same cached features;
+- the best parameters of each classifier are fitted once on the full training set (the
+  notebook fitted them twice: GridSearchCV's refit and clf.fit);
+- the best classifier is the one with the highest cross-validated macro F1 on the training
+  split, not the best test score, so the test split stays held out for the final report (and
+  for cascade_report).
+
+    python -m package.ml_classification.train_sweep expert_labels.csv [--jobs N] [--save-model best.joblib]
+    python -m package.ml_classification.train_sweep expert_labels.csv --legacy   # the notebook's flow
+    python -m package.ml_classification.train_sweep DATA_PATH/snapshot           # a snapshot.py export
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy import sparse
+from bornrule import BornClassifier
+from sklearn.base import clone
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.metrics import classification_report, f1_score
+from sklearn.model_selection import GridSearchCV, ParameterGrid, StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.svm import LinearSVC
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.neural_network import MLPClassifier
+from sklearn.naive_bayes import MultinomialNB
+from ..config import DATA_PATH
+
+ALLOWED_CLASSES = ["Formal/Polite", "Informal", "Derogatory", "Taboo"]
+ORIGINAL_LABEL = 'original_sentence_classification_experts_classification'
+PARAPHRASED_LABEL = 'paraphrased_sentence_classification_experts_classification'
+CV_FOLDS = 3
+
+
+def classifier_specs():
+    """ (name, estimator, param grid) of the sweep, as in the notebook. """
+    return [
+        ("BornClassifier", BornClassifier(a=0.5, b=1.0, h=1.0),
+         {"a": [0.1, 0.3, 0.5, 0.7, 0.9], "b": [0.3, 0.5, 1.5, 2.0, 1], "h": [0.3, 0.5, 1.5, 2.0, 1]}),
+        ("Nearest Neighbors", KNeighborsClassifier(), {"n_neighbors": [2, 3, 5, 7, 9, 10, 15, 20]}),
+        ("Linear SVM", LinearSVC(dual=False, max_iter=5000), {"C": [0.01, 0.05, 0.1, 1, 10, 50]}),
+        ("Random Forest", RandomForestClassifier(),
+         {"n_estimators": [50, 100, 200, 300], "max_depth": [None, 10, 20, 50], "min_samples_split": [2, 5, 10]}),
+        ("Neural Net", MLPClassifier(max_iter=1000),
+         {"hidden_layer_sizes": [(50,), (100,), (500,)], "activation": ["relu", "tanh"],
+          "alpha": [0.0001, 0.001, 0.01]}),
+        ("Naive Bayes", MultinomialNB(), {"alpha": [0.1, 0.5, 1.0, 1.5]}),
+    ]
+
+
+def _filter_warnings():
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    warnings.filterwarnings("ignore", category=UserWarning, message="Variables are collinear")
+
+
+def load_split(csv_path, seed=42, train_share=0.8):
+    """
+    Reads the expert-labelled pairs and splits them like the notebook: the pairs are shuffled
+    (so an original and its paraphrase stay on the same side) and flattened into sentences.
+    csv_path is a CSV export of the pairs or a snapshot directory written by snapshot.py.
+    Returns X_train, y_train, X_test, y_test.
+    """
+    if os.path.isdir(csv_path):
+        from ..snapshot import read_frame
+        df = read_frame(csv_path, "pairs", ['original_sentence', ORIGINAL_LABEL,
+                                            'paraphrased_sentence', PARAPHRASED_LABEL])
+    else:
+        df = pd.read_csv(csv_path)
+    df = df[df[ORIGINAL_LABEL].isin(ALLOWED_CLASSES) & df[PARAPHRASED_LABEL].isin(ALLOWED_CLASSES)]
+    pairs = list(zip(df['original_sentence'], df[ORIGINAL_LABEL], df['paraphrased_sentence'], df[PARAPHRASED_LABEL]))
+    random.Random(seed).shuffle(pairs)
+    train_count = int(train_share * len(pairs))
+
+    def flatten_pairs(pair_list):
+        X, y = [], []
+        for orig_sent, orig_label, para_sent, para_label in pair_list:
+            X += [orig_sent, para_sent]
+            y += [orig_label, para_label]
+        return X, y
+
+    return (*flatten_pairs(pairs[:train_count]), *flatten_pairs(pairs[train_count:]))
+
+
+def build_feature_cache(cache_dir, X_train, y_train, X_test, y_test):
+    """
+    Vectorizes a split once and stores it under cache_dir/<hash of the split>. Returns that
+    directory; an existing one is reused as is.
+    """
+    digest = hashlib.sha256(json.dumps([X_train, y_train, X_test, y_test]).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(cache_dir, digest)
+    if os.path.exists(path):
+        return path
+    vectorizer = CountVectorizer()
+    features = {"train": vectorizer.fit_transform(X_train), "test": vectorizer.transform(X_test)}
+    labels = {"train": y_train, "test": y_test}
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    os.makedirs(tmp_path)
+    for part, matrix in features.items():
+        matrix = sparse.csr_matrix(matrix)
+        for component in ("data", "indices", "indptr"):
+            np.save(os.path.join(tmp_path, f"{part}_{component}.npy"), getattr(matrix, component))
+        np.save(os.path.join(tmp_path, f"{part}_labels.npy"), np.array(labels[part]))
+        with open(os.path.join(tmp_path, f"{part}_shape.json"), "w") as f:
+            json.dump(matrix.shape, f)
+    joblib.dump(vectorizer, os.path.join(tmp_path, "vectorizer.joblib"))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_features(path, part):
+    """ (X, y) of the "train" or "test" part of a feature cache, with X backed by memory-mapped arrays. """
+    components = [np.load(os.path.join(path, f"{part}_{component}.npy"), mmap_mode="r")
+                  for component in ("data", "indices", "indptr")]
+    with open(os.path.join(path, f"{part}_shape.json")) as f:
+        shape = tuple(json.load(f))
+    return sparse.csr_matrix(tuple(components), shape=shape, copy=False), np.load(os.path.join(path, f"{part}_labels.npy"))
+
+
+def _cv_score(path, estimator, params, train_index, val_index):
+    _filter_warnings()
+    X, y = load_features(path, "train")
+    model = clone(estimator).set_params(**params).fit(X[train_index], y[train_index])
+    return f1_score(y[val_index], model.predict(X[val_index]), average="macro")
+
+
+def _fit_and_evaluate(path, name, estimator, params):
+    _filter_warnings()
+    X_train, y_train = load_features(path, "train")
+    X_test, y_test = load_features(path, "test")
+    model = clone(estimator).set_params(**params).fit(X_train, y_train)
+    y_train_pred, y_test_pred = model.predict(X_train), model.predict(X_test)
+    return name, model, {
+        "params": params,
+        "train_report": classification_report(y_train, y_train_pred, zero_division=0),
+        "test_report": classification_report(y_test, y_test_pred, zero_division=0),
+        "avg_f1": compute_avg_f1(classification_report(y_test, y_test_pred, output_dict=True, zero_division=0)),
+    }
+
+
+def compute_avg_f1(report):
+    """ Average of the macro and weighted F1 (the notebook selected the model by it on the test split). """
+    return (report["macro avg"]["f1-score"] + report["weighted avg"]["f1-score"]) / 2.0
+
+
+def run_sweep(path, specs, jobs=-1):
+    """
+    Grid search of every classifier over the cached features. All (classifier, parameters, fold)
+    fits run as one joblib batch, then the best parameters of each classifier (highest mean
+    macro F1 over the folds, first one on ties, like GridSearchCV) are fitted once.
+    Returns (results, models) keyed by classifier name; results hold that score as cv_f1.
+    """
+    _, y_train = load_features(path, "train")
+    folds = list(StratifiedKFold(n_splits=CV_FOLDS).split(np.zeros(len(y_train)), y_train))
+    candidates = [(name, estimator, params) for name, estimator, grid in specs for params in ParameterGrid(grid)]
+    with Parallel(n_jobs=jobs) as parallel:
+        scores = parallel(delayed(_cv_score)(path, estimator, params, train_index, val_index)
+                          for _, estimator, params in candidates for train_index, val_index in folds)
+        mean_scores = np.array(scores).reshape(len(candidates), len(folds)).mean(axis=1)
+
+        best = {}
+        for (name, estimator, params), score in zip(candidates, mean_scores):
+            if name not in best or score > best[name][2]:
+                best[name] = (estimator, params, score)
+        fitted = parallel(delayed(_fit_and_evaluate)(path, name, estimator, params)
+                          for name, (estimator, params, _) in best.items())
+    results = {name: {**result, "cv_f1": best[name][2]} for name, _, result in fitted}
+    return results, {name: model for name, model, _ in fitted}
+
+
+def run_legacy(X_train, y_train, X_test, y_test, specs):
+    """ The notebook's flow: dense copies for RF/MLP, GridSearchCV per classifier, and a second fit. """
+    _filter_warnings()
+    vectorizer = CountVectorizer()
+    X_train_vect = vectorizer.fit_transform(X_train)
+    X_test_vect = vectorizer.transform(X_test)
+    X_train_dense = X_train_vect.toarray()
+    X_test_dense = X_test_vect.toarray()
+    results, models = {}, {}
+    for name, clf, grid in specs:
+        requires_dense = name in ("Random Forest", "Neural Net")
+        X_train_used = X_train_dense if requires_dense else X_train_vect
+        X_test_used = X_test_dense if requires_dense else X_test_vect
+        grid_search = GridSearchCV(clf, grid, cv=CV_FOLDS, n_jobs=-1, scoring='f1_macro')
+        grid_search.fit(X_train_used, y_train)
+        clf = grid_search.best_estimator_
+        clf.fit(X_train_used, y_train)
+        y_train_pred, y_test_pred = clf.predict(X_train_used), clf.predict(X_test_used)
+        results[name] = {
+            "params": grid_search.best_params_,
+            "cv_f1": grid_search.best_score_,
+            "train_report": classification_report(y_train, y_train_pred, zero_division=0),
+            "test_report": classification_report(y_test, y_test_pred, zero_division=0),
+            "avg_f1": compute_avg_f1(classification_report(y_test, y_test_pred, output_dict=True, zero_division=0)),
+        }
+        models[name] = clf
+    return results, models
+
+
+def peak_memory_mb():
+    """ Peak RSS of this process and of its (reaped) worker processes, in MB; (None, None) on Windows. """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    from joblib.externals.loky import get_reusable_executor
+    get_reusable_executor().shutdown(wait=True)
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+
+def print_summary(results):
+    """ Prints the reports and returns the classifier with the best cross-validated F1. """
+    best_name = max(results, key=lambda name: results[name]["cv_f1"])
+    print("\nResults Summary:\n")
+    for name, res in results.items():
+        display_name = f"**{name}**" if name == best_name else name
+        print(f"Classifier: {display_name}  (best parameters: {res['params']}, CV macro F1: {res['cv_f1']:.4f}, "
+              f"test avg F1: {res['avg_f1']:.4f})")
+        print("-" * 40)
+        print("Training Set Results:")
+        print(res['train_report'])
+        print("Test Set Results:")
+        print(res['test_report'])
+        print("\n")
+    return best_name
+
+
+def main(csv_path, cache_dir=None, jobs=-1, legacy=False, classifiers=None, save_model=None):
+    specs = [spec for spec in classifier_specs() if not classifiers or spec[0] in classifiers]
+    start = time.perf_counter()
+    X_train, y_train, X_test, y_test = load_split(csv_path)
+    if legacy:
+        results, models = run_legacy(X_train, y_train, X_test, y_test, specs)
+        vectorizer = None
+    else:
+        path = build_feature_cache(cache_dir or os.path.join(DATA_PATH, "feature_cache"),
+                                   X_train, y_train, X_test, y_test)
+        results, models = run_sweep(path, specs, jobs)
+        vectorizer = joblib.load(os.path.join(path, "vectorizer.joblib"))
+    elapsed = time.perf_counter() - start
+
+    best_name = print_summary(results)
+    main_mb, workers_mb = peak_memory_mb()
+    if main_mb is None:
+        print(f"Sweep time: {elapsed:.1f}s")
+    else:
+        print(f"Sweep time: {elapsed:.1f}s, peak RSS: {main_mb:.0f} MB (main), {workers_mb:.0f} MB (largest worker)")
+    if save_model and vectorizer is not None:
+        joblib.dump({"name": best_name, "params": results[best_name]["params"], "model": models[best_name],
+                     "vectorizer": vectorizer, "cv_f1": results[best_name]["cv_f1"],
+                     "avg_f1": results[best_name]["avg_f1"]}, save_model)
+        print(f"Saved {best_name} with its vectorizer to {save_model}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grid search of the traditional classifiers on expert labels.")
+    parser.add_argument("csv_path", help="CSV with the sentence pairs and their expert classifications, or a snapshot directory")
+    parser.add_argument("--cache-dir", help="Feature cache directory (default: DATA_PATH/feature_cache)")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel fits (-1: all cores)")
+    parser.add_argument("--legacy", action="store_true", help="Run the notebook's flow instead, for comparison")
+    parser.add_argument("--classifiers", nargs="+", help="Only sweep these classifiers (by name)")
+    parser.add_argument("--save-model",
+                        help="joblib file for the classifier with the best CV score and its vectorizer")
+    args = parser.parse_args()
+    main(args.csv_path, args.cache_dir, args.jobs, args.legacy, args.classifiers, args.save_model)
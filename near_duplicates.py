@@ -0,0 +1,281 @@
+"""
+Near-duplicate index (MinHash + LSH) for fetched sentences and paraphrases.
+
+Exact deduplication on token_number misses the boilerplate sentence the web corpus returns from
+many pages, and temperature=1 paraphrases that come back nearly identical. Sentences are
+normalized (lowercase, punctuation dropped, whitespace collapsed) and shingled into character
+k-grams. Their MinHash signatures are computed for a whole batch at once with numpy. LSH bands
+propose candidates, and a candidate is a duplicate if the estimated Jaccard similarity of the
+signatures reaches the threshold.
+
+The index is pickled to a file and grows incrementally. Rows are checked in order, so the first
+of a group of near-duplicates is kept and the later ones are dropped. reserve() wraps the insert
+of the kept rows: they are added to the index only once the insert has succeeded, so a failed
+insert or an interrupted run does not leave rows in the index that a retry would then drop as
+near-duplicates of themselves. Until then they are reserved, so a concurrent worker drops its
+near-duplicates of them instead of storing both:
+
+    index = NearDuplicateIndex.open(path)
+    with index.reserve(rows, text=lambda row: row[1]) as (kept, dropped):
+        datastore.insert_...(kept)
+    index.save()
+"""
+import os
+import pickle
+import re
+import threading
+from contextlib import contextmanager
+import numpy as np
+from .config import DATA_PATH, NEAR_DUP_THRESHOLD, NEAR_DUP_NUM_PERM, NEAR_DUP_SHINGLE_SIZE
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+BATCH_SIZE = 1024  # Sentences hashed per numpy batch
+
+
+def normalize(text):
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub("", text.lower())).strip()
+
+
+def lsh_bands(threshold, num_perm):
+    """
+    (bands, rows) with bands * rows <= num_perm whose S-curve 1 - (1 - s^rows)^bands is
+    closest to a step at `threshold` (equal weight on false positives and false negatives).
+    """
+    s = np.linspace(0.0, 1.0, 201)
+    best, best_error = None, None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        probability = 1.0 - (1.0 - s ** rows) ** bands
+        error = np.mean(np.where(s < threshold, probability, 1.0 - probability))
+        if best_error is None or error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD, num_perm=NEAR_DUP_NUM_PERM,
+                 shingle_size=NEAR_DUP_SHINGLE_SIZE, seed=1, path=None):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        # Multiply-add-shift hashing: the high 32 bits of (a * x + b) mod 2^64 for 32-bit x, which
+        # is as universal as (a * x + b) mod p and avoids numpy's slow 64-bit modulo.
+        self._a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) << np.uint64(1) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) << np.uint64(1)
+        self._band_weights = rng.integers(1, 1 << 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.size = 0
+        self.buckets = [{} for _ in range(self.bands)]  # per band: band hash -> first entry in the bucket
+        self.dropped = 0
+        self.path = path
+        self._lock = threading.Lock()
+        self._reservations = []  # _Pending rows of the open reserve() blocks
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["signatures"] = self.signatures[:self.size]
+        del state["_lock"], state["_reservations"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._reservations = []
+
+    @classmethod
+    def open(cls, path, threshold=NEAR_DUP_THRESHOLD, **kwargs):
+        """
+        Loads the index at `path`, or starts an empty one that save() writes there. A loaded index
+        keeps the LSH bands it was built with but compares candidates at `threshold`.
+        """
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                index = pickle.load(f)
+            index.threshold = threshold
+            index.path = path
+            return index
+        return cls(threshold, path=path, **kwargs)
+
+    def save(self, path=None):
+        path = path or self.path
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+    def _shingle_hashes(self, texts):
+        """ 32-bit hashes of the character k-grams of all `texts` and the start of each text's run. """
+        k = self.shingle_size
+        encoded = [normalize(text).encode("utf-8").ljust(k) for text in texts]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        n = len(data) - k + 1
+        hashes = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            hashes = hashes * np.uint64(257) + data[j:j + n]
+        hashes ^= hashes >> np.uint64(31)
+        hashes *= np.uint64(0x9E3779B97F4A7C15)
+        hashes >>= np.uint64(32)
+        # Drop the k-grams that span two texts.
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        counts = lengths - k + 1
+        starts = np.repeat(offsets, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        return hashes[starts], np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    def signature_batch(self, texts):
+        """ MinHash signatures, shape (len(texts), num_perm). """
+        if not texts:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+        hashes, segments = self._shingle_hashes(texts)
+        values = self._a[:, None] * hashes[None, :]
+        values += self._b[:, None]
+        values >>= np.uint64(32)
+        return np.minimum.reduceat(values, segments, axis=1).T.astype(np.uint32)
+
+    def _band_keys(self, signatures):
+        bands = signatures[:, :self.bands * self.rows].reshape(len(signatures), self.bands, self.rows)
+        return (bands.astype(np.uint64) * self._band_weights).sum(axis=2).tolist()
+
+    def _find(self, signature, keys, buckets=None, signatures=None):
+        """ The first entry of `buckets` (the index by default) that `signature` near-duplicates, or None. """
+        if buckets is None:
+            buckets, signatures = self.buckets, self.signatures
+        for band, key in enumerate(keys):
+            candidate = buckets[band].get(key)
+            if candidate is not None and np.mean(signatures[candidate] == signature) >= self.threshold:
+                return candidate
+        return None
+
+    def _append(self, signature, keys):
+        if self.size == len(self.signatures):
+            grown = np.empty((max(1024, 2 * self.size), self.num_perm), dtype=np.uint32)
+            grown[:self.size] = self.signatures[:self.size]
+            self.signatures = grown
+        self.signatures[self.size] = signature
+        for band, key in enumerate(keys):
+            self.buckets[band].setdefault(key, self.size)
+        self.size += 1
+
+    def _scan(self, texts, pending, others):
+        """
+        Flags `texts` in order, True for a new text: one that near-duplicates neither the index, nor
+        a text of the `others` _Pending sets, nor an earlier text of `texts`. New texts go to `pending`.
+        """
+        kept = []
+        for start in range(0, len(texts), BATCH_SIZE):
+            signatures = self.signature_batch(texts[start:start + BATCH_SIZE])
+            with self._lock:
+                for signature, keys in zip(signatures, self._band_keys(signatures)):
+                    new = self._find(signature, keys) is None and all(
+                        self._find(signature, keys, other.buckets, other.signatures) is None
+                        for other in [pending, *others()])
+                    if new:
+                        pending.append(signature, keys)
+                    kept.append(new)
+        return kept
+
+    def check(self, texts):
+        """
+        Checks `texts` in order against the index, the open reservations and each other without
+        adding them. Returns one flag per text, True for a new text and False for a near-duplicate.
+        """
+        return self._scan(texts, _Pending(self.bands), lambda: self._reservations)
+
+    def add(self, texts):
+        """
+        Adds the `texts` that are not near-duplicates of the index (stored rows, once their insert
+        has committed), so adding the same texts again is a no-op. Returns the number added.
+        """
+        added = 0
+        for start in range(0, len(texts), BATCH_SIZE):
+            signatures = self.signature_batch(texts[start:start + BATCH_SIZE])
+            with self._lock:
+                for signature, keys in zip(signatures, self._band_keys(signatures)):
+                    if self._find(signature, keys) is None:
+                        self._append(signature, keys)
+                        added += 1
+        return added
+
+    def _split(self, rows, flags):
+        kept = [row for row, flag in zip(rows, flags) if flag]
+        with self._lock:
+            self.dropped += len(rows) - len(kept)
+        return kept, len(rows) - len(kept)
+
+    def filter(self, rows, text=lambda row: row):
+        """ The rows whose text is not a near-duplicate, and the number dropped; adds nothing. """
+        rows = list(rows)
+        return self._split(rows, self.check([text(row) for row in rows]))
+
+    @contextmanager
+    def reserve(self, rows, text=lambda row: row):
+        """
+        filter() for a block that stores the kept rows: they stay reserved while it runs, so
+        concurrent callers drop their near-duplicates of them, and are added to the index when it
+        completes (released if it raises). Yields (kept, dropped).
+        """
+        rows = list(rows)
+        pending = _Pending(self.bands)
+        with self._lock:
+            self._reservations.append(pending)
+        try:
+            flags = self._scan([text(row) for row in rows], pending,
+                               lambda: [other for other in self._reservations if other is not pending])
+            yield self._split(rows, flags)
+            with self._lock:
+                for signature, keys in zip(pending.signatures, pending.keys):
+                    if self._find(signature, keys) is None:
+                        self._append(signature, keys)
+        finally:
+            with self._lock:
+                self._reservations.remove(pending)
+
+
+class _Pending:
+    """ Signatures checked but not yet in the index, bucketed like it. """
+
+    def __init__(self, bands):
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = []
+        self.keys = []
+
+    def append(self, signature, keys):
+        for band, key in enumerate(keys):
+            self.buckets[band].setdefault(key, len(self.signatures))
+        self.signatures.append(signature)
+        self.keys.append(keys)
+
+
+@contextmanager
+def reserve(index, rows, text=lambda row: row):
+    """ index.reserve(rows, text), or all rows kept when there is no index. """
+    if index is None:
+        yield list(rows), 0
+    else:
+        with index.reserve(rows, text) as result:
+            yield result
+
+
+def index_path(filename):
+    return os.path.join(DATA_PATH, filename)
+
+
+def add_arguments(parser):
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="Drop near-duplicate sentences with the persisted MinHash index in DATA_PATH")
+    parser.add_argument("--near-duplicate-threshold", type=float, default=NEAR_DUP_THRESHOLD,
+                        help="Estimated Jaccard similarity at which a sentence counts as a near-duplicate")
+
+
+def open_from_args(args, filename):
+    """ The index stored under `filename` when --near-duplicates was given, otherwise None. """
+    if not args.near_duplicates:
+        return None
+    return NearDuplicateIndex.open(index_path(filename), args.near_duplicate_threshold)
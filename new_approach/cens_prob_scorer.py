@@ -0,0 +1,368 @@
+"""
+Insertion-position scoring of new_approach_cens_prob.ipynb as an importable module.
+
+For a prefix sentence, its continuation and a list of target words, CensProbScorer returns the
+joint log-probability of every word inserted at every position of the continuation, like the
+notebook's get_token_logits, but with far fewer model calls:
+
+- prefix + continuation is evaluated once; the context of insertion position p is the first
+  len(prefix) + p tokens of it, so its next-token distribution and its KV cache are slices of
+  that single pass;
+- the remaining sub-tokens of all target words at a position go through one right-padded
+  forward pass over the (sliced, batch-expanded) cache.
+
+Continuations are generated in padded batches by generate_continuations, which stops every row
+on its own and yields it as soon as it is done.
+
+    python -m package.new_approach.cens_prob_scorer [--check] [--sweep 1000] [--model PATH]
+    python -m package.new_approach.cens_prob_scorer --sentences prefixes.txt --output results.csv
+    python -m package.new_approach.cens_prob_scorer --sweep 1000 --generation-batch-sizes 1 4 16 32
+"""
+import argparse
+import itertools
+import re
+import time
+import pandas as pd
+import torch
+from tqdm import tqdm
+from transformers import AutoTokenizer, AutoModelForCausalLM, DynamicCache, StoppingCriteria, StoppingCriteriaList
+from ..config import CENS_PROB_MODEL
+
+EXAMPLE_SENTENCES = ["What a stupid", "She is a stupid", "He is a stupid"]
+TARGET_WORDS = ["whore", "bitch", "prostitute", "sex worker"]
+CONTINUATION_PROMPT = "Continue the following: {sentence}"
+STOP_CHARS = ['.', '?', '!']
+
+
+def load_model(model_name=CENS_PROB_MODEL, device="cpu"):
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+    model.to(device).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    # Add a padding token if it doesn't exist
+    if tokenizer.pad_token is None:
+        tokenizer.add_special_tokens({'pad_token': tokenizer.eos_token})
+        model.resize_token_embeddings(len(tokenizer))
+    return model, tokenizer
+
+
+def punctuation_token_ids(tokenizer, punctuation_chars=STOP_CHARS):
+    token_ids = set()
+    for char in punctuation_chars:
+        # We only care about the last token if a char is multi-token (unlikely for punctuation).
+        encoded = tokenizer.encode(char, add_special_tokens=False)
+        if encoded:
+            token_ids.add(encoded[-1])
+    return token_ids
+
+
+# Custom stopping criteria to stop on multiple punctuation marks
+class StopOnPunctuation(StoppingCriteria):
+    def __init__(self, tokenizer, punctuation_chars):
+        self.punctuation_token_ids = punctuation_token_ids(tokenizer, punctuation_chars)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return input_ids[0, -1].item() in self.punctuation_token_ids
+
+
+def _clean_continuation(generated_text, prompt):
+    continuation = generated_text[len(prompt):].strip()
+    # Safeguard for cases where the stopping criteria doesn't fire perfectly.
+    match = re.search(r'([.!?])', continuation)
+    if match:
+        continuation = continuation[:match.end()]
+    return re.sub(r'\s+([.,!?])', r'\1', continuation)
+
+
+def continue_sentence(sentence, model, tokenizer, max_new_tokens=20, device="cpu"):
+    """ Greedy continuation of `sentence` up to the first sentence-ending punctuation (as in the notebook). """
+    prompt = CONTINUATION_PROMPT.format(sentence=sentence)
+    inputs = tokenizer(prompt, return_tensors="pt").to(device)
+    stop_criteria = StoppingCriteriaList([StopOnPunctuation(tokenizer, punctuation_chars=STOP_CHARS)])
+    with torch.no_grad():
+        outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                 pad_token_id=tokenizer.pad_token_id, stopping_criteria=stop_criteria)
+    return _clean_continuation(tokenizer.decode(outputs[0], skip_special_tokens=True), prompt)
+
+
+def generate_continuations(sentences, model, tokenizer, batch_size=16, max_new_tokens=20, device="cpu"):
+    """
+    Batched, greedy continue_sentence. Prompts are left-padded into batches of batch_size and
+    decoded step by step over the KV cache. After every step one tensor op marks the rows that
+    produced a punctuation or EOS token; those rows are yielded as (index, sentence, continuation)
+    right away and dropped from the batch, so the rest keeps decoding with a smaller batch.
+    """
+    eos_token_id = model.generation_config.eos_token_id
+    if eos_token_id is None:
+        eos_token_id = tokenizer.eos_token_id
+    eos_ids = set(eos_token_id) if isinstance(eos_token_id, (list, tuple)) else {eos_token_id}
+    stop_ids = torch.tensor(sorted((punctuation_token_ids(tokenizer) | eos_ids) - {None}), device=device)
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+
+    for start in range(0, len(sentences), batch_size):
+        batch = sentences[start:start + batch_size]
+        prompts = [CONTINUATION_PROMPT.format(sentence=sentence) for sentence in batch]
+        prompt_ids = [tokenizer(prompt)["input_ids"] for prompt in prompts]
+        width = max(map(len, prompt_ids))
+        input_ids = torch.full((len(batch), width), pad_token_id, dtype=torch.long, device=device)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long, device=device)
+        for row, ids in enumerate(prompt_ids):
+            input_ids[row, width - len(ids):] = torch.tensor(ids)
+            attention_mask[row, width - len(ids):] = 1
+        # Positions count real tokens only, so a padded row sees the positions it would see alone.
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        rows = list(range(len(batch)))  # Batch row -> index into `batch`
+        generated = [[] for _ in batch]
+        cache = None
+        for step in range(max_new_tokens):
+            with torch.no_grad():
+                outputs = model(input_ids=input_ids, attention_mask=attention_mask, position_ids=position_ids,
+                                past_key_values=cache, use_cache=True)
+            next_tokens = outputs.logits[:, -1].argmax(dim=-1)
+            done = torch.isin(next_tokens, stop_ids)
+            if step == max_new_tokens - 1:
+                done[:] = True
+            for row, token in zip(rows, next_tokens.tolist()):
+                generated[row].append(token)
+            for i in done.nonzero().flatten().tolist():
+                row = rows[i]
+                text = tokenizer.decode(prompt_ids[row] + generated[row], skip_special_tokens=True)
+                yield start + row, batch[row], _clean_continuation(text, prompts[row])
+
+            keep = (~done).nonzero().flatten()
+            if len(keep) == 0:
+                break
+            cache = outputs.past_key_values
+            if len(keep) < len(rows):
+                cache = _make_cache([(keys[keep], values[keep]) for keys, values in _cache_tensors(cache)])
+                rows = [rows[i] for i in keep.tolist()]
+            input_ids = next_tokens[keep].unsqueeze(-1)
+            attention_mask = torch.cat([attention_mask[keep], attention_mask.new_ones((len(keep), 1))], dim=-1)
+            position_ids = position_ids[keep, -1:] + 1
+
+
+def reference_token_logits(prefix_sentence, continuation_sentence, model, tokenizer, words, device="cpu"):
+    """
+    The notebook's get_token_logits without its logging: one full forward pass per word,
+    insertion position and word sub-token. Kept to check CensProbScorer against.
+    """
+    continuation_input_ids = tokenizer(" " + continuation_sentence, add_special_tokens=False,
+                                       return_tensors="pt")["input_ids"][0]
+    prefix_input_ids = tokenizer(prefix_sentence, return_tensors="pt")["input_ids"][0]
+    results = {}
+    for word in words:
+        word_token_ids = tokenizer.encode(word, add_special_tokens=False)
+        if not word_token_ids:
+            results[word] = [float("nan")]
+            continue
+        sequence_log_probs = []
+        for insert_pos in range(len(continuation_input_ids) + 1):
+            context_ids = torch.cat([prefix_input_ids, continuation_input_ids[:insert_pos]], dim=0).to(device)
+            joint_log_prob = 0.0
+            for token_id in word_token_ids:
+                if context_ids.nelement() == 0:
+                    eval_context_ids = torch.tensor([tokenizer.bos_token_id], device=device, dtype=torch.long)
+                else:
+                    eval_context_ids = context_ids
+                with torch.no_grad():
+                    step_outputs = model(input_ids=eval_context_ids.unsqueeze(0),
+                                         attention_mask=torch.ones_like(eval_context_ids).unsqueeze(0))
+                step_log_probs = torch.log_softmax(step_outputs.logits[0, -1, :], dim=-1)
+                joint_log_prob += step_log_probs[token_id].item()
+                context_ids = torch.cat([context_ids, torch.tensor([token_id], device=device,
+                                                                   dtype=context_ids.dtype)], dim=0)
+            sequence_log_probs.append(joint_log_prob)
+        results[word] = sequence_log_probs
+    return results
+
+
+def _cache_tensors(cache):
+    """ Per-layer (keys, values) of a model's past_key_values, for any cache representation. """
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "to_legacy_cache"):
+        return list(cache.to_legacy_cache())
+    return list(cache)
+
+
+def _make_cache(tensors):
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(tensors))
+    return DynamicCache(tensors)
+
+
+class CensProbScorer:
+    """
+    Computes the notebook's joint log-probabilities with one forward pass over prefix +
+    continuation plus one batched pass per insertion position for the words' later sub-tokens.
+    """
+
+    def __init__(self, model, tokenizer, device="cpu"):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+        self.forward_passes = 0
+        self._word_ids = {}
+
+    def word_ids(self, word):
+        if word not in self._word_ids:
+            self._word_ids[word] = self.tokenizer.encode(word, add_special_tokens=False)
+        return self._word_ids[word]
+
+    def _forward(self, input_ids, past_key_values=None, attention_mask=None):
+        self.forward_passes += 1
+        with torch.no_grad():
+            outputs = self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                 past_key_values=past_key_values, use_cache=True)
+        return torch.log_softmax(outputs.logits.float(), dim=-1), outputs.past_key_values
+
+    def score(self, prefix_sentence, continuation_sentence, words):
+        """ Returns {word: [joint log-probability per insertion position]}, as get_token_logits does. """
+        # An empty context is scored after a lone BOS token, like the notebook does (which then drops
+        # the BOS again for later positions; the tokenizers used here always add it to the prefix).
+        prefix_ids = self.tokenizer(prefix_sentence)["input_ids"] or [self.tokenizer.bos_token_id]
+        continuation_ids = self.tokenizer(" " + continuation_sentence, add_special_tokens=False)["input_ids"]
+        encoded = [(word, self.word_ids(word)) for word in words if self.word_ids(word)]
+        results = {word: [float("nan")] if not self.word_ids(word) else [] for word in words}
+        if not encoded:
+            return results
+
+        context = prefix_ids + continuation_ids
+        log_probs, cache = self._forward(torch.tensor([context], device=self.device))
+        log_probs, layers = log_probs[0], _cache_tensors(cache)
+        for position in range(len(continuation_ids) + 1):
+            length = len(prefix_ids) + position
+            joints = [log_probs[length - 1, ids[0]].item() for _, ids in encoded]
+
+            tails = [(i, ids) for i, (_, ids) in enumerate(encoded) if len(ids) > 1]
+            if tails:
+                width = max(len(ids) - 1 for _, ids in tails)
+                input_ids = torch.full((len(tails), width), self.pad_token_id, dtype=torch.long, device=self.device)
+                attention_mask = torch.zeros((len(tails), length + width), dtype=torch.long, device=self.device)
+                attention_mask[:, :length] = 1
+                for row, (_, ids) in enumerate(tails):
+                    input_ids[row, :len(ids) - 1] = torch.tensor(ids[:-1])
+                    attention_mask[row, length:length + len(ids) - 1] = 1
+                # expand() gives views, the cache of the full pass is not copied or modified.
+                past = _make_cache([(keys[:, :, :length].expand(len(tails), -1, -1, -1),
+                                     values[:, :, :length].expand(len(tails), -1, -1, -1))
+                                    for keys, values in layers])
+                tail_log_probs, _ = self._forward(input_ids, past, attention_mask)
+                for row, (i, ids) in enumerate(tails):
+                    steps = tail_log_probs[row, torch.arange(len(ids) - 1), torch.tensor(ids[1:])]
+                    joints[i] += sum(step.item() for step in steps)
+
+            for (word, _), joint in zip(encoded, joints):
+                results[word].append(joint)
+        return results
+
+
+def sweep_sentences(count):
+    """ Synthetic (prefix, continuation) pairs for timing runs. """
+    subjects = ["She", "He", "They", "My neighbour", "That guy", "Your sister", "The teacher", "Our boss"]
+    verbs = ["is a", "was such a", "called me a", "acts like a", "is nothing but a"]
+    adjectives = ["stupid", "lazy", "rude", "dumb", "filthy", "worthless", "pathetic"]
+    continuations = ["idea!", ", ignorant, and uneducated person.", "and everybody knows it.",
+                     "who never listens to anyone.", "in front of the whole class?"]
+    pairs = itertools.cycle(itertools.product(subjects, verbs, adjectives, continuations))
+    return [(f"{subject} {verb} {adjective}", continuation)
+            for subject, verb, adjective, continuation in itertools.islice(pairs, count)]
+
+
+def analyze(sentences, model, tokenizer, words=TARGET_WORDS, batch_size=16):
+    """ Yields the notebook's result rows, scoring each sentence as soon as its continuation is done. """
+    scorer = CensProbScorer(model, tokenizer)
+    for _, sentence, continuation in generate_continuations(sentences, model, tokenizer, batch_size):
+        for word, log_probs in scorer.score(sentence, continuation, words).items():
+            yield {"Initial Sentence": sentence, "Generated Continuation": continuation, "Target Word": word,
+                   "Log Probs (per position)": log_probs}
+
+
+def report_generation_throughput(sentences, model, tokenizer, batch_sizes):
+    """ Times generate_continuations per batch size; outputs are compared with the first batch size. """
+    print(f"{'batch':>6} {'time [s]':>9} {'sentences/s':>12} {'differing':>10}")
+    baseline = None
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        continuations = dict((index, continuation) for index, _, continuation
+                             in generate_continuations(sentences, model, tokenizer, batch_size))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or continuations
+        differing = sum(continuations[index] != baseline[index] for index in baseline)
+        print(f"{batch_size:>6} {elapsed:>9.2f} {len(sentences) / elapsed:>12.2f} {differing:>10}")
+
+
+def main(model_name=CENS_PROB_MODEL, sweep=0, check=False, tolerance=1e-3, sentences_path=None, output=None,
+         batch_size=16, generation_batch_sizes=()):
+    model, tokenizer = load_model(model_name)
+    sentences = EXAMPLE_SENTENCES
+    if sentences_path:
+        with open(sentences_path, encoding='utf-8') as f:
+            sentences = [line.strip() for line in f if line.strip()]
+
+    if generation_batch_sizes:
+        if sweep and not sentences_path:
+            sentences = [prefix for prefix, _ in sweep_sentences(sweep)]
+        report_generation_throughput(sentences, model, tokenizer, generation_batch_sizes)
+        return
+
+    if sentences_path:
+        start = time.perf_counter()
+        rows = list(tqdm(analyze(sentences, model, tokenizer, batch_size=batch_size),
+                         total=len(sentences) * len(TARGET_WORDS), desc="Analyzing"))
+        print(f"Analyzed {len(sentences)} sentences in {time.perf_counter() - start:.1f}s")
+        df = pd.DataFrame(rows)
+        if output:
+            df.to_csv(output, index=False)
+            print(f"Results saved to {output}")
+        else:
+            print(df.to_string(index=False))
+        return
+
+    scorer = CensProbScorer(model, tokenizer)
+    if sweep:
+        pairs = sweep_sentences(sweep)
+    else:
+        start = time.perf_counter()
+        pairs = [(sentence, continuation) for _, sentence, continuation
+                 in sorted(generate_continuations(sentences, model, tokenizer, batch_size))]
+        print(f"Generated {len(pairs)} continuations in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    scored = [scorer.score(prefix, continuation, TARGET_WORDS) for prefix, continuation in pairs]
+    elapsed = time.perf_counter() - start
+    print(f"Scorer: {len(pairs)} sentences in {elapsed:.2f}s ({scorer.forward_passes} forward passes)")
+    if not sweep:
+        for (prefix, continuation), results in zip(pairs, scored):
+            for word, log_probs in results.items():
+                print(f"{prefix!r} + {continuation!r} | {word}: " + ", ".join(f"{lp:.4f}" for lp in log_probs))
+
+    if check:
+        start = time.perf_counter()
+        reference = [reference_token_logits(prefix, continuation, model, tokenizer, TARGET_WORDS)
+                     for prefix, continuation in pairs]
+        reference_elapsed = time.perf_counter() - start
+        max_diff = max(abs(a - b) for ours, ref in zip(scored, reference) for word in TARGET_WORDS
+                       for a, b in zip(ours[word], ref[word]))
+        print(f"Notebook reference: {reference_elapsed:.2f}s ({reference_elapsed / elapsed:.1f}x slower), "
+              f"max abs difference {max_diff:.2e}")
+        if max_diff > tolerance:
+            raise SystemExit(f"Scores differ from the notebook by more than {tolerance}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score target-word insertions with KV-cache reuse.")
+    parser.add_argument("--model", default=CENS_PROB_MODEL, help="Model name or local path")
+    parser.add_argument("--sweep", type=int, default=0,
+                        help="Score N synthetic sentences instead of the notebook's examples")
+    parser.add_argument("--check", action="store_true", help="Also run the notebook's algorithm and compare")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="Allowed absolute difference for --check")
+    parser.add_argument("--sentences", help="File with one initial sentence per line to analyze")
+    parser.add_argument("--output", help="CSV file for the results of --sentences")
+    parser.add_argument("--batch-size", type=int, default=16, help="Continuations generated per batch")
+    parser.add_argument("--generation-batch-sizes", type=int, nargs="+", default=(),
+                        help="Only report continuation throughput for these batch sizes")
+    args = parser.parse_args()
+    main(args.model, args.sweep, args.check, args.tolerance, args.sentences, args.output, args.batch_size,
+         args.generation_batch_sizes)
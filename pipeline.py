@@ -0,0 +1,510 @@
+"""
+Streaming end-to-end pipeline: fetch -> store -> paraphrase -> classify as concurrent stages
+connected by bounded queues, so a sentence is paraphrased and classified seconds after it is
+stored instead of after the whole corpus has gone through each phase.
+
+- fetch: fetch_workers threads fetch one expression each and store its sentences with the bulk
+  insert; the newly stored sentences go to the paraphrase and classify queues.
+- paraphrase: paraphrase_workers threads request the paraphrases of one sentence with a direct
+  chat completion (not the Batch API) and store them; the stored paraphrases go to the classify queue.
+- classify: classify_workers threads, each with its own llama-cpp context, classify original and
+  paraphrased sentences and write them in batches (and whenever their queue runs dry).
+
+The stages select sentences like the standalone scripts: only sentences of Informal expressions
+are paraphrased (DataStore.ORIGINAL_SENTENCES_QUERY), and only sentences with an expert label
+at startup are classified (DataStore.fetch_for_llm). --paraphrase-all and --classify-all lift
+these filters, so every stored sentence is paraphrased or classified.
+
+A full queue blocks the stage feeding it. The checkpoint file records the fetched expressions and
+the sentence id range of the run, and <checkpoint>.paraphrased the sentences whose paraphrasing
+finished (even if every paraphrase was dropped as a near-duplicate); a restarted run skips those
+expressions and first requeues the run's sentences that are not paraphrased or classified yet. With --near-duplicates, fetched
+sentences and paraphrases that the persisted MinHash indexes flag are dropped before they are
+stored, so they are never paraphrased or classified.
+
+    python -m package.pipeline 100 5 40 3 --fetch-workers 4 --paraphrase-workers 8
+    python -m package.pipeline 20 5 40 3 --dry-run --paraphrase-all --classify-all   # local stand-ins
+"""
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from tqdm import tqdm
+from . import metrics, near_duplicates as near_dup
+from .config import (DB_CONFIG, DB_POOL_SIZE, DATA_PATH, BASE_URL, USERNAME, API_KEY, CORPUS_NAME,
+                     FETCH_REQUESTS_PER_SECOND, CLASSIFIER_DB_BATCH, PIPELINE_FETCH_WORKERS,
+                     PIPELINE_PARAPHRASE_WORKERS, PIPELINE_CLASSIFY_WORKERS, PIPELINE_QUEUE_SIZE,
+                     NEAR_DUP_THRESHOLD, NEAR_DUP_ORIGINAL_INDEX, NEAR_DUP_PARAPHRASED_INDEX)
+from .data_store import DataStore
+from .llm_classification.llm_classifiers import (ClassificationWriter, PrefixCachedClassifier, classify_sentence,
+                                                 get_model_info, load_llm, load_prompt)
+from .llm_paraphrasing.paraphrase import make_client, paraphrase_sentence
+
+_DONE = object()  # End-of-stream marker, one per consumer thread
+PARAPHRASED_CLASS = "Informal"  # Expressions whose sentences are paraphrased, as in ORIGINAL_SENTENCES_QUERY
+
+DRY_RUN_SCHEMA = """
+DROP TABLE IF EXISTS llm_classification, experts_classification, paraphrased_sentences, original_sentences,
+    expressions;
+CREATE TABLE expressions (
+    expression_id SERIAL PRIMARY KEY,
+    expression TEXT,
+    expression_sensitivity_class TEXT
+);
+CREATE TABLE original_sentences (
+    original_sentence_id SERIAL PRIMARY KEY,
+    expression_id INTEGER,
+    original_sentence TEXT,
+    token_number BIGINT,
+    corpus_name TEXT,
+    sources TEXT,
+    website TEXT,
+    title TEXT,
+    crawl_date TEXT,
+    url TEXT,
+    topic TEXT,
+    genre TEXT
+);
+CREATE INDEX original_sentences_token_number_idx ON original_sentences (token_number);
+CREATE TABLE paraphrased_sentences (
+    paraphrased_sentence_id SERIAL PRIMARY KEY,
+    original_sentence_id INTEGER,
+    paraphrased_sentence TEXT,
+    model TEXT,
+    model_system_fingerprint TEXT
+);
+CREATE INDEX paraphrased_sentences_original_idx ON paraphrased_sentences (original_sentence_id);
+-- llm_classification keys both tables by sentence id, so the id ranges must not overlap.
+ALTER SEQUENCE paraphrased_sentences_paraphrased_sentence_id_seq RESTART WITH 1000000001;
+CREATE TABLE experts_classification ("key" INTEGER PRIMARY KEY, classification TEXT);
+CREATE TABLE llm_classification (
+    key INTEGER,
+    classification TEXT,
+    comments TEXT,
+    model TEXT,
+    model_system_fingerprint TEXT,
+    llm_classification_id BIGSERIAL
+);
+INSERT INTO expressions (expression, expression_sensitivity_class)
+    SELECT 'expression ' || i, 'Taboo' FROM generate_series(1, %(expressions)s) AS i;
+"""
+
+
+class _Stopped(Exception):
+    """ Raised in a stage thread once another stage has failed. """
+
+
+class PipelineCheckpoint:
+    """
+    Expressions already fetched and stored, and the sentence ids the run started after. Rewritten
+    atomically after every expression (like BatchManifest), so a restart resumes mid-corpus.
+    The sentences whose paraphrasing finished are appended to <path>.paraphrased.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.paraphrased_path = f"{path}.paraphrased"
+        self.state = {"original_after": None, "paraphrased_after": None, "expressions_done": []}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state = json.load(f)
+        elif os.path.exists(self.paraphrased_path):
+            os.remove(self.paraphrased_path)  # Left over from a run whose checkpoint is gone
+
+    @property
+    def started(self):
+        return self.state["original_after"] is not None
+
+    def start(self, original_after, paraphrased_after):
+        self.state.update(original_after=original_after, paraphrased_after=paraphrased_after)
+        self.save()
+
+    def fetched(self):
+        return set(self.state["expressions_done"])
+
+    def mark_fetched(self, expression_id):
+        with self._lock:
+            self.state["expressions_done"].append(expression_id)
+        self.save()
+
+    def paraphrased(self):
+        """ Original sentence ids whose paraphrasing finished, whether or not a paraphrase was stored. """
+        if not os.path.exists(self.paraphrased_path):
+            return set()
+        with open(self.paraphrased_path, encoding='utf-8') as f:
+            return {int(line) for line in f if line.strip()}
+
+    def mark_paraphrased(self, original_sentence_id):
+        with self._lock:
+            with open(self.paraphrased_path, 'a', encoding='utf-8') as f:
+                f.write(f"{original_sentence_id}\n")
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
+
+
+class Pipeline:
+    def __init__(self, datastore, fetcher, client, make_llm, checkpoint, num_paraphrases,
+                 fetch_workers=PIPELINE_FETCH_WORKERS, paraphrase_workers=PIPELINE_PARAPHRASE_WORKERS,
+                 classify_workers=PIPELINE_CLASSIFY_WORKERS, queue_size=PIPELINE_QUEUE_SIZE, prefix_cache=False,
+                 original_index=None, paraphrased_index=None, paraphrase_all=False, classify_all=False):
+        self.datastore = datastore
+        self.fetcher = fetcher
+        self.client = client
+        self.make_llm = make_llm
+        self.checkpoint = checkpoint
+        self.num_paraphrases = num_paraphrases
+        self.fetch_workers = fetch_workers
+        self.paraphrase_workers = paraphrase_workers
+        self.classify_workers = classify_workers
+        self.prefix_cache = prefix_cache
+        self.original_index = original_index  # NearDuplicateIndex of the fetched sentences, or None
+        self.paraphrased_index = paraphrased_index
+        self.paraphrase_all = paraphrase_all
+        self.classify_all = classify_all
+        self.paraphrase_expressions = None  # Expression ids whose sentences are paraphrased, None for all
+        self.expert_keys = None  # Keys with an expert label, the only ones classified; None for all
+        self.to_paraphrase = queue.Queue(maxsize=queue_size)
+        self.to_classify = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.errors = []
+        self.paraphrase_failures = 0
+        self.near_duplicates = {"sentences": 0, "paraphrases": 0}
+        self.first_stored = None
+        self.first_classified = None
+        self._lock = threading.Lock()
+
+    def _put(self, q, item):
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    def _get(self, q, on_idle=None):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                if on_idle is not None:
+                    on_idle()
+        raise _Stopped()
+
+    def _thread(self, target, *args):
+        def run():
+            try:
+                target(*args)
+            except _Stopped:
+                pass
+            except Exception as err:
+                with self._lock:
+                    self.errors.append(err)
+                self.stop.set()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _stored(self, expression_id, rows):
+        """ Newly stored original sentences go to the paraphrase and classify stages. """
+        if rows and self.first_stored is None:
+            self.first_stored = time.perf_counter()
+        paraphrase = self.paraphrase_expressions is None or expression_id in self.paraphrase_expressions
+        for row in rows:
+            if paraphrase:
+                self._put(self.to_paraphrase, row)
+            self._put_classify(row)
+
+    def _put_classify(self, row):
+        if self.expert_keys is None or row[0] in self.expert_keys:
+            self._put(self.to_classify, row)
+
+    @contextmanager
+    def _deduplicated(self, index, kind, rows):
+        """ The rows that are not near-duplicates, reserved in `index` until the block has stored them. """
+        with near_dup.reserve(index, rows, text=lambda row: row[1]) as (rows, dropped):
+            if index is not None:
+                metrics.count(f"pipeline.{kind}_near_duplicates", dropped)
+                with self._lock:
+                    self.near_duplicates[kind] += dropped
+            yield rows
+
+    def _fetch(self, expressions, num_sentences, min_words, max_words, pbar):
+        while not self.stop.is_set():
+            try:
+                expression_id, expression = expressions.get_nowait()
+            except queue.Empty:
+                return
+            with metrics.timer("pipeline.fetch_expression"):
+                sentences = self.fetcher.fetch_sentences(expression_id, expression, num_sentences, min_words,
+                                                         max_words, show_progress=False)
+                with self._deduplicated(self.original_index, "sentences", sentences) as sentences:
+                    stored, skipped = self.datastore.insert_original_sentences_bulk(sentences, returning=True)
+            metrics.count("pipeline.sentences_stored", len(stored))
+            metrics.count("pipeline.sentences_skipped", skipped)
+            self._stored(expression_id, stored)
+            self.checkpoint.mark_fetched(expression_id)
+            pbar["fetch"].update(1)
+
+    def _requeue_backlog(self, original_range, paraphrased_range, skip_keys):
+        """ Sentences of an interrupted run that still lack paraphrases or classifications. """
+        paraphrased = self.checkpoint.paraphrased()
+        sensitivity_class = None if self.paraphrase_all else PARAPHRASED_CLASS
+        for row in self.datastore.iter_unparaphrased_sentences(*original_range, sensitivity_class):
+            if row[0] not in paraphrased:
+                self._put(self.to_paraphrase, row)
+        for key, sentence in self.datastore.iter_sentences_in_range(original_range, paraphrased_range):
+            if key not in skip_keys:
+                self._put_classify((key, sentence))
+
+    def _paraphrase(self, pbar):
+        while True:
+            item = self._get(self.to_paraphrase)
+            if item is _DONE:
+                return
+            original_sentence_id, original_sentence = item
+            try:
+                rows = paraphrase_sentence(self.client, original_sentence_id, original_sentence,
+                                           self.num_paraphrases)
+            except Exception as err:
+                # The sentence stays in the backlog of the next run.
+                print(f"Paraphrasing sentence {original_sentence_id} failed: {err}")
+                metrics.count("pipeline.paraphrase_failures")
+                with self._lock:
+                    self.paraphrase_failures += 1
+                continue
+            with self._deduplicated(self.paraphrased_index, "paraphrases", rows) as rows:
+                stored = self.datastore.insert_paraphrased_sentences(rows, returning=True)
+            # Finished even if every paraphrase was dropped, so a restart does not pay for it again.
+            self.checkpoint.mark_paraphrased(original_sentence_id)
+            metrics.count("pipeline.paraphrases_stored", len(stored))
+            for row in stored:
+                self._put_classify(row)
+            pbar["paraphrase"].update(1)
+
+    def _classify(self, writer, prompt_template, skip_keys, pbar):
+        llm = self.make_llm()
+        cached_classifier = PrefixCachedClassifier(llm, prompt_template) if self.prefix_cache else None
+
+        def flush():
+            writer.flush()
+            if writer.written and self.first_classified is None:
+                self.first_classified = time.perf_counter()
+
+        while True:
+            item = self._get(self.to_classify, on_idle=flush)
+            if item is _DONE:
+                flush()
+                return
+            key, sentence = item
+            if key in skip_keys:
+                continue
+            classification, comments = classify_sentence(sentence, llm, prompt_template, cached_classifier)
+            if classification is not None:
+                writer.add(key, classification, comments)
+            pbar["classify"].update(1)
+            if self.first_classified is None:
+                flush()
+
+    def run(self, num_sentences, min_words, max_words):
+        _, model_value = get_model_info()
+        model_system_fingerprint = hashlib.sha256(model_value.encode('utf-8')).hexdigest()
+        writer = ClassificationWriter(self.datastore, model_value, model_system_fingerprint, CLASSIFIER_DB_BATCH)
+        prompt_template = load_prompt()
+
+        original_upto, paraphrased_upto = self.datastore.max_sentence_ids()
+        lowest_paraphrased = self.datastore.lowest_paraphrased_sentence_id()
+        if lowest_paraphrased is not None and lowest_paraphrased <= original_upto:
+            # Overlapping ids would share llm_classification keys: resume would skip paraphrases and
+            # labels of originals and paraphrases would mix.
+            raise ValueError(f"paraphrased_sentence_id starts at {lowest_paraphrased}, within the original sentence "
+                             f"ids (up to {original_upto}); restart its sequence above every original id, e.g. "
+                             "ALTER SEQUENCE paraphrased_sentences_paraphrased_sentence_id_seq RESTART WITH 1000000001")
+        resumed = self.checkpoint.started
+        if not resumed:
+            self.checkpoint.start(original_upto, paraphrased_upto)
+        done = self.checkpoint.fetched()
+        expressions = queue.Queue()
+        for expression in self.datastore.fetch_expressions():
+            if expression[0] not in done:
+                expressions.put(expression)
+        skip_keys = self.datastore.fetch_classified_keys(model_system_fingerprint) if resumed else frozenset()
+        if not self.paraphrase_all:
+            self.paraphrase_expressions = self.datastore.fetch_expression_ids(PARAPHRASED_CLASS)
+        if not self.classify_all:
+            self.expert_keys = self.datastore.fetch_expert_classified_keys()
+        print(f"{expressions.qsize()} expressions to fetch" + (f", {len(done)} done in the previous run"
+                                                              if resumed else ""))
+
+        start = time.perf_counter()
+        pbar = {"fetch": tqdm(total=expressions.qsize(), desc="Expressions fetched", position=0),
+                "paraphrase": tqdm(desc="Sentences paraphrased", position=1),
+                "classify": tqdm(desc="Sentences classified", position=2)}
+        try:
+            threads = []
+            classifiers = [self._thread(self._classify, writer, prompt_template, skip_keys, pbar)
+                           for _ in range(self.classify_workers)]
+            paraphrasers = [self._thread(self._paraphrase, pbar) for _ in range(self.paraphrase_workers)]
+            producers = [self._thread(self._fetch, expressions, num_sentences, min_words, max_words, pbar)
+                         for _ in range(self.fetch_workers)]
+            if resumed:
+                # Bounded by the ids at startup, so sentences this run stores are not queued twice.
+                producers.append(self._thread(
+                    self._requeue_backlog, (self.checkpoint.state["original_after"], original_upto),
+                    (self.checkpoint.state["paraphrased_after"], paraphrased_upto), skip_keys))
+            threads = classifiers + paraphrasers + producers
+            try:
+                # A stage ends once its producers are done and it has drained its queue.
+                for stage, consumers, q in ((producers, paraphrasers, self.to_paraphrase),
+                                            (paraphrasers, classifiers, self.to_classify)):
+                    for thread in stage:
+                        thread.join()
+                    for _ in consumers:
+                        self._put(q, _DONE)
+            except _Stopped:
+                pass
+            for thread in paraphrasers + classifiers:
+                thread.join()
+        except KeyboardInterrupt:
+            # Let the stages finish their current item, so the final flush has the pool to itself.
+            self.stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
+            raise
+        finally:
+            for bar in pbar.values():
+                bar.close()
+            writer.flush()
+        if self.errors:
+            raise self.errors[0]
+
+        elapsed = time.perf_counter() - start
+        print(f"Pipeline finished in {elapsed:.1f}s: {writer.written} classifications written, "
+              f"{self.paraphrase_failures} sentences not paraphrased (retried on the next run)")
+        if self.original_index is not None or self.paraphrased_index is not None:
+            print(f"Dropped as near-duplicates: {self.near_duplicates['sentences']} sentences, "
+                  f"{self.near_duplicates['paraphrases']} paraphrases")
+        if self.first_stored is not None and self.first_classified is not None:
+            latency = self.first_classified - self.first_stored
+            metrics.record("pipeline.first_stored_to_first_classified", latency)
+            print(f"First classification written {latency:.2f}s after the first sentence was stored")
+
+
+def prepare_dry_run(db_config, expressions):
+    """ Recreates the pipeline tables in a scratch database with `expressions` synthetic Taboo expressions. """
+    if db_config["dbname"] == DB_CONFIG["dbname"]:
+        raise ValueError("--dry-run recreates the tables; use a scratch database, not the research database")
+    datastore = DataStore(db_config)
+    try:
+        with datastore.transaction() as cursor:
+            cursor.execute(DRY_RUN_SCHEMA, {"expressions": expressions})
+    finally:
+        datastore.close()
+
+
+def main(num_sentences, min_words, max_words, num_paraphrases, fetch_workers=PIPELINE_FETCH_WORKERS,
+         paraphrase_workers=PIPELINE_PARAPHRASE_WORKERS, classify_workers=PIPELINE_CLASSIFY_WORKERS,
+         queue_size=PIPELINE_QUEUE_SIZE, checkpoint_path=None, prefix_cache=False, dry_run=False,
+         dry_run_dbname="llm_sensitivity_bench", dry_run_expressions=20, dry_run_latency=0.2,
+         near_duplicates=False, near_duplicate_threshold=NEAR_DUP_THRESHOLD, paraphrase_all=False, classify_all=False):
+    from .sentence_construction.sentence_fetcher import SketchEngineFetcher, RateLimiter
+
+    db_config = DB_CONFIG
+    base_url, requests_per_second = BASE_URL, FETCH_REQUESTS_PER_SECOND
+    stand_ins = []
+    index_paths = [near_dup.index_path(NEAR_DUP_ORIGINAL_INDEX), near_dup.index_path(NEAR_DUP_PARAPHRASED_INDEX)]
+    if dry_run:
+        from openai import OpenAI
+        from .benchmarks.fake_openai import FakeOpenAI
+        from .benchmarks.mock_llm import MockLlama
+        from .benchmarks.stub_sketchengine import ConcordanceStub, make_synthetic_page
+        db_config = {**DB_CONFIG, "dbname": dry_run_dbname}
+        checkpoint_path = checkpoint_path or os.path.join(DATA_PATH, "pipeline_dry_run_checkpoint.json")
+        index_paths = [near_dup.index_path(f"pipeline_dry_run_{name}")
+                       for name in (NEAR_DUP_ORIGINAL_INDEX, NEAR_DUP_PARAPHRASED_INDEX)]
+        # Without a checkpoint to resume from, the dry run starts on fresh scratch tables and indexes.
+        if not os.path.exists(checkpoint_path):
+            prepare_dry_run(db_config, dry_run_expressions)
+            for path in index_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        page = json.dumps(make_synthetic_page(max(200, 4 * num_sentences))).encode("utf-8")
+        stand_ins = [ConcordanceStub([page], latency=dry_run_latency),
+                     FakeOpenAI(chat_latency=dry_run_latency)]
+        for stand_in in stand_ins:
+            stand_in.__enter__()
+        base_url, requests_per_second = stand_ins[0].base_url, 0
+        client = OpenAI(api_key="dry-run", base_url=stand_ins[1].base_url)
+        make_llm = lambda: MockLlama(dry_run_latency / 10)
+    else:
+        client = make_client()
+        n_threads = max(1, (os.cpu_count() or 1) // classify_workers)
+        make_llm = lambda: load_llm(n_threads=n_threads, verbose=False)
+    checkpoint_path = checkpoint_path or os.path.join(DATA_PATH, "pipeline_checkpoint.json")
+    indexes = ([near_dup.NearDuplicateIndex.open(path, near_duplicate_threshold) for path in index_paths]
+               if near_duplicates else [None, None])
+
+    connections = fetch_workers + paraphrase_workers + classify_workers + 1
+    datastore = DataStore(db_config, pool_size=min(connections, DB_POOL_SIZE))
+    fetcher = SketchEngineFetcher(USERNAME, API_KEY, CORPUS_NAME, base_url,
+                                  rate_limiter=RateLimiter(requests_per_second), pool_size=fetch_workers)
+    try:
+        pipeline = Pipeline(datastore, fetcher, client, make_llm, PipelineCheckpoint(checkpoint_path),
+                            num_paraphrases, fetch_workers, paraphrase_workers, classify_workers, queue_size,
+                            prefix_cache, *indexes, paraphrase_all, classify_all)
+        pipeline.run(num_sentences, min_words, max_words)
+    finally:
+        for index in indexes:
+            if index is not None:
+                index.save()
+        datastore.close()
+        for stand_in in stand_ins:
+            stand_in.__exit__(None, None, None)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Fetch, store, paraphrase and classify as one streaming pipeline.")
+    parser.add_argument("num_sentences", type=int, help="Number of sentences per expression")
+    parser.add_argument("min_words", type=int, help="Minimum number of words per sentence")
+    parser.add_argument("max_words", type=int, help="Maximum number of words per sentence")
+    parser.add_argument("num_paraphrases", type=int, help="Paraphrases per sentence")
+    parser.add_argument("--fetch-workers", type=int, default=PIPELINE_FETCH_WORKERS)
+    parser.add_argument("--paraphrase-workers", type=int, default=PIPELINE_PARAPHRASE_WORKERS)
+    parser.add_argument("--classify-workers", type=int, default=PIPELINE_CLASSIFY_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE,
+                        help="Sentences buffered between two stages")
+    parser.add_argument("--checkpoint", help="Checkpoint path (default: DATA_PATH/pipeline_checkpoint.json)")
+    parser.add_argument("--prefix-cache", action="store_true",
+                        help="Reuse the KV cache of the fixed prompt prefix in every classify worker")
+    parser.add_argument("--paraphrase-all", action="store_true",
+                        help=f"Paraphrase every fetched sentence, not only those of {PARAPHRASED_CLASS} expressions")
+    parser.add_argument("--classify-all", action="store_true",
+                        help="Classify every stored sentence, not only those with an expert label")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Run against the local concordance stub, fake OpenAI API and a mock LLM, "
+                             "in a scratch database whose tables are recreated")
+    parser.add_argument("--dry-run-dbname", default="llm_sensitivity_bench")
+    parser.add_argument("--dry-run-expressions", type=int, default=20)
+    parser.add_argument("--dry-run-latency", type=float, default=0.2,
+                        help="Seconds per stub request and fake chat completion")
+    near_dup.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+    try:
+        main(args.num_sentences, args.min_words, args.max_words, args.num_paraphrases, args.fetch_workers,
+             args.paraphrase_workers, args.classify_workers, args.queue_size, args.checkpoint, args.prefix_cache,
+             args.dry_run, args.dry_run_dbname, args.dry_run_expressions, args.dry_run_latency,
+             args.near_duplicates, args.near_duplicate_threshold, args.paraphrase_all, args.classify_all)
+    finally:
+        metrics.finish()
@@ -1,32 +1,166 @@
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as TransportError
 from tqdm import tqdm
 import time
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import random
-from ..config import BASE_URL, USERNAME, API_KEY, CORPUS_NAME, DB_CONFIG
+from ..config import (BASE_URL, USERNAME, API_KEY, CORPUS_NAME, DB_CONFIG,
+                      FETCH_CONCURRENCY, FETCH_REQUESTS_PER_SECOND, DB_POOL_SIZE, NEAR_DUP_ORIGINAL_INDEX)
 from ..data_store import DataStore
+from .. import metrics, near_duplicates as near_dup
+
+EXCLUDED_GENRES = {'reference/encyclopedia', 'news', 'legal'}
+
+
+class _HeadReader:
+    """ File-like view of a stream that keeps the first `limit` bytes read from it. """
+    def __init__(self, stream, limit=65536):
+        self.stream = stream
+        self.limit = limit
+        self.head = bytearray()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if len(self.head) < self.limit:
+            self.head += data[:self.limit - len(self.head)]
+        return data
+
+
+class RateLimiter:
+    """ Global requests-per-second limit shared by all fetch workers. """
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        # Reserve the next free slot under the lock, sleep outside of it.
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
 
 class SentenceFetcher:
     def fetch_sentences(self, expression, num_sentences, min_words, max_words):
         pass
 
 class SketchEngineFetcher(SentenceFetcher):
-    def __init__(self, username, api_key, corpus_name, base_url):
+    def __init__(self, username, api_key, corpus_name, base_url, rate_limiter=None, pool_size=10, streaming=False):
         self.username = username
         self.api_key = api_key
         self.corpus_name = corpus_name
         self.base_url = base_url
         self.seen_toknums = set()  # Global set to track seen token numbers
+        self._seen_lock = threading.Lock()  # seen_toknums is shared by all fetch workers
+        self.rate_limiter = rate_limiter or RateLimiter(0)
+        self.streaming = streaming  # Parse pages incrementally, see fetch_sentences_streaming
+        # Pooled keep-alive connections, one per concurrent worker
+        self.session = requests.Session()
+        self.session.auth = (username, api_key)
+        self.session.mount(base_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
 
     @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10),
            retry=retry_if_exception_type((requests.exceptions.ConnectTimeout, requests.exceptions.ReadTimeout)),
            retry_error_callback=lambda retry_state: {"Lines": None})
     def fetch_data(self, params):
-        response = requests.get(self.base_url, params=params, auth=(self.username, self.api_key))
-        response.raise_for_status()
+        with metrics.timer("http.rate_limit_wait"):
+            self.rate_limiter.wait()
+        with metrics.timer("http.request"):
+            response = self.session.get(self.base_url, params=params)
+            response.raise_for_status()
+        metrics.count("http.bytes", len(response.content))
         return response.json()
 
-    def fetch_sentences(self, expression_id, expression, num_sentences, min_words, max_words):
+    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10),
+           retry=retry_if_exception_type((requests.exceptions.ConnectTimeout, requests.exceptions.ReadTimeout)),
+           retry_error_callback=lambda retry_state: None)
+    def open_stream(self, params):
+        """ Like fetch_data, but returns the open response so the body can be parsed incrementally. """
+        with metrics.timer("http.rate_limit_wait"):
+            self.rate_limiter.wait()
+        # Until the headers arrive; reading the body is timed as fetch.stream_page.
+        with metrics.timer("http.stream_open"):
+            response = self.session.get(self.base_url, params=params, stream=True)
+            response.raise_for_status()
+        return response
+
+    @staticmethod
+    def iter_lines(stream, state):
+        """
+        Yields the `Lines` items of a concordance page one at a time while reading `stream`.
+        state['has_lines'] is set once the page has `Lines` (it is missing on rate-limit responses).
+        """
+        import ijson  # only needed in streaming mode
+        reader = _HeadReader(stream)
+        # ijson.items builds the items in the C backend; driving ijson.parse from Python is slower than json.
+        for line in ijson.items(reader, 'Lines.item', use_float=True):
+            state['has_lines'] = True
+            yield line
+        if not state['has_lines']:
+            # An empty page or a rate-limit response, both short enough to be in the head.
+            try:
+                state['has_lines'] = 'Lines' in json.loads(bytes(reader.head))
+            except ValueError:
+                pass
+
+    def claim_toknum(self, token_number):
+        """ Atomically mark a token number as seen. Returns False if another worker already has it. """
+        with self._seen_lock:
+            if token_number in self.seen_toknums:
+                return False
+            self.seen_toknums.add(token_number)
+            return True
+
+    def build_params(self, query, page, pagesize):
+        return {
+            "corpname": self.corpus_name,
+            "q": query,
+            "viewmode": "sen",
+            "structs": "s,g",
+            "refs": "doc.website,doc.crawl_date,doc.urldomain,doc.url,doc.title,doc.src,doc.genre,doc.topic",
+            "fromp": page,
+            "pagesize": pagesize,
+            "async": "1",
+            "format": "json",
+        }
+
+    def parse_line(self, line, expression_id, min_words, max_words):
+        """ Applies the genre, word-count and toknum filters to one concordance line. Returns a row or None. """
+        parts = line.get('Left', []) + line.get('Kwic', []) + line.get('Right', [])
+        sentence = ' '.join(part.get('str', '') for part in parts).replace('<s>', '').replace('</s>', '').strip()
+        word_count = len(sentence.split())
+        token_number = line.get('toknum', 0)
+
+        # Extract metadata by splitting the key=value pairs
+        metadata = {item.split('=')[0]: item.split('=')[1] if '=' in item else "" for item in line.get('Refs', [])}
+        genre = metadata.get('Genre', '').lower()
+
+        if genre in EXCLUDED_GENRES:
+            return None
+
+        if min_words <= word_count <= max_words and self.claim_toknum(token_number):
+            return (expression_id, sentence, token_number, self.corpus_name, "Sketch Engine",
+                    metadata.get('Website (e.g. cnn.com)', ''),
+                    metadata.get('Title', ''),
+                    metadata.get('Crawl date', ''),
+                    metadata.get('URL', ''),
+                    metadata.get('Topic', ''),
+                    genre)
+        return None
+
+    def fetch_sentences(self, expression_id, expression, num_sentences, min_words, max_words, show_progress=True):
+        if self.streaming:
+            return self.fetch_sentences_streaming(expression_id, expression, num_sentences, min_words, max_words,
+                                                  show_progress)
         words = expression.split()
         query = " ".join(f'[lc="{word}"]' for word in words) 
         query = f'q{query}'
@@ -36,27 +170,18 @@ class SketchEngineFetcher(SentenceFetcher):
         collected_sentences = 0
         all_sentences_data = []
         sentences_data = []  # Ensure sentences_data is initialized as an empty list
-        excluded_genres = {'reference/encyclopedia', 'news', 'legal'}
 
-        with tqdm(total=num_sentences, desc=f"Collecting sentences for '{expression}'", leave=False) as pbar:
+        with tqdm(total=num_sentences, desc=f"Collecting sentences for '{expression}'", leave=False,
+                  disable=not show_progress) as pbar:
             while collected_sentences < num_sentences:
-                params = {
-                    "corpname": self.corpus_name,
-                    "q": query,
-                    "viewmode": "sen",
-                    "structs": "s,g",
-                    "refs": "doc.website,doc.crawl_date,doc.urldomain,doc.url,doc.title,doc.src,doc.genre,doc.topic",
-                    "fromp": page,
-                    "pagesize": pagesize,
-                    "async": "1",
-                    "format": "json",
-                }
+                params = self.build_params(query, page, pagesize)
                 try:
                     data = self.fetch_data(params)
                     if 'Lines' not in data:
                         raise requests.exceptions.RequestException("Rate limit hit, retrying after delay")
                 except requests.exceptions.RequestException as err:
                     print(f"Error occurred: {err}")
+                    metrics.count("fetch.retry_sleeps")
                     time.sleep(60)  # Wait 60 seconds before retrying...
                     continue
 
@@ -66,29 +191,9 @@ class SketchEngineFetcher(SentenceFetcher):
 
                 new_sentences_collected = 0
                 for line in data['Lines']:
-                    parts = line.get('Left', []) + line.get('Kwic', []) + line.get('Right', [])
-                    sentence = ' '.join(part.get('str', '') for part in parts).replace('<s>', '').replace('</s>', '').strip()
-                    word_count = len(sentence.split())
-                    token_number = line.get('toknum', 0)
-
-                    # Extract metadata by splitting the key=value pairs
-                    metadata = {item.split('=')[0]: item.split('=')[1] if '=' in item else "" for item in line.get('Refs', [])}
-                    genre = metadata.get('Genre', '').lower()
-
-                    if token_number in self.seen_toknums or genre in excluded_genres:
-                        continue
-
-                    if min_words <= word_count <= max_words:
-                        all_sentences_data.append(
-                            (expression_id, sentence, token_number, self.corpus_name, "Sketch Engine",
-                            metadata.get('Website (e.g. cnn.com)', ''),
-                            metadata.get('Title', ''),
-                            metadata.get('Crawl date', ''),
-                            metadata.get('URL', ''),
-                            metadata.get('Topic', ''),
-                            genre)
-                        )
-                        self.seen_toknums.add(token_number)
+                    row = self.parse_line(line, expression_id, min_words, max_words)
+                    if row is not None:
+                        all_sentences_data.append(row)
                         new_sentences_collected += 1
 
                 # If fewer sentences are available, take all collected
@@ -98,6 +203,7 @@ class SketchEngineFetcher(SentenceFetcher):
                     sentences_data = all_sentences_data  # Take all sentences when fewer than requested
 
                 collected_sentences = len(sentences_data)
+                metrics.count("fetch.candidates", new_sentences_collected)
                 pbar.update(new_sentences_collected)
 
                 # Break the loop if no new sentences were collected in this iteration
@@ -106,26 +212,149 @@ class SketchEngineFetcher(SentenceFetcher):
 
         return sentences_data
 
+    def fetch_sentences_streaming(self, expression_id, expression, num_sentences, min_words, max_words,
+                                  show_progress=True):
+        """
+        Streaming variant of fetch_sentences: `Lines` are parsed incrementally from the response and
+        filtered one by one into a fixed-size reservoir sample, so memory is bounded by num_sentences
+        rather than by the page size. A truncated or malformed body is retried like a transport error.
+        """
+        import ijson  # only needed in streaming mode
+        words = expression.split()
+        query = " ".join(f'[lc="{word}"]' for word in words)
+        query = f'q{query}'
 
+        page = 1
+        pagesize = 20000
+        reservoir = []
+        candidates_seen = 0  # Candidates over all pages, the population the reservoir samples from
 
-def main(num_sentences, min_words, max_words):
-    datastore = DataStore(DB_CONFIG)
-    fetcher = SketchEngineFetcher(USERNAME, API_KEY, CORPUS_NAME, BASE_URL)
+        with tqdm(total=num_sentences, desc=f"Collecting sentences for '{expression}'", leave=False,
+                  disable=not show_progress) as pbar:
+            while candidates_seen < num_sentences:
+                params = self.build_params(query, page, pagesize)
+                state = {'has_lines': False}
+                lines_on_page = 0
+                new_sentences_collected = 0
+                try:
+                    response = self.open_stream(params)
+                    if response is None:
+                        raise requests.exceptions.RequestException("Request timed out")
+                    with response, metrics.timer("fetch.stream_page"):
+                        response.raw.decode_content = True
+                        for line in self.iter_lines(response.raw, state):
+                            lines_on_page += 1
+                            row = self.parse_line(line, expression_id, min_words, max_words)
+                            if row is None:
+                                continue
+                            candidates_seen += 1
+                            new_sentences_collected += 1
+                            # Algorithm R: keep each candidate with probability num_sentences / candidates_seen
+                            if len(reservoir) < num_sentences:
+                                reservoir.append(row)
+                            else:
+                                slot = random.randrange(candidates_seen)
+                                if slot < num_sentences:
+                                    reservoir[slot] = row
+                    if not state['has_lines']:
+                        raise requests.exceptions.RequestException("Rate limit hit, retrying after delay")
+                except (requests.exceptions.RequestException, TransportError, ijson.JSONError) as err:
+                    # Candidates of a partially read page are kept; their toknums are already claimed.
+                    print(f"Error occurred: {err}")
+                    metrics.count("fetch.retry_sleeps")
+                    time.sleep(60)  # Wait 60 seconds before retrying...
+                    continue
+
+                metrics.count("fetch.candidates", new_sentences_collected)
+                pbar.update(new_sentences_collected)
+                if lines_on_page == 0 or new_sentences_collected == 0:
+                    break
+
+        return reservoir
+
+
+
+def fetch_concurrently(fetcher, expressions, num_sentences, min_words, max_words, concurrency, handle_result,
+                       queue_size=None, store=None):
+    """
+    Keeps `concurrency` expressions in flight. Workers hand their results over a bounded queue,
+    and handle_result(expression_id, sentences) is called on the calling thread, so a single
+    writer (e.g. the DataStore) consumes them. A full queue blocks the workers (backpressure).
+    With store given (thread-safe, e.g. a pooled DataStore method), each worker calls
+    store(sentences) itself and handle_result receives its return value instead.
+    """
+    results = queue.Queue(maxsize=queue_size or 2 * concurrency)
+
+    def worker(expression_id, expression):
+        try:
+            with metrics.timer("fetch.expression"):
+                sentences = fetcher.fetch_sentences(expression_id, expression, num_sentences, min_words, max_words,
+                                                    show_progress=False)
+            results.put((expression_id, store(sentences) if store else sentences))
+        except Exception as err:
+            results.put((expression_id, err))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(worker, expression_id, expression) for expression_id, expression in expressions]
+        expected, received, error = len(futures), 0, None
+        while received < expected:
+            expression_id, outcome = results.get()
+            received += 1
+            if isinstance(outcome, Exception):
+                if error is None:
+                    error = outcome
+                    # Cancelled workers never report, keep draining the ones already running.
+                    expected -= sum(future.cancel() for future in futures)
+                continue
+            if error is None:
+                handle_result(expression_id, outcome)
+    if error is not None:
+        raise error
+
+
+def main(num_sentences, min_words, max_words, concurrency=FETCH_CONCURRENCY,
+         requests_per_second=FETCH_REQUESTS_PER_SECOND, base_url=BASE_URL, streaming=False, near_duplicates=None):
+    """
+    near_duplicates: optional NearDuplicateIndex; sentences it flags are dropped before the insert,
+    the others are reserved in it across workers and added once the insert has committed.
+    """
+    # Workers insert their own results, so the DataStore is pooled.
+    datastore = DataStore(DB_CONFIG, pool_size=min(concurrency, DB_POOL_SIZE))
+    fetcher = SketchEngineFetcher(USERNAME, API_KEY, CORPUS_NAME, base_url,
+                                  rate_limiter=RateLimiter(requests_per_second), pool_size=concurrency,
+                                  streaming=streaming)
     expressions = datastore.fetch_expressions()
     
     overall_pbar = tqdm(total=len(expressions), desc="Overall Progress", leave=True)
-    total_sentences_scraped = 0
-    
-    for expression_id, expression in expressions:
-        sentences = fetcher.fetch_sentences(expression_id, expression, num_sentences, min_words, max_words)
-        datastore.insert_original_sentences(sentences)
-        total_sentences_scraped += len(sentences)
+    totals = {"scraped": 0, "inserted": 0, "skipped": 0, "near_duplicates": 0}
+
+    def store(sentences):
+        with near_dup.reserve(near_duplicates, sentences, text=lambda row: row[1]) as (sentences, dropped):
+            return datastore.insert_original_sentences_bulk(sentences) + (dropped,)
+
+    def record(expression_id, counts):
+        inserted, skipped, dropped = counts
+        totals["scraped"] += inserted + skipped + dropped
+        totals["inserted"] += inserted
+        totals["skipped"] += skipped
+        totals["near_duplicates"] += dropped
+        metrics.count("sentences.inserted", inserted)
+        metrics.count("sentences.skipped", skipped)
+        metrics.count("sentences.near_duplicates", dropped)
         overall_pbar.update(1)
-    
-    overall_pbar.close()
+
+    try:
+        fetch_concurrently(fetcher, expressions, num_sentences, min_words, max_words, concurrency, record,
+                           store=store)
+    finally:
+        overall_pbar.close()
+        if near_duplicates is not None:
+            near_duplicates.save()
     datastore.close()
 
-    print(f"Total sentences scraped: {total_sentences_scraped}")
+    print(f"Total sentences scraped: {totals['scraped']}")
+    print(f"Inserted: {totals['inserted']}, skipped as duplicates: {totals['skipped']}, "
+          f"dropped as near-duplicates: {totals['near_duplicates']}")
 
 if __name__ == "__main__":
     import argparse
@@ -133,5 +362,18 @@ if __name__ == "__main__":
     parser.add_argument("num_sentences", type=int, help="Number of sentences per expression")
     parser.add_argument("min_words", type=int, help="Minimum number of words per sentence")
     parser.add_argument("max_words", type=int, help="Maximum number of words per sentence")
+    parser.add_argument("--concurrency", type=int, default=FETCH_CONCURRENCY, help="Expressions fetched in parallel")
+    parser.add_argument("--requests-per-second", type=float, default=FETCH_REQUESTS_PER_SECOND,
+                        help="Global request rate limit (0 disables it)")
+    parser.add_argument("--base-url", default=BASE_URL, help="Concordance endpoint, e.g. a local stub server")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse concordance pages incrementally with a fixed-size reservoir sample")
+    near_dup.add_arguments(parser)
+    metrics.add_arguments(parser)
     args = parser.parse_args()
-    main(args.num_sentences, args.min_words, args.max_words)
+    metrics.start_from_args(args)
+    try:
+        main(args.num_sentences, args.min_words, args.max_words, args.concurrency, args.requests_per_second,
+             args.base_url, args.stream, near_dup.open_from_args(args, NEAR_DUP_ORIGINAL_INDEX))
+    finally:
+        metrics.finish()
@@ -0,0 +1,290 @@
+"""
+Columnar snapshots of the labelled data for analysis, instead of CSV exports of the joins.
+
+Two datasets are streamed out of PostgreSQL (server-side cursors, constant memory) into
+partitioned Arrow IPC files (or Parquet with --format parquet):
+
+- pairs: one row per paraphrase with its original sentence, expression and the expert
+  classification of both sentences. The label columns keep the names of the CSV export the
+  ml_classification notebook reads.
+- llm_classification: the LLM labels with the expert label of the same key.
+
+Label, model and class columns are dictionary-encoded. manifest.json lists the part files and
+the high-water mark of each dataset (paraphrased_sentence_id, and llm_classification_id), so a
+refresh only exports rows above them into new parts. Classifications are not written in key
+order, so they are tracked on llm_classification_id, a serial column that --migrate adds once.
+Serial ids are assigned at insert, not at commit, so a refresh also reads the last
+SNAPSHOT_RESCAN_IDS ids below the mark again and exports those not in the parts yet. Rows that
+change below the marks (an expert label added later, a reclassification) need --full.
+
+    python -m package.snapshot DATA_PATH/snapshot --migrate  # once, while no classifier writes
+    python -m package.snapshot DATA_PATH/snapshot            # create or refresh
+    table = load_snapshot(path, "pairs")                      # memory-mapped, zero-copy
+    df = read_frame(path, "pairs")                            # pandas, labels as categoricals
+
+Uncompressed Arrow files are memory-mapped and read without copying; Parquet parts are smaller
+but decoded on load.
+"""
+import json
+import os
+import shutil
+import time
+from itertools import islice
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from . import metrics
+from .config import DB_CONFIG, SNAPSHOT_ROWS_PER_PART, SNAPSHOT_BATCH_ROWS, SNAPSHOT_RESCAN_IDS
+from .data_store import DataStore
+
+LABEL = pa.dictionary(pa.int32(), pa.string())
+SCHEMAS = {
+    "pairs": pa.schema([
+        ("paraphrased_sentence_id", pa.int64()),
+        ("original_sentence_id", pa.int64()),
+        ("expression_id", pa.int32()),
+        ("expression_sensitivity_class", LABEL),
+        ("original_sentence", pa.string()),
+        ("paraphrased_sentence", pa.string()),
+        ("model", LABEL),
+        ("original_sentence_classification_experts_classification", LABEL),
+        ("paraphrased_sentence_classification_experts_classification", LABEL),
+    ]),
+    "llm_classification": pa.schema([
+        ("llm_classification_id", pa.int64()),
+        ("key", pa.int64()),
+        ("model", LABEL),
+        ("model_system_fingerprint", LABEL),
+        ("classification", LABEL),
+        ("expert_classification", LABEL),
+        ("comments", pa.string()),
+    ]),
+}
+EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+
+class _DictionaryEncoder:
+    """ Keeps one growing dictionary per column, so each batch only appends (IPC dictionary deltas). """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, column):
+        local = pa.array(column, pa.string()).dictionary_encode()
+        for value in local.dictionary.to_pylist():
+            if value not in self.codes:
+                self.codes[value] = len(self.values)
+                self.values.append(value)
+        mapping = pa.array([self.codes[value] for value in local.dictionary.to_pylist()], pa.int32())
+        indices = pc.take(mapping, local.indices)
+        return pa.DictionaryArray.from_arrays(indices, pa.array(self.values, pa.string()))
+
+
+class PartWriter:
+    """
+    Writes batches of rows (tuples in schema order) as record batches into numbered part files of
+    one dataset directory, starting a new file once a part holds rows_per_part rows. Returns the
+    manifest entries of the new parts from close().
+    """
+
+    def __init__(self, directory, schema, fmt="arrow", first_part=0, rows_per_part=SNAPSHOT_ROWS_PER_PART):
+        self.directory = directory
+        self.schema = schema
+        self.fmt = fmt
+        self.next_part = first_part
+        self.rows_per_part = rows_per_part
+        self.parts = []
+        self._writer = None
+        self._encoders = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_part(self):
+        name = f"part-{self.next_part:05d}{EXTENSIONS[self.fmt]}"
+        self.next_part += 1
+        path = os.path.join(self.directory, name)
+        if self.fmt == "arrow":
+            self._writer = ipc.new_file(path, self.schema, options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        else:
+            self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        # Each part file starts with fresh dictionaries.
+        self._encoders = [_DictionaryEncoder() if pa.types.is_dictionary(field.type) else None
+                          for field in self.schema]
+        self.parts.append({"file": name, "rows": 0})
+
+    def write(self, rows):
+        if self._writer is None:
+            self._open_part()
+        columns = list(zip(*rows))
+        arrays = [encoder.encode(column) if encoder else pa.array(column, field.type)
+                  for column, field, encoder in zip(columns, self.schema, self._encoders)]
+        with metrics.timer("snapshot.write_batch"):
+            batch = pa.record_batch(arrays, schema=self.schema)
+            if self.fmt == "arrow":
+                self._writer.write_batch(batch)
+            else:
+                self._writer.write_batch(batch, row_group_size=len(rows))
+        self.parts[-1]["rows"] += len(rows)
+        metrics.count("snapshot.rows", len(rows))
+        if self.parts[-1]["rows"] >= self.rows_per_part:
+            self._writer.close()
+            self._writer = None
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        return self.parts
+
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(path, manifest):
+    tmp_path = os.path.join(path, "manifest.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(path, "manifest.json"))
+
+
+def _export(rows, writer, batch_rows, on_batch):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_rows))
+        if not batch:
+            break
+        writer.write(batch)
+        on_batch(batch)
+    return writer.close()
+
+
+def _exported_ids(path, dataset, column, above):
+    """ The ids above `above` in the parts of a dataset. """
+    ids = load_snapshot(path, dataset, [column]).column(column)
+    return set(pc.filter(ids, pc.greater(ids, above)).to_pylist())
+
+
+def export_snapshot(datastore, path, fmt="arrow", full=False, rows_per_part=SNAPSHOT_ROWS_PER_PART,
+                    batch_rows=SNAPSHOT_BATCH_ROWS, rescan_ids=SNAPSHOT_RESCAN_IDS):
+    """
+    Creates the snapshot at `path`, or appends the rows above its high-water marks as new parts.
+    A refresh replaces the manifest only after the new parts are complete, so an interrupted
+    refresh leaves the previous snapshot readable. Returns {dataset: rows exported}.
+    """
+    if not datastore.has_classification_ids():
+        raise ValueError("llm_classification has no llm_classification_id column; run "
+                         "python -m package.snapshot PATH --migrate once, while no classifier is writing")
+    manifest = None if full else read_manifest(path)
+    if manifest is not None and manifest["format"] != fmt:
+        raise ValueError(f"{path} holds a {manifest['format']} snapshot; refresh it in that format or use --full")
+    if manifest is not None and "after_id" not in manifest["datasets"]["llm_classification"]:
+        raise ValueError(f"{path} was exported without llm_classification_id; re-export it with --full")
+    if manifest is None:
+        if os.path.exists(os.path.join(path, "manifest.json")):
+            os.remove(os.path.join(path, "manifest.json"))
+        for dataset in SCHEMAS:
+            shutil.rmtree(os.path.join(path, dataset), ignore_errors=True)
+        manifest = {"format": fmt, "datasets": {
+            "pairs": {"parts": [], "after_id": 0},
+            "llm_classification": {"parts": [], "after_id": 0},
+        }}
+    exported = {}
+    itersize = max(batch_rows, 1000)
+
+    pairs = manifest["datasets"]["pairs"]
+    writer = PartWriter(os.path.join(path, "pairs"), SCHEMAS["pairs"], fmt, len(pairs["parts"]), rows_per_part)
+
+    def track_pairs(batch):
+        pairs["after_id"] = batch[-1][0]
+
+    with metrics.timer("snapshot.export.pairs"):
+        parts = _export(datastore.iter_labelled_pairs(pairs["after_id"], itersize), writer, batch_rows, track_pairs)
+    pairs["parts"] += parts
+    exported["pairs"] = sum(part["rows"] for part in parts)
+
+    classifications = manifest["datasets"]["llm_classification"]
+    writer = PartWriter(os.path.join(path, "llm_classification"), SCHEMAS["llm_classification"], fmt,
+                        len(classifications["parts"]), rows_per_part)
+    # Rows committed after a higher id was exported sit below the mark: read a window below it again.
+    rescan_after = max(0, classifications["after_id"] - rescan_ids)
+    exported_ids = (_exported_ids(path, "llm_classification", "llm_classification_id", rescan_after)
+                    if classifications["parts"] else set())
+    rows = (row for row in datastore.iter_llm_classifications(rescan_after, itersize) if row[0] not in exported_ids)
+
+    def track_classifications(batch):
+        classifications["after_id"] = max(classifications["after_id"], batch[-1][0])
+
+    with metrics.timer("snapshot.export.llm_classification"):
+        parts = _export(rows, writer, batch_rows, track_classifications)
+    classifications["parts"] += parts
+    exported["llm_classification"] = sum(part["rows"] for part in parts)
+
+    manifest["refreshed"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    _write_manifest(path, manifest)
+    return exported
+
+
+def _read_part(path):
+    if path.endswith(".parquet"):
+        return pq.read_table(path, memory_map=True)
+    # An uncompressed IPC file maps straight into Arrow buffers, nothing is copied or decoded.
+    return ipc.open_file(pa.memory_map(path)).read_all()
+
+
+def load_snapshot(path, dataset="pairs", columns=None):
+    """ The dataset as one pyarrow Table over the part files listed in the manifest. """
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No snapshot manifest in {path}")
+    parts = manifest["datasets"][dataset]["parts"]
+    tables = [_read_part(os.path.join(path, dataset, part["file"])) for part in parts]
+    table = pa.concat_tables(tables) if tables else SCHEMAS[dataset].empty_table()
+    return table.select(columns) if columns else table
+
+
+def read_frame(path, dataset="pairs", columns=None):
+    """ load_snapshot as a pandas DataFrame; dictionary-encoded columns become categoricals. """
+    return load_snapshot(path, dataset, columns).to_pandas()
+
+
+def main(path, fmt="arrow", full=False, rows_per_part=SNAPSHOT_ROWS_PER_PART, dbname=None, migrate=False):
+    db_config = {**DB_CONFIG, "dbname": dbname} if dbname else DB_CONFIG
+    datastore = DataStore(db_config)
+    start = time.perf_counter()
+    try:
+        if migrate:
+            datastore.add_classification_ids()
+        exported = export_snapshot(datastore, path, fmt, full, rows_per_part)
+    finally:
+        datastore.close()
+    manifest = read_manifest(path)
+    print(f"Exported in {time.perf_counter() - start:.1f}s to {path}:")
+    for dataset, rows in exported.items():
+        total = sum(part["rows"] for part in manifest["datasets"][dataset]["parts"])
+        print(f"  {dataset}: {rows} new rows, {total} in {len(manifest['datasets'][dataset]['parts'])} parts")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Export or refresh a columnar snapshot of the labelled data.")
+    parser.add_argument("path", help="Snapshot directory (created, or refreshed if it has a manifest)")
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="arrow",
+                        help="arrow: memory-mapped zero-copy reads; parquet: compressed, decoded on load")
+    parser.add_argument("--full", action="store_true", help="Re-export everything instead of refreshing")
+    parser.add_argument("--rows-per-part", type=int, default=SNAPSHOT_ROWS_PER_PART)
+    parser.add_argument("--dbname", help="Database to export from (default: DB_CONFIG)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="First add the llm_classification_id column refreshes need (locks the table once)")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+    try:
+        main(args.path, args.format, args.full, args.rows_per_part, args.dbname, args.migrate)
+    finally:
+        metrics.finish()